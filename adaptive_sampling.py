@@ -0,0 +1,100 @@
+import argparse
+import json
+
+from squat_tracker import SquatTracker
+
+# Tracker states that need every frame
+_FULL_RATE_STATES = {"In Rep"}
+
+
+class AdaptiveSampler:
+    """
+    Chooses which frames get pose inference.
+
+    While the lifter is "Not Ready" or standing "Ready", only every idle_stride-th
+    frame is inferred; the others are skipped with cap.grab() so they are not even
+    decoded. As soon as the knee angle starts dropping toward the rep start
+    threshold (it falls below approach_angle, or by more than min_drop degrees
+    since the last inferred frame) and for the whole IN_REP phase, every frame is
+    inferred so the depth and knee tracking scores see the full motion.
+    """
+
+    def __init__(self, idle_stride=3, approach_angle=None, min_drop=2.0):
+        if idle_stride < 1:
+            raise ValueError("idle_stride must be at least 1")
+        self.idle_stride = idle_stride
+        # Default: halfway between the rep start and end thresholds
+        if approach_angle is None:
+            approach_angle = (SquatTracker.SQUAT_START_THRESHOLD + SquatTracker.SQUAT_END_THRESHOLD) / 2
+        self.approach_angle = approach_angle
+        self.min_drop = min_drop
+
+        self.full_rate = False
+        self.previous_knee_angle = None
+        self.frames_since_inference = 0
+        self.frames_inferred = 0
+        self.frames_skipped = 0
+
+    def should_infer(self):
+        """Called by the video loop once per frame, before decoding it."""
+        if self.full_rate or self.frames_inferred == 0 or self.frames_since_inference + 1 >= self.idle_stride:
+            self.frames_since_inference = 0
+            self.frames_inferred += 1
+            return True
+
+        self.frames_since_inference += 1
+        self.frames_skipped += 1
+        return False
+
+    def update(self, state, knee_angle):
+        """Feed back the tracker state and knee angle of the frame that was just inferred."""
+        dropping = (self.previous_knee_angle is not None
+                    and self.previous_knee_angle - knee_angle > self.min_drop)
+        self.full_rate = state in _FULL_RATE_STATES or dropping or knee_angle < self.approach_angle
+        self.previous_knee_angle = knee_angle
+
+    def stats(self):
+        total = self.frames_inferred + self.frames_skipped
+        return {
+            "idle_stride": self.idle_stride,
+            "frames_inferred": self.frames_inferred,
+            "frames_skipped": self.frames_skipped,
+            "inferred_ratio": self.frames_inferred / total if total else 0.0
+        }
+
+
+def compare_with_baseline(video_path, idle_stride=3, cache_dir=None):
+    """
+    Score a video at full rate and with adaptive sampling and report how far the
+    sampled run drifts: rep count, per-rep score differences and speed. With a
+    cache_dir the full-rate baseline is replayed from (or recorded to) the cache.
+    """
+    from main_controller import MainController
+
+    baseline = MainController(video_path, headless=True, cache_dir=cache_dir).run()
+    sampled = MainController(video_path, headless=True, adaptive_stride=idle_stride).run()
+
+    rep_deltas = []
+    for base_rep, sampled_rep in zip(baseline["reps"], sampled["reps"]):
+        rep_deltas.append({key: sampled_rep[key] - base_rep[key] for key in base_rep})
+
+    return {
+        "video": str(video_path),
+        "baseline_reps": len(baseline["reps"]),
+        "sampled_reps": len(sampled["reps"]),
+        "rep_score_deltas": rep_deltas,
+        "overall_score_delta": sampled["summary"]["overall_score"] - baseline["summary"]["overall_score"],
+        "baseline_fps": baseline["fps"],
+        "sampled_fps": sampled["fps"],
+        "sampling": sampled["sampling"]
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare adaptive sampling against the full-rate baseline.")
+    parser.add_argument("video_path")
+    parser.add_argument("--idle-stride", type=int, default=3)
+    parser.add_argument("--cache-dir", default=None, help="landmark cache for the full-rate baseline")
+    args = parser.parse_args()
+
+    print(json.dumps(compare_with_baseline(args.video_path, args.idle_stride, args.cache_dir), indent=2))
@@ -0,0 +1,146 @@
+import argparse
+import csv
+import json
+import os
+import time
+from multiprocessing import util
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".avi", ".mkv", ".m4v", ".webm"}
+
+REPORT_FIELDS = [
+    "video", "status", "error", "reps", "finished",
+    "shoulders", "depth", "knee_tracking", "knee_alignment", "overall_score",
+    "frames", "fps", "redetections", "wall_sec"
+]
+
+# One detector per worker process, created by _init_worker
+_worker_detector = None
+
+
+def collect_videos(source):
+    """
+    Return the list of videos to score. source is either a directory (scanned for
+    video files) or a manifest: a .json list of paths or a text file with one path
+    per line. Relative manifest entries are resolved against the manifest's folder.
+    """
+    source = Path(source)
+    if source.is_dir():
+        return sorted(str(p) for p in source.iterdir() if p.suffix.lower() in VIDEO_EXTENSIONS)
+
+    if source.suffix.lower() == ".json":
+        with open(source) as f:
+            entries = json.load(f)
+    else:
+        with open(source) as f:
+            entries = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+    return [str(source.parent / entry) for entry in entries]
+
+
+def _init_worker(multi_person=False):
+    """Build the MediaPipe graph once per worker instead of once per video."""
+    global _worker_detector
+    if multi_person:
+        from person_tracker import MultiPersonDetector
+        _worker_detector = MultiPersonDetector()
+    else:
+        from dominant_person import DominantPersonDetector
+        _worker_detector = DominantPersonDetector()
+    # Pay for model loading while the pool starts, not inside the first video's timing
+    _worker_detector.warm_up()
+    # Pool workers leave through os._exit, which skips atexit; multiprocessing finalizers still run
+    util.Finalize(_worker_detector, _worker_detector.close, exitpriority=10)
+
+
+def _score_video(video_path, cache_dir=None):
+    """Score one video in a worker. Failures are returned as records, never raised."""
+    from main_controller import MainController
+
+    start = time.perf_counter()
+    try:
+        _worker_detector.reset()
+        controller = MainController(video_path, headless=True, detector=_worker_detector,
+                                    cache_dir=cache_dir)
+        result = controller.run()
+        return {"video": video_path, "status": "ok", "result": result,
+                "wall_sec": time.perf_counter() - start}
+    except Exception as exc:
+        return {"video": video_path, "status": "error", "error": f"{type(exc).__name__}: {exc}",
+                "wall_sec": time.perf_counter() - start}
+
+
+def run_batch(videos, workers=None, cache_dir=None, multi_person=False):
+    """Fan the videos out over a process pool and return one record per video, in input order."""
+    workers = workers or os.cpu_count() or 1
+    records = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(multi_person,)) as pool:
+        futures = {pool.submit(_score_video, video, cache_dir): video for video in videos}
+        for future in as_completed(futures):
+            video = futures[future]
+            try:
+                records[video] = future.result()
+            except Exception as exc:
+                # The worker process itself died (e.g. a crash in native code)
+                records[video] = {"video": video, "status": "error",
+                                  "error": f"{type(exc).__name__}: {exc}", "wall_sec": None}
+    return [records[video] for video in videos]
+
+
+def _report_row(record):
+    row = {"video": record["video"], "status": record["status"],
+           "error": record.get("error", ""), "wall_sec": record.get("wall_sec")}
+    result = record.get("result")
+    if result:
+        summary = result["summary"]
+        row.update({
+            "reps": len(result["reps"]),
+            "finished": result["finished"],
+            "shoulders": summary["shoulders"],
+            "depth": summary["depth"],
+            "knee_tracking": summary["knee_tracking"],
+            "knee_alignment": summary["knee_alignment"],
+            "overall_score": summary["overall_score"],
+            "frames": result["frames"],
+            "fps": result["fps"],
+            # Replayed results never ran the detector
+            "redetections": result["detector"]["redetections"] if result["detector"] else ""
+        })
+    return row
+
+
+def write_report(records, report_path):
+    """Write the batch results as JSON (full per-rep detail) or CSV (one row per video)."""
+    report_path = Path(report_path)
+    if report_path.suffix.lower() == ".csv":
+        with open(report_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            for record in records:
+                writer.writerow(_report_row(record))
+    else:
+        with open(report_path, "w") as f:
+            json.dump(records, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score many squat videos on a process pool.")
+    parser.add_argument("source", help="directory of videos or a manifest (.json list / one path per line)")
+    parser.add_argument("--report", default="report.json", help="output report, .json or .csv")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--cache-dir", default=None, help="landmark cache shared by all workers")
+    parser.add_argument("--multi-person", action="store_true",
+                        help="track everyone in view and score only the lifter")
+    args = parser.parse_args()
+
+    videos = collect_videos(args.source)
+    start = time.perf_counter()
+    records = run_batch(videos, workers=args.workers, cache_dir=args.cache_dir,
+                        multi_person=args.multi_person)
+    elapsed = time.perf_counter() - start
+    write_report(records, args.report)
+
+    failed = sum(1 for record in records if record["status"] != "ok")
+    print(f"Scored {len(records) - failed}/{len(records)} videos in {elapsed:.1f}s -> {args.report}")
@@ -0,0 +1,231 @@
+"""
+Offline scoring of a whole clip from a (T, 33, 4) landmark array.
+
+Produces the same "finished", "reps" and "summary" values as streaming the
+frames through MainController, but segments reps with vectorized threshold
+crossings of the knee angle and scores every frame at once with the batch
+form of the scoring kernel (scoring_kernel.py) instead of stepping the
+SquatTracker/SquatAssessor objects one frame at a time. Rows of
+NaNs (frames without a pose, as stored by the landmark cache) are skipped,
+exactly like the streaming path ignores frames without landmarks. With a
+LandmarkFilter the rows are smoothed first, with the same frame timestamps the
+streaming path uses, and the tracker's dwell settings are honoured. A
+RepRecorder receives the same per-frame rows the streaming path records.
+
+With two cameras (multi_camera.py), a front view aligned row by row can be
+passed as well. The alignment and knee tracking metrics are then measured on
+the front view, and readiness, rep segmentation and depth on the side view.
+"""
+import argparse
+import json
+
+import numpy as np
+
+from pose_array import (X, Y, LEFT_SHOULDER, LEFT_ELBOW, LEFT_WRIST, LEFT_HIP, LEFT_KNEE_ANGLE, LEFT_ARM_ANGLE,
+                        joint_angles)
+from squat_tracker import SquatTracker
+from squat_assesor import SquatAssessor
+from scoring_kernel import load_rules
+from rep_recorder import FRAME_DTYPE, METRIC_FIELDS, NOT_READY, READY, IN_REP, FINISHED
+
+
+def _run_lengths(mask):
+    """Length of the run of True values ending at each index."""
+    index = np.arange(len(mask))
+    last_false = np.maximum.accumulate(np.where(mask, -1, index))
+    return index - last_false
+
+
+def segment_reps(knee_angle, start, tracker):
+    """
+    Find the IN_REP segments after the lifter became ready at frame `start - 1`.
+    Returns (rep_start, rep_end) index pairs; rep_end is the frame whose knee angle
+    crossed back above the end threshold, or None if the clip ends mid-rep. A
+    transition fires on the last frame of a run of start_dwell/end_dwell frames
+    past the threshold, all counted after the previous transition.
+    """
+    start_frames = np.flatnonzero(_run_lengths(knee_angle < tracker.SQUAT_START_THRESHOLD) >= tracker.start_dwell)
+    end_frames = np.flatnonzero(_run_lengths(knee_angle > tracker.SQUAT_END_THRESHOLD) >= tracker.end_dwell)
+
+    segments = []
+    position = start
+    while True:
+        i = np.searchsorted(start_frames, position + tracker.start_dwell - 1)
+        if i == len(start_frames):
+            break
+        rep_start = int(start_frames[i])
+        j = np.searchsorted(end_frames, rep_start + tracker.end_dwell - 1, side="right")
+        if j == len(end_frames):
+            segments.append((rep_start, None))
+            break
+        rep_end = int(end_frames[j])
+        segments.append((rep_start, rep_end))
+        position = rep_end + 1
+    return segments
+
+
+def _rep_average(scores, default):
+    """sum()/len like the streaming averages, so both paths round identically. NaN frames don't count."""
+    values = scores[~np.isnan(scores)].tolist()
+    return sum(values) / len(values) if values else default
+
+
+def _record_frames(recorder, frame_indices, states, knee_angle, metrics):
+    """Append one FRAME_DTYPE row per scored frame; metrics are NaN outside IN_REP frames."""
+    n = len(states)
+    rows = np.empty(n, dtype=FRAME_DTYPE)
+    rows["frame"] = frame_indices[:n]
+    rows["state"] = states
+    rows["knee_angle"] = knee_angle[:n]
+    in_rep = states == IN_REP
+    for name in METRIC_FIELDS:
+        rows[name] = np.nan
+    for name, values in zip(METRIC_FIELDS, metrics):
+        rows[name][in_rep] = values[:n][in_rep]
+    recorder.extend(rows)
+
+
+def score_landmarks(landmarks, tracker=None, assessor=None, landmark_filter=None, recorder=None, front=None):
+    """
+    Score a (T, 33, 4) landmark array in one pass and return a dict with
+    "finished", "reps" (per-rep score dicts as returned by assess_squat) and
+    "summary" (as returned by SquatAssessor.get_summary()). The tracker and
+    assessor only supply thresholds; pass instances to score with non-default
+    settings. The reps are added to the assessor's session totals as a side
+    effect, and to `recorder` (a RepRecorder) if one is given.
+
+    front is an optional second (T, 33, 4) array from a front-facing camera,
+    row i taken at the same time as row i of landmarks (a side view). Shoulder
+    and knee alignment and knee tracking then come from the front view. Frames
+    without a side pose are skipped; frames without a front pose are still
+    tracked and scored for depth, but left out of the front metrics (a rep with
+    no front frames at all gets the streaming assessor's no-data scores). The
+    filter only applies to landmarks.
+    """
+    tracker = tracker or SquatTracker()
+    assessor = assessor or SquatAssessor()
+
+    landmarks = np.asarray(landmarks)
+    frame_indices = np.flatnonzero(~np.isnan(landmarks[:, 0, 0]))
+    landmarks = landmarks[frame_indices]
+    if front is not None:
+        front = np.asarray(front)[frame_indices]
+    if landmark_filter is not None:
+        landmarks = landmark_filter.apply_sequence(landmarks, frame_indices)
+    # Scalar code reads landmarks as Python floats, so do the coordinate math in float64 too
+    xy = landmarks[..., :2].astype(np.float64)
+    angles = joint_angles(landmarks)
+    knee_angle = angles[:, LEFT_KNEE_ANGLE]
+    arm_angle = angles[:, LEFT_ARM_ANGLE]
+    arms_down = landmarks[:, LEFT_WRIST, Y] > landmarks[:, LEFT_ELBOW, Y]
+
+    # SquatTracker.is_ready_to_squat, for every frame at once
+    ready = ((tracker.min_arm_angle <= arm_angle) & (arm_angle <= tracker.max_arm_angle)
+             & ~arms_down
+             & ~(knee_angle < tracker.min_knee_angle)
+             & ~(np.abs(xy[:, LEFT_SHOULDER, X] - xy[:, LEFT_HIP, X]) > tracker.MAX_SHOULDER_HIP_OFFSET))
+    ready_frames = np.flatnonzero(ready)
+    if len(ready_frames) == 0:
+        if recorder is not None:
+            _record_frames(recorder, frame_indices, np.full(len(landmarks), NOT_READY, dtype=np.int8),
+                           knee_angle, ())
+        return {"finished": False, "reps": [], "summary": assessor.get_summary()}
+    first_rep_frame = int(ready_frames[0]) + 1
+
+    segments = segment_reps(knee_angle, first_rep_frame, tracker)
+
+    # check_finished_transition fires once the arms have been down for finish_dwell READY frames
+    in_rep = np.zeros(len(landmarks), dtype=bool)
+    for rep_start, rep_end in segments:
+        in_rep[rep_start:rep_end] = True
+    in_rep[:first_rep_frame] = True
+    finish_frames = np.flatnonzero(_run_lengths(~in_rep & arms_down) >= tracker.finish_dwell)
+    finish_frame = int(finish_frames[0]) if len(finish_frames) else None
+
+    # Every per-frame metric in one kernel call. With a front view, the knee position comes from
+    # the front but the depth it is weighted by from the side
+    (shoulder_tilt, knee_tilt, knee_deviation, shoulder_scores, knee_alignment_scores, depth_scores,
+     knee_tracking_scores) = assessor.rules.evaluate(landmarks if front is None else front, angles)
+    if front is not None:
+        # NaN front rows would still get a full knee tracking score, so blank every front metric there
+        no_front = np.isnan(front[:, 0, 0])
+        for values in (shoulder_tilt, knee_tilt, knee_deviation, shoulder_scores, knee_alignment_scores,
+                       knee_tracking_scores):
+            values[no_front] = np.nan
+
+    first_row = 0
+    if recorder is not None:
+        # The streaming path records every frame up to and including the one that finishes the set
+        n = finish_frame + 1 if finish_frame is not None else len(landmarks)
+        states = np.full(n, READY, dtype=np.int8)
+        states[:first_rep_frame - 1] = NOT_READY
+        for rep_start, rep_end in segments:
+            states[rep_start:rep_end] = IN_REP
+        if finish_frame is not None:
+            states[finish_frame] = FINISHED
+        first_row = recorder.rows
+        _record_frames(recorder, frame_indices, states, knee_angle,
+                       (shoulder_tilt, knee_tilt, knee_deviation, shoulder_scores, knee_alignment_scores,
+                        depth_scores, knee_tracking_scores))
+
+    reps = []
+    for rep_start, rep_end in segments:
+        # A rep is scored on the frame it ends, unless that frame also finishes the workout
+        if rep_end is None or (finish_frame is not None and rep_end >= finish_frame):
+            break
+        rep = slice(rep_start, rep_end)
+
+        # Without any front frames, the same defaults SquatAssessor uses for a rep with no data
+        shoulder_avg = _rep_average(shoulder_scores[rep], assessor.max_score)
+        knee_alignment_avg = _rep_average(knee_alignment_scores[rep], assessor.max_score)
+        depth_score = max(0, float(np.fmax.reduce(depth_scores[rep_start:rep_end + 1])))
+        knee_tracking = knee_tracking_scores[rep]
+        knee_tracking = knee_tracking[~np.isnan(knee_tracking)]
+        knee_score = min(assessor.max_score, float(np.min(knee_tracking))) if len(knee_tracking) \
+            else assessor.max_score
+        overall_score = assessor.calculate_overall_score(shoulder_avg, depth_score, knee_score, knee_alignment_avg)
+
+        assessor.record_rep(shoulder_avg, depth_score, knee_score, knee_alignment_avg, overall_score)
+        reps.append({
+            "shoulders": shoulder_avg,
+            "depth": depth_score,
+            "knees": knee_score,
+            "knees_alinment": knee_alignment_avg,
+            "overall_score": overall_score
+        })
+        if recorder is not None:
+            recorder.add_rep(first_row + rep_start, first_row + rep_end + 1, int(frame_indices[rep_start]),
+                             int(frame_indices[rep_end]), reps[-1])
+
+    return {"finished": finish_frame is not None, "reps": reps, "summary": assessor.get_summary()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score a saved (T, 33, 4) landmark array offline.")
+    parser.add_argument("landmarks", help=".npy file with one landmark row per frame (NaN rows = no pose)")
+    parser.add_argument("--smooth", action="store_true", help="apply the One-Euro landmark filter first")
+    parser.add_argument("--fps", type=float, default=30.0, help="frame rate for the landmark filter")
+    parser.add_argument("--dwell-frames", type=int, default=1,
+                        help="frames a rep start/end or finish condition must hold before it counts")
+    parser.add_argument("--scoring-config", default=None,
+                        help="scoring thresholds and weights (default: scoring_config.json)")
+    parser.add_argument("--record", default=None,
+                        help="save every scored frame's metrics to this .csv, .parquet or .npy file")
+    args = parser.parse_args()
+
+    landmark_filter = None
+    if args.smooth:
+        from landmark_filter import LandmarkFilter
+        landmark_filter = LandmarkFilter(fps=args.fps)
+    tracker = SquatTracker(start_dwell=args.dwell_frames, end_dwell=args.dwell_frames,
+                           finish_dwell=args.dwell_frames)
+    recorder = None
+    if args.record:
+        from rep_recorder import RepRecorder
+        recorder = RepRecorder()
+    result = score_landmarks(np.load(args.landmarks, mmap_mode="r"), tracker=tracker,
+                             assessor=SquatAssessor(rules=load_rules(args.scoring_config)),
+                             landmark_filter=landmark_filter, recorder=recorder)
+    if recorder is not None:
+        recorder.write(args.record)
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,448 @@
+"""
+Throughput benchmark for the squat pipeline, stage by stage.
+
+Inputs are synthetic landmark sessions (synthetic_landmarks.py) with varying
+rep count, depth, knee valgus and shoulder tilt, plus any landmark cache
+entries passed with --fixtures. The stages are timed separately:
+
+    decode     cap.read() of a synthetic 720p clip written to a temp file
+    inference  DominantPersonDetector.find_dominant_person (skipped if MediaPipe
+               Pose cannot be created here)
+    tracking   SquatTracker state machine calls
+    scoring    SquatAssessor.evaluate_frame, i.e. every per-frame metric in one
+               compiled kernel call (scoring_kernel.py)
+    scoring_kernel_batch  one kernel call over the whole clip, per frame
+    rendering  OverlayRenderer.draw (skeleton, joints, bounding box and score)
+    filter     LandmarkFilter.apply per frame, plus the lag it adds to the knee
+               angle (in frames, against the unfiltered angle)
+    replay     MainController.replay, i.e. tracking + scoring end to end
+    batch      batch_scoring.score_landmarks over the whole clip
+
+Startup is measured in fresh interpreters: the import time of the main
+entry modules (and whether they pulled in MediaPipe or OpenCV), and the time
+from process start to the first scored rep and to the full result of a
+landmark replay. When MediaPipe Pose can be created, graph setup, warm_up()
+and the first frame after a cold vs. a warmed-up start are timed as well.
+
+Runs on a CPU-only machine without a camera or display. Save a baseline with
+--save-baseline and check later runs with --baseline: a stage whose fps drops
+by more than --tolerance, or a scenario whose rep count or overall score
+changes, fails the run with exit code 1. No baseline is committed, since fps
+depends on the machine. Without --baseline the report says that nothing was
+checked, and a baseline sharing no scenarios or stages with the run fails it.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from batch_scoring import score_landmarks
+from landmark_cache import LandmarkCache, is_missing
+from landmark_filter import LandmarkFilter
+from pose_array import LEFT_KNEE_ANGLE, joint_angles
+from renderer import OverlayRenderer
+from squat_assesor import SquatAssessor
+from squat_tracker import SquatTracker
+from synthetic_landmarks import synthetic_session
+
+SCENARIOS = {
+    "clean": dict(reps=5),
+    "deep_valgus": dict(reps=5, depth=60.0, knee_valgus=0.06),
+    "shoulder_tilt": dict(reps=5, shoulder_tilt=[0.0, 0.004, 0.008, 0.004, 0.0]),
+    "mixed_depth": dict(reps=8, depth=[70.0, 80.0, 90.0, 100.0, 105.0, 95.0, 85.0, 75.0], knee_tilt=0.01),
+    "noisy": dict(reps=10, noise=0.003, missing_ratio=0.05, seed=1),
+    "long_set": dict(reps=40, depth=85.0, knee_valgus=0.03, shoulder_tilt=0.003),
+}
+
+FRAME_SIZE = (1280, 720)
+
+STARTUP_MODULES = ("batch_scoring", "main_controller", "dominant_person")
+
+_IMPORT_PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start, "mediapipe" in sys.modules, "cv2" in sys.modules)
+"""
+
+_FIRST_RESULT_PROBE = """
+import sys, time
+start = time.perf_counter()
+import numpy as np
+from events import CallbackSink, EventBus, RepCompleted
+from main_controller import MainController
+first_rep = []
+def on_event(event):
+    if isinstance(event, RepCompleted) and not first_rep:
+        first_rep.append(time.perf_counter() - start)
+controller = MainController("benchmark", headless=True, events=EventBus([CallbackSink(on_event)]))
+controller.replay(np.load(sys.argv[1]))
+print(first_rep[0] if first_rep else None, time.perf_counter() - start, "mediapipe" in sys.modules)
+"""
+
+
+def summarize(samples_ns):
+    """Per-frame latency samples (ns) -> mean/p50/p95 in ms and frames per second."""
+    samples_ms = np.asarray(samples_ns, dtype=np.float64) / 1e6
+    if len(samples_ms) == 0:
+        return {"frames": 0}
+    total_sec = samples_ms.sum() / 1000.0
+    p50, p95 = np.percentile(samples_ms, [50, 95])
+    return {
+        "frames": len(samples_ms),
+        "mean_ms": float(samples_ms.mean()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "fps": len(samples_ms) / total_sec if total_sec > 0 else float("inf")
+    }
+
+
+def bench_tracking(landmarks):
+    """Time the tracker state machine the way MainController drives it."""
+    tracker = SquatTracker()
+    samples = []
+    for frame in landmarks:
+        if is_missing(frame):
+            continue
+        start = time.perf_counter_ns()
+        angles = joint_angles(frame)
+        if tracker.get_finish() != 1:
+            if tracker.get_ready() == 1 or tracker.get_inrep() == 1:
+                tracker.squat_rep_position(frame, angles)
+                tracker.check_finished_transition(frame)
+            else:
+                tracker.is_ready_to_squat(frame, angles)
+        samples.append(time.perf_counter_ns() - start)
+    return summarize(samples)
+
+
+def bench_scoring(landmarks):
+    """Time SquatAssessor.evaluate_frame, as run for every IN_REP frame (the compiled kernel on one frame)."""
+    assessor = SquatAssessor()
+    samples = []
+    for frame in landmarks:
+        if is_missing(frame):
+            continue
+        start = time.perf_counter_ns()
+        angles = joint_angles(frame)
+        assessor.evaluate_frame(frame, angles)
+        samples.append(time.perf_counter_ns() - start)
+        if angles[LEFT_KNEE_ANGLE] > SquatTracker.SQUAT_END_THRESHOLD:
+            assessor.reset()
+    return summarize(samples)
+
+
+def bench_scoring_kernel_batch(landmarks, repeats=3):
+    """One kernel call over every frame with a pose (angles included), reported per frame."""
+    rules = SquatAssessor().rules
+    landmarks = landmarks[~np.isnan(landmarks[:, 0, 0])]
+    elapsed, _ = _best_of(lambda: rules.evaluate(landmarks), repeats)
+    return {"frames": len(landmarks), "mean_ms": elapsed / 1e6 / max(1, len(landmarks)),
+            "fps": len(landmarks) / (elapsed / 1e9)}
+
+
+def bench_rendering(landmarks, frame_size=FRAME_SIZE):
+    w, h = frame_size
+    canvas = np.zeros((h, w, 3), dtype=np.uint8)
+    renderer = OverlayRenderer()
+    samples = []
+    for frame_landmarks in landmarks:
+        if is_missing(frame_landmarks):
+            continue
+        start = time.perf_counter_ns()
+        renderer.draw(canvas, frame_landmarks)
+        samples.append(time.perf_counter_ns() - start)
+    return summarize(samples)
+
+
+def _best_of(run, repeats):
+    """Run `run` repeats times; whole-clip timings are noisy, so keep the fastest."""
+    best, result = None, None
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        result = run()
+        elapsed = time.perf_counter_ns() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def filter_lag(raw_angle, filtered_angle, max_lag=15):
+    """The shift (frames) that best lines the filtered signal up with the raw one."""
+    errors = [np.nanmean(np.abs(filtered_angle[lag:] - raw_angle[:len(raw_angle) - lag]))
+              for lag in range(max_lag + 1)]
+    return int(np.nanargmin(errors))
+
+
+def bench_filter(landmarks):
+    landmark_filter = LandmarkFilter()
+    filtered = np.array(landmarks, dtype=np.float32)
+    samples = []
+    for i, frame in enumerate(landmarks):
+        if is_missing(frame):
+            continue
+        start = time.perf_counter_ns()
+        filtered[i] = landmark_filter.apply(frame, i)
+        samples.append(time.perf_counter_ns() - start)
+    stats = summarize(samples)
+    stats["lag_frames"] = filter_lag(joint_angles(landmarks)[:, LEFT_KNEE_ANGLE],
+                                     joint_angles(filtered)[:, LEFT_KNEE_ANGLE])
+    return stats
+
+
+def bench_replay(landmarks, repeats=3):
+    """End to end tracking + scoring through MainController, without decoding or inference."""
+    from main_controller import MainController
+
+    elapsed, result = _best_of(lambda: MainController("benchmark", headless=True).replay(landmarks), repeats)
+    return {"frames": len(landmarks), "fps": len(landmarks) / (elapsed / 1e9)}, result
+
+
+def bench_batch(landmarks, repeats=3):
+    elapsed, result = _best_of(lambda: score_landmarks(landmarks), repeats)
+    return {"frames": len(landmarks), "fps": len(landmarks) / (elapsed / 1e9)}, result
+
+
+def write_synthetic_video(path, frames=150, frame_size=FRAME_SIZE, fps=30):
+    """A clip with moving content so the decoder does real work."""
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), fps, frame_size)
+    w, h = frame_size
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 255, (h, w, 3), dtype=np.uint8)
+    for i in range(frames):
+        frame = np.roll(background, i * 7, axis=1)
+        cv2.circle(frame, (w // 2, h // 2), 50 + i % 100, (0, 255, 0), -1)
+        writer.write(frame)
+    writer.release()
+
+
+def bench_decode_and_inference(frames=150, frame_size=FRAME_SIZE):
+    stages = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        video_path = Path(tmp) / "synthetic.avi"
+        write_synthetic_video(video_path, frames, frame_size)
+
+        cap = cv2.VideoCapture(str(video_path))
+        decoded = []
+        samples = []
+        while True:
+            start = time.perf_counter_ns()
+            ret, frame = cap.read()
+            if not ret:
+                break
+            samples.append(time.perf_counter_ns() - start)
+            decoded.append(frame)
+        cap.release()
+        stages["decode"] = summarize(samples)
+
+    try:
+        from dominant_person import DominantPersonDetector
+        detector = DominantPersonDetector()
+    except Exception as exc:
+        stages["inference"] = {"skipped": f"{type(exc).__name__}: {exc}"}
+        return stages
+    stages["inference_startup"] = bench_detector_startup(decoded[0])
+
+    samples = []
+    with detector:
+        for frame in decoded:
+            start = time.perf_counter_ns()
+            detector.find_dominant_person(frame)
+            samples.append(time.perf_counter_ns() - start)
+    # The synthetic clip has no person in it, so this is the full-detection (worst) case
+    stages["inference"] = summarize(samples)
+    return stages
+
+
+def _probe(code, *args, repeats=3):
+    """Run code in fresh interpreters; returns the fastest run's printed fields and its wall time."""
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", code, *args], cwd=Path(__file__).resolve().parent,
+                                capture_output=True, text=True, check=True).stdout.split()
+        wall = time.perf_counter() - start
+        if best is None or wall < best[1]:
+            best = (output, wall)
+    return best
+
+
+def bench_startup(repeats=3):
+    startup = {"imports": {}}
+    for module in STARTUP_MODULES:
+        try:
+            (seconds, mediapipe, opencv), process_sec = _probe(_IMPORT_PROBE.format(module=module), repeats=repeats)
+        except subprocess.CalledProcessError as exc:
+            startup["imports"][module] = {"skipped": exc.stderr.strip().splitlines()[-1]}
+            continue
+        startup["imports"][module] = {"import_sec": float(seconds), "process_sec": process_sec,
+                                      "mediapipe": mediapipe == "True", "cv2": opencv == "True"}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "session.npy"
+        np.save(path, synthetic_session(**SCENARIOS["clean"]))
+        (first_rep, result, mediapipe), process_sec = _probe(_FIRST_RESULT_PROBE, str(path), repeats=repeats)
+    startup["replay"] = {"first_rep_sec": float(first_rep), "result_sec": float(result),
+                         "process_sec": process_sec, "mediapipe": mediapipe == "True"}
+    return startup
+
+
+def bench_detector_startup(frame):
+    """Graph setup, warm_up() and the first real frame after a cold vs. a warmed-up start."""
+    from dominant_person import DominantPersonDetector
+
+    start = time.perf_counter()
+    cold = DominantPersonDetector()
+    init_sec = time.perf_counter() - start
+    with cold:
+        start = time.perf_counter_ns()
+        cold.find_dominant_person(frame)
+        cold_first_ms = (time.perf_counter_ns() - start) / 1e6
+
+    with DominantPersonDetector() as warm:
+        h, w = frame.shape[:2]
+        warm_up_sec = warm.warm_up((w, h))
+        start = time.perf_counter_ns()
+        warm.find_dominant_person(frame)
+        warm_first_ms = (time.perf_counter_ns() - start) / 1e6
+    return {"init_sec": init_sec, "warm_up_sec": warm_up_sec,
+            "cold_first_frame_ms": cold_first_ms, "warm_first_frame_ms": warm_first_ms}
+
+
+def bench_landmarks(landmarks):
+    replay_stats, replay_result = bench_replay(landmarks)
+    batch_stats, _ = bench_batch(landmarks)
+    return {
+        "frames": len(landmarks),
+        "reps": len(replay_result["reps"]),
+        "overall_score": replay_result["summary"]["overall_score"],
+        "tracking": bench_tracking(landmarks),
+        "scoring": bench_scoring(landmarks),
+        "scoring_kernel_batch": bench_scoring_kernel_batch(landmarks),
+        "rendering": bench_rendering(landmarks),
+        "filter": bench_filter(landmarks),
+        "replay": replay_stats,
+        "batch": batch_stats
+    }
+
+
+def run_benchmarks(fixtures_dir=None, video_frames=150):
+    results = {"stages": bench_decode_and_inference(video_frames), "startup": bench_startup(), "scenarios": {}}
+    for name, params in SCENARIOS.items():
+        results["scenarios"][name] = bench_landmarks(synthetic_session(**params))
+
+    if fixtures_dir is not None:
+        cache = LandmarkCache(fixtures_dir)
+        for key in cache.entries():
+            landmarks, meta = cache.load(key)
+            name = f"fixture:{Path(meta.get('video', key)).name}"
+            results["scenarios"][name] = bench_landmarks(np.asarray(landmarks))
+    return results
+
+
+def _fps_checks(current, baseline, path=""):
+    """Yield (metric path, current fps, baseline fps) for every fps value in both results."""
+    for key, value in baseline.items():
+        if key not in current:
+            continue
+        if isinstance(value, dict):
+            yield from _fps_checks(current[key], value, f"{path}{key}.")
+        elif key == "fps":
+            yield path.rstrip("."), current[key], value
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Return a list of regression messages (empty if the run is within tolerance)."""
+    failures = []
+    checked = 0
+    for name, base in baseline.get("scenarios", {}).items():
+        current = results["scenarios"].get(name)
+        if current is None:
+            continue
+        checked += 1
+        if current["reps"] != base["reps"] or current["overall_score"] != base["overall_score"]:
+            failures.append(f"{name}: result changed (reps {base['reps']} -> {current['reps']}, "
+                            f"overall {base['overall_score']:.4f} -> {current['overall_score']:.4f})")
+
+    for metric, fps, base_fps in _fps_checks(results, baseline):
+        checked += 1
+        if fps < base_fps * (1 - tolerance):
+            failures.append(f"{metric}: {fps:.0f} fps is more than {tolerance:.0%} below baseline {base_fps:.0f} fps")
+    if not checked:
+        # Otherwise a baseline from another version of this script would pass every run
+        failures.append("the baseline has no scenario or stage in common with this run")
+    return failures
+
+
+def print_report(results):
+    print(f"{'stage':<32}{'fps':>12}{'p50 ms':>10}{'p95 ms':>10}")
+    for stage, stats in results["stages"].items():
+        if "skipped" in stats:
+            print(f"{stage:<32}  skipped ({stats['skipped']})")
+        elif stage == "inference_startup":
+            print(f"{stage:<32}  graph {stats['init_sec']:.2f}s, warm-up {stats['warm_up_sec']:.2f}s, "
+                  f"first frame {stats['cold_first_frame_ms']:.1f} ms cold / {stats['warm_first_frame_ms']:.1f} ms warm")
+        else:
+            print(f"{stage:<32}{stats['fps']:>12.0f}{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}")
+
+    print(f"\n{'import':<32}{'import s':>12}{'process s':>10}  loads")
+    for module, stats in results["startup"]["imports"].items():
+        if "skipped" in stats:
+            print(f"{module:<32}  skipped ({stats['skipped']})")
+            continue
+        loads = ", ".join(name for name in ("mediapipe", "cv2") if stats[name]) or "-"
+        print(f"{module:<32}{stats['import_sec']:>12.3f}{stats['process_sec']:>10.3f}  {loads}")
+    replay = results["startup"]["replay"]
+    print(f"replay time to first rep {replay['first_rep_sec']:.3f}s, to result {replay['result_sec']:.3f}s "
+          f"(process {replay['process_sec']:.3f}s, MediaPipe loaded: {replay['mediapipe']})")
+
+    for name, scenario in results["scenarios"].items():
+        print(f"\n{name}: {scenario['frames']} frames, {scenario['reps']} reps, "
+              f"overall {scenario['overall_score']:.2f}")
+        for stage in ("tracking", "scoring", "scoring_kernel_batch", "rendering", "filter",
+                      "replay", "batch"):
+            stats = scenario[stage]
+            p50 = f"{stats['p50_ms']:>10.4f}" if "p50_ms" in stats else f"{'':>10}"
+            p95 = f"{stats['p95_ms']:>10.4f}" if "p95_ms" in stats else f"{'':>10}"
+            lag = f"  lag {stats['lag_frames']} frames" if "lag_frames" in stats else ""
+            print(f"  {stage:<30}{stats['fps']:>12.0f}{p50}{p95}{lag}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the squat pipeline stage by stage.")
+    parser.add_argument("--fixtures", default=None, help="landmark cache directory to benchmark as well")
+    parser.add_argument("--video-frames", type=int, default=150, help="frames in the decode/inference clip")
+    parser.add_argument("--output", default=None, help="write the full results as JSON")
+    parser.add_argument("--baseline", default=None, help="baseline JSON to check this run against")
+    parser.add_argument("--save-baseline", default=None, help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.3,
+                        help="allowed fractional fps drop against the baseline (default: 0.3)")
+    args = parser.parse_args()
+
+    if args.baseline and not Path(args.baseline).is_file():
+        parser.error(f"baseline {args.baseline} not found (create one with --save-baseline)")
+
+    results = run_benchmarks(args.fixtures, args.video_frames)
+    print_report(results)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = compare_to_baseline(results, json.load(f), args.tolerance)
+        if failures:
+            print("\nRegressions against baseline:")
+            for failure in failures:
+                print(f"  - {failure}")
+            sys.exit(1)
+        print("\nWithin baseline tolerance.")
+    else:
+        print("\nNo --baseline given, so nothing was checked for regressions.")
@@ -0,0 +1,242 @@
+"""
+Parallel scoring of one long video (e.g. a 20-minute session of several sets).
+
+The video is split into frame ranges, and each range is decoded and run
+through pose inference in its own worker process. Each worker builds and
+warms up one detector. A chunk starts decoding `overlap` frames before its
+range and discards those landmarks, so the detector's temporal tracking has
+settled by the first frame of the range.
+
+The per-chunk landmark arrays are merged in order. The SquatTracker and
+SquatAssessor then run once over the merged stream (MainController.replay),
+which takes well under a second even for long sessions. A rep that
+straddles a chunk boundary is therefore scored exactly as a sequential run
+over the same landmarks would score it. With MediaPipe's video-mode tracking,
+the landmarks in the first frames after a boundary can still differ slightly
+from a sequential pass. The overlap keeps that small, and speedup_report()
+measures it.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import util
+
+import cv2
+import numpy as np
+
+from landmark_cache import ROW_DTYPE, ROW_SHAPE
+from pose_backends import parse_backend_spec
+
+# One detector per worker process, created by _init_worker
+_worker_detector = None
+
+
+def _init_worker(multi_person=False, detector_options=None, detector_factory=None):
+    global _worker_detector
+    if detector_factory is not None:
+        _worker_detector = detector_factory()
+    elif multi_person:
+        from person_tracker import MultiPersonDetector
+        _worker_detector = MultiPersonDetector(**(detector_options or {}))
+    else:
+        from dominant_person import DominantPersonDetector
+        _worker_detector = DominantPersonDetector(**(detector_options or {}))
+    if hasattr(_worker_detector, "warm_up"):
+        _worker_detector.warm_up()
+    util.Finalize(_worker_detector, _worker_detector.close, exitpriority=10)
+
+
+def frame_count(video_path):
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Unable to open video: {video_path}")
+    frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return frames
+
+
+def split_ranges(frames, chunks):
+    """Split [0, frames) into `chunks` (start, end) ranges; the last one reads to the end of the file."""
+    chunks = max(1, min(chunks, frames))
+    bounds = np.linspace(0, frames, chunks + 1).astype(int)
+    ranges = [(int(bounds[i]), int(bounds[i + 1])) for i in range(chunks)]
+    # Container frame counts can be off, so never stop the last chunk early
+    ranges[-1] = (ranges[-1][0], None)
+    return ranges
+
+
+def open_at(video_path, frame_index):
+    """Open the video positioned at frame_index, falling back to grab() if seeking is not exact."""
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Unable to open video: {video_path}")
+    if frame_index == 0:
+        return cap
+    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+    if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == frame_index:
+        return cap
+    cap.release()
+    cap = cv2.VideoCapture(str(video_path))
+    for _ in range(frame_index):
+        if not cap.grab():
+            break
+    return cap
+
+
+def _infer_range(video_path, start, end, overlap):
+    """Worker: landmarks for frames [start, end) as a (n, 33, 4) array, NaN rows where no pose was found."""
+    begin = time.perf_counter()
+    detector = _worker_detector
+    detector.reset()
+    first = max(0, start - overlap)
+    cap = open_at(video_path, first)
+    rows = []
+    frame_index = first
+    try:
+        while end is None or frame_index < end:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            landmarks = detector.find_dominant_person(frame)
+            if frame_index >= start:
+                rows.append(np.full(ROW_SHAPE, np.nan, dtype=ROW_DTYPE) if landmarks is None else landmarks)
+            frame_index += 1
+    finally:
+        cap.release()
+    landmarks = np.stack(rows).astype(ROW_DTYPE) if rows else np.empty((0,) + ROW_SHAPE, dtype=ROW_DTYPE)
+    return {"start": start, "landmarks": landmarks, "metrics": detector.metrics(),
+            "frames_decoded": frame_index - first, "wall_sec": time.perf_counter() - begin}
+
+
+def merge_chunks(chunk_results, ranges):
+    """Concatenate the chunks in order. A chunk that ended early is padded with NaN rows to keep frame indices."""
+    parts = []
+    for (start, end), chunk in zip(ranges, chunk_results):
+        parts.append(chunk["landmarks"])
+        missing = (end - start - len(chunk["landmarks"])) if end is not None else 0
+        if missing > 0:
+            parts.append(np.full((missing,) + ROW_SHAPE, np.nan, dtype=ROW_DTYPE))
+    return np.concatenate(parts) if parts else np.empty((0,) + ROW_SHAPE, dtype=ROW_DTYPE)
+
+
+def _merge_metrics(chunk_results):
+    metrics = {}
+    for chunk in chunk_results:
+        for key, value in chunk["metrics"].items():
+            if isinstance(value, (int, float)):
+                metrics[key] = metrics.get(key, 0) + value
+    return metrics
+
+
+def run_chunked(video_path, workers=None, chunks=None, overlap=30, multi_person=False, detector_options=None,
+                detector_factory=None, controller_options=None):
+    """
+    Score one video with decode + pose inference split over `workers` processes.
+    chunks defaults to the number of workers. Returns (result, merged landmarks),
+    where result is a MainController-style dict plus "inference_sec" and "chunks".
+    """
+    from main_controller import MainController
+
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    ranges = split_ranges(frame_count(video_path), chunks or workers)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(multi_person, detector_options, detector_factory)) as pool:
+        futures = [pool.submit(_infer_range, str(video_path), first, end, overlap) for first, end in ranges]
+        chunk_results = [future.result() for future in futures]
+    inference_sec = time.perf_counter() - start
+
+    landmarks = merge_chunks(chunk_results, ranges)
+    controller = MainController(video_path, headless=True, **(controller_options or {}))
+    result = controller.replay(landmarks)
+    elapsed = time.perf_counter() - start
+
+    result.update({
+        "elapsed_sec": elapsed,
+        "fps": len(landmarks) / elapsed if elapsed > 0 else 0.0,
+        "replayed": False,
+        "detector": _merge_metrics(chunk_results),
+        "inference_sec": inference_sec,
+        "chunks": [{"start": first, "end": first + len(chunk["landmarks"]), "frames_decoded": chunk["frames_decoded"],
+                    "wall_sec": chunk["wall_sec"]} for (first, _), chunk in zip(ranges, chunk_results)]
+    })
+    return result, landmarks
+
+
+def _score_differences(result, reference):
+    """Largest absolute difference between two runs' per-rep scores (None if the rep counts differ)."""
+    if len(result["reps"]) != len(reference["reps"]):
+        return None
+    return max((abs(rep[key] - ref[key]) for rep, ref in zip(result["reps"], reference["reps"]) for key in rep),
+               default=0.0)
+
+
+def speedup_report(video_path, worker_counts, overlap=30, multi_person=False, detector_options=None,
+                   detector_factory=None):
+    """Time a sequential run and a chunked run per worker count, and compare their rep scores."""
+    from main_controller import MainController
+
+    detector = detector_factory() if detector_factory is not None else None
+    sequential = MainController(video_path, headless=True, detector=detector, multi_person=multi_person,
+                                detector_options=detector_options).run()
+    if detector is not None:
+        detector.close()
+
+    report = {"video": str(video_path), "frames": sequential["frames"], "reps": len(sequential["reps"]),
+              "sequential_sec": sequential["elapsed_sec"], "cpu_count": os.cpu_count(), "runs": []}
+    for workers in worker_counts:
+        result, _ = run_chunked(video_path, workers=workers, overlap=overlap, multi_person=multi_person,
+                                detector_options=detector_options, detector_factory=detector_factory)
+        report["runs"].append({
+            "workers": workers,
+            "elapsed_sec": result["elapsed_sec"],
+            "fps": result["fps"],
+            "speedup": sequential["elapsed_sec"] / result["elapsed_sec"],
+            "reps": len(result["reps"]),
+            "max_rep_score_diff": _score_differences(result, sequential)
+        })
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score one long video with pose inference split over processes.")
+    parser.add_argument("video_path")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunks", type=int, default=None, help="frame ranges to split into (default: workers)")
+    parser.add_argument("--overlap", type=int, default=30,
+                        help="frames decoded before each chunk to settle pose tracking (default: 30)")
+    parser.add_argument("--inference-size", type=int, default=None,
+                        help="crop to the lifter and downscale to this many pixels before pose inference")
+    parser.add_argument("--pose-backend", default="mediapipe",
+                        help="mediapipe[:model complexity 0-2] or landmarker:<PoseLandmarker .task file> "
+                             "(default: mediapipe, complexity 1)")
+    parser.add_argument("--multi-person", action="store_true",
+                        help="track everyone in view and score only the lifter")
+    parser.add_argument("--save-landmarks", default=None,
+                        help="save the merged (T, 33, 4) landmarks as .npy (input for batch_scoring.py)")
+    parser.add_argument("--report", action="store_true",
+                        help="compare against a sequential run for 1, 2, 4, ... workers up to the CPU count")
+    args = parser.parse_args()
+
+    options = {"inference_size": args.inference_size, **parse_backend_spec(args.pose_backend)[1]}
+    if args.report:
+        counts = [1]
+        while counts[-1] * 2 <= (args.workers or os.cpu_count() or 1):
+            counts.append(counts[-1] * 2)
+        report = speedup_report(args.video_path, counts, overlap=args.overlap, multi_person=args.multi_person,
+                                detector_options=options)
+        print(f"sequential: {report['frames']} frames, {report['reps']} reps in {report['sequential_sec']:.1f}s")
+        print(f"{'workers':>8}{'seconds':>10}{'fps':>10}{'speedup':>10}{'reps':>6}{'max diff':>10}")
+        for run in report["runs"]:
+            diff = f"{run['max_rep_score_diff']:.4f}" if run["max_rep_score_diff"] is not None else "reps differ"
+            print(f"{run['workers']:>8}{run['elapsed_sec']:>10.1f}{run['fps']:>10.1f}{run['speedup']:>10.2f}"
+                  f"{run['reps']:>6}{diff:>10}")
+    else:
+        result, landmarks = run_chunked(args.video_path, workers=args.workers, chunks=args.chunks,
+                                        overlap=args.overlap, multi_person=args.multi_person,
+                                        detector_options=options)
+        if args.save_landmarks:
+            np.save(args.save_landmarks, landmarks)
+        print(json.dumps(result, indent=2, default=float))
@@ -1,52 +1,176 @@
 # dominant_person_detector.py
+import time
+
 import cv2
-import mediapipe as mp
 import numpy as np
+from pose_array import VISIBILITY
+from pose_backends import backend_settings, create_backend
+from profiling import NULL_PROFILER
+from roi import RoiPreprocessor
+
 
 class DominantPersonDetector:
-    def __init__(self):
-        self.mp_pose = mp.solutions.pose
+    """
+    Owns one pose backend (pose_backends.py, MediaPipe Pose by default) for
+    its whole lifetime. Close it explicitly
+    (or use it as a context manager) to release the native resources.
+
+    Instead of rebuilding the graph on a fixed schedule, the graph's tracking
+    state is reset only after tracking has been lost for max_lost_frames frames
+    in a row. A frame counts as lost when no pose is found or the mean landmark
+    visibility drops below min_visibility.
+
+    With inference_size set, frames are cropped to the lifter's padded bounding
+    box from the previous frame (roi_crop) and downscaled before inference; the
+    returned landmarks are always normalized to the full frame.
+    """
+
+    def __init__(self, max_lost_frames=15, min_visibility=0.3,
+                 min_detection_confidence=0.5, min_tracking_confidence=0.5,
+                 inference_size=None, roi_padding=0.25, roi_crop=True, backend="mediapipe",
+                 backend_options=None):
+        self.min_detection_confidence = min_detection_confidence
+        self.min_tracking_confidence = min_tracking_confidence
+        # e.g. {"model_complexity": 0} or {"model_path": "pose_landmarker_lite.task"}
+        self.backend = backend
+        self.backend_options = dict(backend_options or {})
         self.pose = self._get_pose_model()
-        self.drawing_utils = mp.solutions.drawing_utils
+        self.max_lost_frames = max_lost_frames
+        self.min_visibility = min_visibility
+        self.preprocessor = None
+        if inference_size is not None:
+            self.preprocessor = RoiPreprocessor(inference_size, padding=roi_padding, crop=roi_crop)
+        # Replaced with a StageProfiler to time preprocess/pose/landmark conversion
+        self.profiler = NULL_PROFILER
+        self.closed = False
+        self._reset_counters()
 
     def _get_pose_model(self):
-        """Initialize a new MediaPipe pose model."""
-        return self.mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
+        """Create the pose backend. MediaPipe is only imported here, so scoring and replays never load it."""
+        return create_backend(self.backend, min_detection_confidence=self.min_detection_confidence,
+                              min_tracking_confidence=self.min_tracking_confidence, **self.backend_options)
+
+    @classmethod
+    def settings_for(cls, max_lost_frames=15, min_visibility=0.3, min_detection_confidence=0.5,
+                     min_tracking_confidence=0.5, inference_size=None, roi_padding=0.25, roi_crop=True,
+                     backend="mediapipe", backend_options=None):
+        """settings() of a detector built with these options, without building it or loading MediaPipe."""
+        cropped = inference_size is not None
+        return {
+            **backend_settings(backend, **(backend_options or {})),
+            "min_detection_confidence": min_detection_confidence,
+            "min_tracking_confidence": min_tracking_confidence,
+            "max_lost_frames": max_lost_frames,
+            "min_visibility": min_visibility,
+            "inference_size": inference_size,
+            "roi_padding": roi_padding if cropped else None,
+            "roi_crop": roi_crop if cropped else None
+        }
+
+    def settings(self):
+        """Everything that changes the landmarks produced for a video (used as a cache key)."""
+        return {
+            **self.pose.settings(),
+            "min_detection_confidence": self.min_detection_confidence,
+            "min_tracking_confidence": self.min_tracking_confidence,
+            "max_lost_frames": self.max_lost_frames,
+            "min_visibility": self.min_visibility,
+            "inference_size": self.preprocessor.inference_size if self.preprocessor else None,
+            "roi_padding": self.preprocessor.padding if self.preprocessor else None,
+            "roi_crop": self.preprocessor.crop if self.preprocessor else None
+        }
+
+    def _reset_counters(self):
+        self.lost_streak = 0
+        self.frames = 0
+        self.frames_without_landmarks = 0
+        self.tracking_losses = 0
+        self.redetections = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def close(self):
+        """Release the pose backend. Safe to call more than once."""
+        if not self.closed:
+            self.pose.close()
+            self.closed = True
+
+    def reset(self):
+        """Clear the temporal tracking state and metrics so the next frame starts a new video."""
+        self.pose.reset()
+        if self.preprocessor is not None:
+            self.preprocessor.reset()
+        self._reset_counters()
+
+    def warm_up(self, frame_size=(640, 480)):
+        """
+        Run the pose graph once on a blank frame, so model loading and graph setup
+        happen now instead of on the first real frame, then reset the tracking
+        state and counters. Returns the seconds it took.
+        """
+        start = time.perf_counter()
+        w, h = frame_size
+        self.find_dominant_person(np.zeros((h, w, 3), dtype=np.uint8))
+        self.reset()
+        return time.perf_counter() - start
 
     def find_dominant_person(self, frame):
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.pose.process(frame_rgb)
-        return results.pose_landmarks
-
-    def draw_landmarks(self, frame, landmarks):
-        """Draw pose landmarks on the frame."""
-        self.drawing_utils.draw_landmarks(
-            frame, landmarks, self.mp_pose.POSE_CONNECTIONS
-        )
-
-    def draw_bounding_box(self, frame, landmarks, h, w):
-        """Draw bounding box around detected dominant person."""
-        landmarks_list = landmarks.landmark
-
-        # Calculate visibility score
-        visibility_score = np.mean([landmark.visibility for landmark in landmarks_list])
-
-        # Get bounding box coordinates
-        xs = [landmark.x for landmark in landmarks_list]
-        ys = [landmark.y for landmark in landmarks_list]
-
-        min_x, max_x = int(min(xs) * w), int(max(xs) * w)
-        min_y, max_y = int(min(ys) * h), int(max(ys) * h)
-
-        # Compute bounding box area
-        bbox_area = (max_x - min_x) * (max_y - min_y)
-
-        # Combine visibility score and size into a dominance score
-        dominance_score = 0.7 * visibility_score + 0.3 * (bbox_area / (h * w))
-
-        # Draw bounding box and score
-        cv2.rectangle(frame, (min_x, min_y), (max_x, max_y), (0, 255, 0), 2)
-        cv2.putText(frame, f"Score: {dominance_score:.2f}",
-                    (min_x, min_y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-        center_x, center_y = (min_x + max_x) // 2, (min_y + max_y) // 2
-        cv2.circle(frame, (center_x, center_y), 10, (0, 255, 0), -1)
+        """Return the pose as a (33, 4) float32 landmark array, or None if nobody was found."""
+        if self.closed:
+            raise RuntimeError("DominantPersonDetector is closed")
+
+        profiler = self.profiler
+        started = profiler.start()
+        if self.preprocessor is not None:
+            frame_rgb, roi = self.preprocessor.prepare(frame)
+        else:
+            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        started = profiler.stop("preprocess", started)
+        landmarks = self.pose.process(frame_rgb)
+        started = profiler.stop("pose", started)
+
+        if self.preprocessor is not None:
+            if landmarks is not None:
+                self.preprocessor.to_frame_coords(landmarks, roi, frame.shape)
+            # Next frame: crop around this pose, or fall back to the full frame
+            self.preprocessor.update(landmarks, frame.shape)
+        profiler.stop("postprocess", started)
+
+        self.frames += 1
+        if landmarks is None:
+            self.frames_without_landmarks += 1
+        self._update_tracking(landmarks)
+        return landmarks
+
+    def _update_tracking(self, landmarks):
+        """Apply the re-detection policy: reset the graph once tracking stays lost."""
+        lost = landmarks is None or landmarks[:, VISIBILITY].mean() < self.min_visibility
+
+        if not lost:
+            self.lost_streak = 0
+            return
+
+        if self.lost_streak == 0:
+            self.tracking_losses += 1
+        self.lost_streak += 1
+        if self.lost_streak == self.max_lost_frames:
+            # Drop the stale tracking ROI so the next frame runs full person detection
+            self.pose.reset()
+            if self.preprocessor is not None:
+                self.preprocessor.reset()
+            self.redetections += 1
+
+    def metrics(self):
+        """Return how often tracking was lost and re-detection was forced."""
+        return {
+            "frames": self.frames,
+            "frames_without_landmarks": self.frames_without_landmarks,
+            "tracking_losses": self.tracking_losses,
+            "redetections": self.redetections
+        }
+
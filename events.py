@@ -0,0 +1,229 @@
+"""
+Structured events from the tracker, assessor and controller.
+
+Components emit typed events to an EventBus instead of printing. The bus stamps
+each event with the current frame index and time and hands it to its sinks:
+
+    ListSink      keeps events in memory (tests, batch results)
+    NdjsonSink    one JSON object per line, written in buffered batches
+    CallbackSink  calls a function per event
+    ConsoleSink   the human-readable messages the CLI used to print
+    AsyncSink     wraps another sink and feeds it from a background thread
+
+An EventBus without sinks returns from emit() immediately, so headless and
+batch runs pay next to nothing for events nobody listens to.
+"""
+import dataclasses
+import json
+import queue
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+
+
+@dataclass(slots=True)
+class Event:
+    frame: int = field(default=None, kw_only=True)
+    time: float = field(default=None, kw_only=True)
+
+    @property
+    def type(self):
+        return _EVENT_TYPES[type(self)]
+
+    def to_dict(self):
+        return {"type": self.type, **dataclasses.asdict(self)}
+
+
+@dataclass(slots=True)
+class StateChanged(Event):
+    """The SquatTracker moved between "Not Ready", "Ready", "In Rep" and "Finished"."""
+    previous: str
+    state: str
+
+
+@dataclass(slots=True)
+class PostureWarning(Event):
+    """A readiness check failed. Emitted once when the problem appears, not on every frame."""
+    code: str
+    message: str
+
+
+@dataclass(slots=True)
+class RepCompleted(Event):
+    rep: int
+    scores: dict
+
+
+@dataclass(slots=True)
+class WorkoutFinished(Event):
+    reps: int
+    summary: dict
+
+
+_EVENT_TYPES = {
+    StateChanged: "state_changed",
+    PostureWarning: "posture_warning",
+    RepCompleted: "rep_completed",
+    WorkoutFinished: "workout_finished"
+}
+
+
+class EventBus:
+    def __init__(self, sinks=()):
+        self.sinks = list(sinks)
+        # Set by the frame loop so emitters do not need to know where they are in the video
+        self.frame = None
+
+    def subscribe(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def emit(self, event):
+        if not self.sinks:
+            return
+        if event.frame is None:
+            event.frame = self.frame
+        if event.time is None:
+            event.time = time.time()
+        for sink in self.sinks:
+            sink.write(event)
+
+    def close(self):
+        """Flush and close every sink. Safe to call more than once."""
+        for sink in self.sinks:
+            sink.close()
+
+
+class ListSink:
+    def __init__(self):
+        self.events = []
+
+    def write(self, event):
+        self.events.append(event)
+
+    def close(self):
+        pass
+
+
+class CallbackSink:
+    def __init__(self, callback):
+        self.callback = callback
+
+    def write(self, event):
+        self.callback(event)
+
+    def close(self):
+        pass
+
+
+class NdjsonSink:
+    """Appends events as JSON lines, writing to disk every buffer_size events and on close()."""
+
+    def __init__(self, path, buffer_size=256):
+        self.file = open(path, "a", encoding="utf-8")
+        self.buffer_size = buffer_size
+        self.buffer = []
+
+    def write(self, event):
+        # numpy scalars in the score dicts are written as plain floats
+        self.buffer.append(json.dumps(event.to_dict(), default=float))
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.file.write("\n".join(self.buffer) + "\n")
+            self.buffer.clear()
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+class AsyncSink:
+    """
+    Hands events to a background thread that writes them to `sink`, so slow
+    sinks (files on network storage, sockets, terminals) never block the frame
+    loop. If the queue is full the emitter blocks, so no event is lost.
+    """
+
+    _CLOSE = object()
+
+    def __init__(self, sink, max_queue=1024):
+        self.sink = sink
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.closed = False
+        self.thread = threading.Thread(target=self._drain, name="event-sink", daemon=True)
+        self.thread.start()
+
+    def _drain(self):
+        while True:
+            event = self.queue.get()
+            if event is self._CLOSE:
+                break
+            self.sink.write(event)
+        self.sink.close()
+
+    def write(self, event):
+        self.queue.put(event)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.queue.put(self._CLOSE)
+            self.thread.join()
+
+
+def format_summary(summary):
+    """The final score block shown at the end of a workout."""
+    lines = [
+        "",
+        "📊 Final Scores Summary:",
+        f"   🟪 Shoulder Alignment:     {summary['shoulders']:.2f}/20",
+        f"   🟦 Depth Score:            {summary['depth']:.2f}/20",
+        f"   🟩 Knee Tracking:          {summary['knee_tracking']:.2f}/20",
+        f"   🟨 Knee Alignment:         {summary['knee_alignment']:.2f}/20",
+        f"   🟫 Overall Exercise Score: {summary['overall_score']:.2f}/20",
+        "",
+        "💬 personal feedback:"
+    ]
+    lines += [f"  - {line}" for line in summary["feedback"]]
+    return lines
+
+
+class ConsoleSink:
+    """Prints events as the human-readable messages of the interactive CLI."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def format(self, event):
+        if isinstance(event, StateChanged):
+            messages = {"Ready": "Ready to squat", "In Rep": "Squat started", "Finished": "Transitioned to FINISHED state"}
+            if event.previous == "In Rep" and event.state == "Ready":
+                return ["Squat ended"]
+            return [messages.get(event.state, f"State: {event.state}")]
+        if isinstance(event, PostureWarning):
+            return [event.message]
+        if isinstance(event, RepCompleted):
+            scores = event.scores
+            return [
+                f"✅ Final Squat Scores (rep {event.rep}):",
+                f"   Shoulder Alignment Score: {scores['shoulders']:.2f}",
+                f"   Depth Score: {scores['depth']:.2f}",
+                f"   Knee Tracking Score: {scores['knees']:.2f}",
+                f"   Knee Alignment Score: {scores['knees_alinment']:.2f}",
+                f"   Overall Score: {scores['overall_score']:.2f}"
+            ]
+        if isinstance(event, WorkoutFinished):
+            return format_summary(event.summary) + ["Workout Done"]
+        return [str(event)]
+
+    def write(self, event):
+        self.stream.write("\n".join(self.format(event)) + "\n")
+
+    def close(self):
+        self.stream.flush()
@@ -0,0 +1,131 @@
+import queue
+import threading
+import time
+
+from video_processor import VideoProcessor
+
+# Marks the end of the stream on a stage queue
+_END = object()
+
+
+class _StageError:
+    """Carries an exception raised in a worker thread to the scoring thread."""
+    def __init__(self, exc):
+        self.exc = exc
+
+
+class PipelinedVideoProcessor(VideoProcessor):
+    """
+    Runs decode, pose inference and scoring/rendering as three stages connected
+    by bounded queues:
+
+        decode thread --> [queue] --> inference thread --> [queue] --> caller thread
+
+    cap.read() and pose inference both release the GIL, so they overlap with each
+    other and with scoring. Every stage is a single thread reading a FIFO queue,
+    which keeps frame order (and therefore the SquatTracker state machine)
+    identical to the sequential VideoProcessor. When a downstream stage falls
+    behind, the queue fills up and the upstream stage blocks (backpressure), so
+    at most queue_depth frames are buffered between two stages.
+    """
+
+    def __init__(self, video_path, headless=False, queue_depth=4):
+        super().__init__(video_path, headless=headless)
+        if queue_depth < 1:
+            raise ValueError("queue_depth must be at least 1")
+        self.queue_depth = queue_depth
+
+    def process_video(self, frame_callback, squat_readiness_checker=None, infer_callback=None):
+        """
+        infer_callback(frame) runs on the inference thread and its result is passed
+        to frame_callback(frame, result) on the calling thread. Without an
+        infer_callback this falls back to the sequential loop.
+        """
+        if infer_callback is None:
+            return super().process_video(frame_callback, squat_readiness_checker)
+
+        cap = self.open_capture()
+        profiler = self.profiler
+        stop = threading.Event()
+        decoded = queue.Queue(maxsize=self.queue_depth)
+        inferred = queue.Queue(maxsize=self.queue_depth)
+
+        def put(q, item):
+            # Block while the queue is full, but give up once the pipeline is stopping
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def decode_stage():
+            try:
+                while not stop.is_set():
+                    started = profiler.start()
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    profiler.stop("decode", started)
+                    if not put(decoded, frame):
+                        return
+            except Exception as exc:
+                put(decoded, _StageError(exc))
+                return
+            put(decoded, _END)
+
+        def inference_stage():
+            while not stop.is_set():
+                try:
+                    item = decoded.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _END or isinstance(item, _StageError):
+                    put(inferred, item)
+                    return
+                try:
+                    result = infer_callback(item)
+                except Exception as exc:
+                    put(inferred, _StageError(exc))
+                    return
+                if not put(inferred, (item, result)):
+                    return
+
+        workers = [
+            threading.Thread(target=decode_stage, name="pipeline-decode", daemon=True),
+            threading.Thread(target=inference_stage, name="pipeline-inference", daemon=True),
+        ]
+
+        frames = 0
+        stopped_early = False
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        try:
+            while True:
+                started = profiler.start()
+                item = inferred.get()
+                # Time the scoring thread spends waiting on the decode/inference stages
+                profiler.stop("pipeline_wait", started)
+                if item is _END:
+                    break
+                if isinstance(item, _StageError):
+                    raise item.exc
+                frame, result = item
+                frames += 1
+                frame_callback(frame, result)
+                if self.stop_requested():
+                    stopped_early = True
+                    break
+                if self.show_frame(frame, squat_readiness_checker):
+                    stopped_early = True
+                    break
+        finally:
+            stop.set()
+            for worker in workers:
+                worker.join()
+            cap.release()
+            self.close_display()
+
+        return self.build_stats(frames, time.perf_counter() - start, stopped_early)
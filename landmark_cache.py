@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from pose_array import NUM_LANDMARKS
+
+# Bump when the on-disk layout changes so old entries are never misread
+CACHE_FORMAT = 1
+ROW_SHAPE = (NUM_LANDMARKS, 4)
+ROW_DTYPE = np.float32
+
+# Frames without a detected pose are stored as a row of NaNs
+_MISSING_ROW = np.full(ROW_SHAPE, np.nan, dtype=ROW_DTYPE)
+
+
+def hash_video(video_path, chunk_size=1 << 20):
+    """Hash the video file's content, so renamed or re-uploaded copies share a cache entry."""
+    digest = hashlib.sha256()
+    with open(video_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_missing(row):
+    """True if a cached row marks a frame where no pose was found."""
+    return np.isnan(row[0, 0])
+
+
+class LandmarkCache:
+    """
+    Per-frame landmarks on disk, keyed by video content hash plus the detector
+    settings that produced them.
+
+    Each entry is an append-only binary file of float32 (33, 4) rows, one per
+    decoded frame, plus a JSON sidecar. The sidecar is written last, so an
+    interrupted run never leaves an entry that looks complete. Entries are read
+    back as a read-only (T, 33, 4) memory map.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def key(self, video_path, settings):
+        settings_blob = json.dumps({"format": CACHE_FORMAT, **settings}, sort_keys=True)
+        digest = hashlib.sha256()
+        digest.update(hash_video(video_path).encode())
+        digest.update(settings_blob.encode())
+        return digest.hexdigest()
+
+    def _paths(self, key):
+        return self.cache_dir / f"{key}.bin", self.cache_dir / f"{key}.json"
+
+    def load(self, key):
+        """Return (landmarks memmap, metadata) for a complete entry, or None."""
+        data_path, meta_path = self._paths(key)
+        if not meta_path.exists() or not data_path.exists():
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta["frames"] == 0:
+            return np.empty((0,) + ROW_SHAPE, dtype=ROW_DTYPE), meta
+        landmarks = np.memmap(data_path, dtype=ROW_DTYPE, mode="r", shape=(meta["frames"],) + ROW_SHAPE)
+        return landmarks, meta
+
+    def entries(self):
+        """Keys of all complete entries in the cache."""
+        return sorted(path.stem for path in self.cache_dir.glob("*.json"))
+
+    def writer(self, key, meta=None):
+        data_path, meta_path = self._paths(key)
+        return LandmarkCacheWriter(data_path, meta_path, meta or {})
+
+
+class LandmarkCacheWriter:
+    """Appends one landmark row per frame; call finalize() once the whole video was read."""
+
+    def __init__(self, data_path, meta_path, meta):
+        self.data_path = data_path
+        self.meta_path = meta_path
+        self.meta = meta
+        self.partial_path = data_path.with_suffix(".bin.partial")
+        self.file = open(self.partial_path, "wb")
+        self.frames = 0
+
+    def append(self, landmarks):
+        row = _MISSING_ROW if landmarks is None else landmarks
+        self.file.write(np.ascontiguousarray(row, dtype=ROW_DTYPE).tobytes())
+        self.frames += 1
+
+    def finalize(self):
+        self.file.close()
+        os.replace(self.partial_path, self.data_path)
+        meta = {**self.meta, "format": CACHE_FORMAT, "frames": self.frames}
+        tmp_meta_path = self.meta_path.with_suffix(".json.partial")
+        with open(tmp_meta_path, "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_meta_path, self.meta_path)
+
+    def abort(self):
+        """Discard an incomplete entry (e.g. the run was stopped early or failed)."""
+        self.file.close()
+        if self.partial_path.exists():
+            self.partial_path.unlink()
@@ -0,0 +1,201 @@
+import collections
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from video_processor import VideoProcessor
+
+
+class SyntheticCamera:
+    """
+    Stand-in for a camera: read() blocks until the next frame is due at the given
+    fps and returns (True, frame), like cv2.VideoCapture. frame_factory(index)
+    supplies the frames; by default a grey frame whose brightness is the index.
+    """
+
+    def __init__(self, fps=30, size=(640, 480), frames=None, frame_factory=None):
+        self.fps = fps
+        self.size = size
+        self.frames = frames
+        self.frame_factory = frame_factory or self._default_frame
+        self.index = 0
+        self.start = None
+
+    def _default_frame(self, index):
+        width, height = self.size
+        return np.full((height, width, 3), index % 256, dtype=np.uint8)
+
+    def isOpened(self):
+        return self.frames is None or self.index < self.frames
+
+    def read(self):
+        if not self.isOpened():
+            return False, None
+        if self.start is None:
+            self.start = time.perf_counter()
+        # Absolute schedule, so slow readers do not slow the "camera" down
+        due = self.start + self.index / self.fps
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        frame = self.frame_factory(self.index)
+        self.index += 1
+        return True, frame
+
+    def release(self):
+        pass
+
+
+class LatestFrameCapture:
+    """
+    Reads a camera on a dedicated thread and keeps only the newest frame.
+    A frame that is replaced before anybody read it is counted as dropped
+    instead of being queued, so the consumer never falls behind real time.
+    """
+
+    def __init__(self, source):
+        if isinstance(source, (int, str)):
+            source = cv2.VideoCapture(source)
+            if not source.isOpened():
+                raise FileNotFoundError(f"Unable to open camera/stream: {source}")
+        self.source = source
+        self.condition = threading.Condition()
+        self.latest = None  # (sequence, capture_time, frame)
+        self.sequence = 0
+        self.last_read = 0
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.ended = False
+        self.stopped = False
+        self.thread = threading.Thread(target=self._capture_loop, name="live-capture", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _capture_loop(self):
+        try:
+            while not self.stopped:
+                ret, frame = self.source.read()
+                captured_at = time.perf_counter()
+                if not ret:
+                    break
+                with self.condition:
+                    if self.latest is not None and self.latest[0] > self.last_read:
+                        self.frames_dropped += 1
+                    self.sequence += 1
+                    self.frames_captured += 1
+                    self.latest = (self.sequence, captured_at, frame)
+                    self.condition.notify()
+        finally:
+            with self.condition:
+                self.ended = True
+                self.condition.notify_all()
+
+    # Both called with the condition held
+    def _has_new(self):
+        return self.latest is not None and self.latest[0] > self.last_read
+
+    def _can_read(self):
+        return self._has_new() or self.ended
+
+    def read(self, timeout=None):
+        """Wait for a frame newer than the last one read. Returns (capture_time, frame) or None at the end."""
+        with self.condition:
+            self.condition.wait_for(self._can_read, timeout=timeout)
+            if not self._has_new():
+                return None
+            sequence, captured_at, frame = self.latest
+            self.last_read = sequence
+            return captured_at, frame
+
+    def stop(self, timeout=2.0):
+        self.stopped = True
+        self.thread.join(timeout)
+        # Never release the device under a read() that is still blocked
+        if not self.thread.is_alive():
+            self.source.release()
+
+
+class LatencyStats:
+    """Capture-to-feedback latency samples with percentile reporting (keeps the last max_samples)."""
+
+    def __init__(self, max_samples=100000):
+        self.samples = collections.deque(maxlen=max_samples)
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def summary(self):
+        if not self.samples:
+            return {"count": 0}
+        samples_ms = np.fromiter(self.samples, dtype=np.float64) * 1000.0
+        p50, p95, p99 = np.percentile(samples_ms, [50, 95, 99])
+        return {
+            "count": len(samples_ms),
+            "mean_ms": float(samples_ms.mean()),
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "max_ms": float(samples_ms.max())
+        }
+
+
+class LiveVideoProcessor(VideoProcessor):
+    """
+    VideoProcessor for a camera index, stream URL or SyntheticCamera. Frames are
+    processed latest-frame-wins, and the time from capture to the end of the
+    frame callback is recorded for every processed frame. Runs until the
+    source ends, 'q' is pressed, or max_frames / max_seconds is reached.
+    """
+
+    def __init__(self, source, headless=False, max_frames=None, max_seconds=None):
+        super().__init__(source, headless=headless)
+        self.max_frames = max_frames
+        self.max_seconds = max_seconds
+        self.latency = LatencyStats()
+
+    def process_video(self, frame_callback, squat_readiness_checker=None, sampler=None):
+        if sampler is not None:
+            raise ValueError("adaptive sampling is not supported for live sources")
+
+        capture = LatestFrameCapture(self.video_path).start()
+        frames = 0
+        stopped_early = False
+        start = time.perf_counter()
+        try:
+            while True:
+                if self.max_frames is not None and frames >= self.max_frames:
+                    break
+                if self.max_seconds is not None and time.perf_counter() - start >= self.max_seconds:
+                    break
+                if self.stop_requested():
+                    stopped_early = True
+                    break
+                started = self.profiler.start()
+                item = capture.read(timeout=1.0)
+                self.profiler.stop("capture_wait", started)
+                if item is None:
+                    if capture.ended:
+                        break
+                    continue
+                captured_at, frame = item
+                frames += 1
+
+                frame_callback(frame)
+                self.latency.record(time.perf_counter() - captured_at)
+
+                if self.show_frame(frame, squat_readiness_checker):
+                    stopped_early = True
+                    break
+        finally:
+            capture.stop()
+            self.close_display()
+
+        stats = self.build_stats(frames, time.perf_counter() - start, stopped_early)
+        stats["frames_captured"] = capture.frames_captured
+        stats["frames_dropped"] = capture.frames_dropped
+        stats["latency"] = self.latency.summary()
+        return stats
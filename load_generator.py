@@ -0,0 +1,165 @@
+"""
+Load generator for scoring_service.py: N jobs from C concurrent clients.
+
+Upload mode POSTs the video to /jobs and follows /jobs/{id}/events over
+WebSocket. Stream mode decodes the video locally and sends it frame by frame
+(JPEG) over /stream at --stream-fps (0 = as fast as the server accepts). For
+every job the time to the first scored rep and to the final result are
+recorded; the report has throughput, latency percentiles and how many jobs
+were rejected (503 / "try again later") or failed.
+
+Needs aiohttp (pip install aiohttp).
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import aiohttp
+import cv2
+
+from live_capture import LatencyStats
+
+
+async def upload_job(session, base_url, video_bytes):
+    async with session.post(f"{base_url}/jobs", data=video_bytes) as response:
+        if response.status == 503:
+            return None
+        response.raise_for_status()
+        job = await response.json()
+    return job["job_id"]
+
+
+async def follow_events(ws, started, record):
+    """Read messages until job_finished, noting when the first rep score arrived."""
+    async for msg in ws:
+        if msg.type != aiohttp.WSMsgType.TEXT:
+            break
+        message = json.loads(msg.data)
+        if message["type"] == "rep_completed" and record["first_rep_sec"] is None:
+            record["first_rep_sec"] = time.perf_counter() - started
+        elif message["type"] == "job_finished":
+            record["status"] = message["status"]
+            if message["result"]:
+                record["frames"] = message["result"]["frames"]
+                record["reps"] = len(message["result"]["reps"])
+            return
+
+
+async def run_upload(session, base_url, video_bytes):
+    record = {"status": "rejected", "first_rep_sec": None, "total_sec": None, "frames": 0, "reps": 0}
+    started = time.perf_counter()
+    job_id = await upload_job(session, base_url, video_bytes)
+    if job_id is None:
+        return record
+    # Until the server reports how the job ended
+    record["status"] = "failed"
+    async with session.ws_connect(f"{base_url}/jobs/{job_id}/events") as ws:
+        await follow_events(ws, started, record)
+    record["total_sec"] = time.perf_counter() - started
+    return record
+
+
+async def run_stream(session, base_url, jpeg_frames, fps):
+    record = {"status": "rejected", "first_rep_sec": None, "total_sec": None, "frames": 0, "reps": 0}
+    started = time.perf_counter()
+    async with session.ws_connect(f"{base_url}/stream") as ws:
+        first = await ws.receive()
+        if first.type != aiohttp.WSMsgType.TEXT or json.loads(first.data)["type"] != "job_created":
+            return record
+        record["status"] = "failed"
+
+        async def send_frames():
+            for i, frame in enumerate(jpeg_frames):
+                if fps:
+                    delay = started + i / fps - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                await ws.send_bytes(frame)
+            await ws.send_str("end")
+
+        sender = asyncio.create_task(send_frames())
+        await follow_events(ws, started, record)
+        sender.cancel()
+    record["total_sec"] = time.perf_counter() - started
+    return record
+
+
+def encode_frames(video_path, quality=85):
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes())
+    cap.release()
+    return frames
+
+
+async def generate_load(base_url, video_path, jobs=8, concurrency=4, stream=False, stream_fps=30.0):
+    if stream:
+        payload = encode_frames(video_path)
+
+        def run(session):
+            return run_stream(session, base_url, payload, stream_fps)
+    else:
+        with open(video_path, "rb") as f:
+            payload = f.read()
+
+        def run(session):
+            return run_upload(session, base_url, payload)
+
+    slots = asyncio.Semaphore(concurrency)
+    timeout = aiohttp.ClientTimeout(total=None)
+
+    async def one_job(session):
+        async with slots:
+            try:
+                return await run(session)
+            except aiohttp.ClientError as exc:
+                return {"status": "failed", "error": str(exc), "first_rep_sec": None, "total_sec": None,
+                        "frames": 0, "reps": 0}
+
+    start = time.perf_counter()
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        records = await asyncio.gather(*(one_job(session) for _ in range(jobs)))
+    wall = time.perf_counter() - start
+
+    total, first_rep = LatencyStats(), LatencyStats()
+    for record in records:
+        if record["status"] == "done":
+            total.record(record["total_sec"])
+            if record["first_rep_sec"] is not None:
+                first_rep.record(record["first_rep_sec"])
+    statuses = [record["status"] for record in records]
+    frames = sum(record["frames"] for record in records if record["status"] == "done")
+    return {
+        "mode": "stream" if stream else "upload",
+        "jobs": jobs,
+        "concurrency": concurrency,
+        "done": statuses.count("done"),
+        "rejected": statuses.count("rejected"),
+        "cancelled": statuses.count("cancelled"),
+        "failed": statuses.count("failed"),
+        "wall_sec": wall,
+        "jobs_per_sec": statuses.count("done") / wall if wall > 0 else 0.0,
+        "frames_per_sec": frames / wall if wall > 0 else 0.0,
+        "latency": total.summary(),
+        "first_rep_latency": first_rep.summary()
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the scoring service with concurrent clients.")
+    parser.add_argument("video_path")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--jobs", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--stream", action="store_true", help="send frames over /stream instead of uploading")
+    parser.add_argument("--stream-fps", type=float, default=30.0, help="frame rate to stream at (0 = unthrottled)")
+    args = parser.parse_args()
+
+    report = asyncio.run(generate_load(args.url, args.video_path, args.jobs, args.concurrency,
+                                       args.stream, args.stream_fps))
+    print(json.dumps(report, indent=2))
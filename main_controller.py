@@ -1,89 +1,465 @@
+import logging
+import os
+import sys
+import time
+
 from video_processor import VideoProcessor
-from dominant_person import DominantPersonDetector
+from frame_pipeline import PipelinedVideoProcessor
+from renderer import OverlayRenderer
 from squat_tracker import SquatTracker
 from squat_assesor import SquatAssessor
+from pose_array import joint_angles, LEFT_KNEE_ANGLE
+from adaptive_sampling import AdaptiveSampler
+from live_capture import LiveVideoProcessor
+from landmark_cache import LandmarkCache, is_missing
+from profiling import NULL_PROFILER
+from events import EventBus, ConsoleSink, WorkoutFinished, format_summary
+from rep_index import RepIndex, probe_fps
+
+logger = logging.getLogger(__name__)
 
 class MainController:
-    def __init__(self, video_path):
-        self.video_processor = VideoProcessor(video_path)
-        self.detector = DominantPersonDetector()
-        self.squat_readiness_checker = SquatTracker()
-        self.squat_assesor = SquatAssessor()
+    def __init__(self, video_path, headless=False, pipelined=False, queue_depth=4, detector=None,
+                 cache_dir=None, adaptive_stride=None, detector_options=None, video_processor=None,
+                 profiler=None, events=None, multi_person=False, landmark_filter=None,
+                 tracker_options=None, recorder=None, renderer=None, writer=None, scoring_rules=None,
+                 rep_index=False):
+        if adaptive_stride is not None and (pipelined or cache_dir is not None):
+            # Sampling decisions depend on the scoring state, and a cache must hold every frame
+            raise ValueError("adaptive sampling cannot be combined with the pipeline or the landmark cache")
+        if cache_dir is not None and isinstance(video_processor, LiveVideoProcessor):
+            raise ValueError("live sources cannot be cached")
+        if pipelined and isinstance(video_processor, LiveVideoProcessor):
+            # The live processor already reads on its own thread and has no inference stage to split off
+            raise ValueError("live sources cannot be pipelined")
+        if writer is not None and (adaptive_stride is not None or cache_dir is not None):
+            # The output video needs every frame decoded, which sampling and cache replays skip
+            raise ValueError("an output video cannot be combined with adaptive sampling or the landmark cache")
+        self.video_path = video_path
+        self.headless = headless
+        self.pipelined = pipelined
+        if video_processor is not None:
+            # e.g. a LiveVideoProcessor for a camera
+            self.video_processor = video_processor
+        elif pipelined:
+            self.video_processor = PipelinedVideoProcessor(video_path, headless=headless, queue_depth=queue_depth)
+        else:
+            self.video_processor = VideoProcessor(video_path, headless=headless)
+        # A StageProfiler times every stage of the frame loop; the default NULL_PROFILER does nothing
+        self.profiler = profiler if profiler is not None else NULL_PROFILER
+        self.video_processor.profiler = self.profiler
+        # A detector can be shared between runs (e.g. one per batch worker) to skip graph setup.
+        # The controller only closes detectors it created itself.
+        self.owns_detector = detector is None
+        self.detector_options = detector_options or {}
+        self.multi_person = multi_person
+        self._detector = detector
+        if detector is not None:
+            detector.profiler = self.profiler
+        # State changes, rep scores and the final summary are emitted as events; the
+        # console is just one sink, attached by default for interactive runs
+        if events is None:
+            events = EventBus([ConsoleSink()] if not headless else [])
+        self.events = events
+        self.squat_readiness_checker = SquatTracker(events=events, **(tracker_options or {}))
+        # With rep_index, the start/end frame and scores of every rep, for jumping back to single reps
+        # later. Only subscribed when asked for, so a headless run's bus can stay empty
+        self.rep_index = None
+        if rep_index:
+            self.rep_index = events.subscribe(RepIndex(str(video_path), tracker_options=tracker_options))
+        # Optional LandmarkFilter that smooths the landmarks before they are drawn and scored
+        self.landmark_filter = landmark_filter
+        # scoring_rules: a scoring_kernel.ScoringRules, default scoring_config.json
+        self.squat_assesor = SquatAssessor(events=events, rules=scoring_rules)
+        # Optional RepRecorder that keeps every scored frame's metrics for replays
+        self.recorder = recorder
+        # Draws the pose overlays when not headless; can be throttled (see renderer.py)
+        self.renderer = renderer if renderer is not None else OverlayRenderer()
+        # Optional AnnotatedVideoWriter that saves the annotated frames (video_writer.py)
+        self.writer = writer
         self.frames_processed = 0
-        self.rep_scored = False
+        self.frames_scored = 0
+        # Only a completed IN_REP -> READY transition should be scored
+        self.rep_scored = True
+        self.rep_scores = []
+        self.workout_done = False
+        # With a cache dir, landmarks are recorded on the first run and replayed afterwards
+        self.cache = LandmarkCache(cache_dir) if cache_dir is not None else None
+        self.cache_writer = None
+        self.sampler = AdaptiveSampler(adaptive_stride) if adaptive_stride is not None else None
+
+
 
+    def _detector_class(self):
+        if self.multi_person:
+            from person_tracker import MultiPersonDetector
+            return MultiPersonDetector
+        from dominant_person import DominantPersonDetector
+        return DominantPersonDetector
 
+    @property
+    def detector(self):
+        # Built on first use, so replaying landmarks never sets up a pose graph
+        if self._detector is None:
+            self._detector = self._detector_class()(**self.detector_options)
+            self._detector.profiler = self.profiler
+        return self._detector
+
+    def detector_settings(self):
+        """The detector's settings() for the cache key, without building the detector just for that."""
+        if self._detector is not None:
+            return self._detector.settings()
+        return self._detector_class().settings_for(**self.detector_options)
+
+    def close_detector(self):
+        if self.owns_detector and self._detector is not None:
+            self._detector.close()
+
+    def close_writer(self):
+        # Called from run()'s finally: if the run itself failed, a failing close must not replace that error
+        in_flight = sys.exc_info()[1]
+        try:
+            self.writer.close()
+        except Exception:
+            if in_flight is None:
+                raise
+            logger.exception("closing the output video failed while handling %r", in_flight)
 
     def run(self):
-        def process_frame(frame):
+        """
+        Process the whole video and return a result dict with the per-rep scores,
+        the final summary and the processing speed. When a landmark cache is
+        configured and already holds this video, pose inference is skipped and
+        the cached landmarks are replayed instead.
+        """
+        if self.rep_index is not None and self.rep_index.fps is None \
+                and isinstance(self.video_path, (str, os.PathLike)) and os.path.isfile(self.video_path):
+            self.rep_index.fps = probe_fps(self.video_path)
+        if self.cache is not None:
+            settings = self.detector_settings()
+            cache_key = self.cache.key(self.video_path, settings)
+            if self.rep_index is not None:
+                self.rep_index.cache_key = cache_key
+            cached = self.cache.load(cache_key)
+            if cached is not None:
+                self.close_detector()
+                return self.replay(cached[0])
+            self.cache_writer = self.cache.writer(cache_key, {"video": str(self.video_path), "settings": settings})
+
+        try:
+            if self.pipelined:
+                stats = self.video_processor.process_video(self.score_frame, self.squat_readiness_checker,
+                                                           infer_callback=self.detect)
+            else:
+                def process_frame(frame):
+                    self.score_frame(frame, self.detect(frame))
+
+                stats = self.video_processor.process_video(process_frame, self.squat_readiness_checker,
+                                                           sampler=self.sampler)
+        except Exception:
+            if self.cache_writer is not None:
+                self.cache_writer.abort()
+            raise
+        finally:
+            self.close_detector()
+            if self.writer is not None:
+                self.close_writer()
+
+        if self.cache_writer is not None:
+            # Only a fully read video makes a valid cache entry
+            if stats["stopped_early"]:
+                self.cache_writer.abort()
+            else:
+                self.cache_writer.finalize()
+
+        # Not self.detector: after teardown that would build a fresh graph just to read empty metrics
+        detector_metrics = self._detector.metrics() if self._detector is not None else None
+        result = self.build_result(stats, detector_metrics=detector_metrics)
+        if self.sampler is not None:
+            result["sampling"] = self.sampler.stats()
+        return result
+
+    def replay(self, landmarks):
+        """
+        Drive the tracker and assessor from a (T, 33, 4) landmark array (e.g. a cache
+        entry) without decoding or pose inference. Rows of NaNs are frames without a pose.
+        """
+        start = time.perf_counter()
+        for frame_landmarks in landmarks:
             self.frames_processed += 1
-            if self.frames_processed % 200 == 0:
-                print("Reinitializing dominant person detector...")
-                self.detector = DominantPersonDetector()
+            self.score_frame(None, None if is_missing(frame_landmarks) else frame_landmarks)
+        stats = VideoProcessor.build_stats(len(landmarks), time.perf_counter() - start)
+        return self.build_result(stats, replayed=True)
 
-            landmarks = self.detector.find_dominant_person(frame)
-            if not landmarks:
-                return
+    def build_result(self, stats, detector_metrics=None, replayed=False):
+        result = {
+            "video": str(self.video_path),
+            "finished": self.squat_readiness_checker.get_finish() == 1,
+            "reps": self.rep_scores,
+            "summary": self.get_final_scores(),
+            "frames": stats["frames"],
+            "elapsed_sec": stats["elapsed_sec"],
+            "fps": stats["fps"],
+            "replayed": replayed,
+            "detector": detector_metrics
+        }
+        if self.rep_index is not None:
+            result["rep_index"] = self.rep_index.reps
+        # Live sources also report dropped frames and capture-to-feedback latency
+        for key in ("frames_captured", "frames_dropped", "latency"):
+            if key in stats:
+                result[key] = stats[key]
+        if self.writer is not None:
+            result["output_video"] = self.writer.stats()
+        if not self.headless:
+            result["rendering"] = self.renderer.stats()
+        if self.profiler.enabled:
+            self.record_counters(stats, detector_metrics)
+            result["profile"] = self.profiler.summary(stats["elapsed_sec"])
+        return result
 
-            h, w, _ = frame.shape
-            self.detector.draw_landmarks(frame, landmarks)
-            self.detector.draw_bounding_box(frame, landmarks, h, w)
+    def record_counters(self, stats, detector_metrics=None):
+        """Copy the run counters kept elsewhere (detector, live capture, sampler) into the profiler."""
+        self.profiler.set_counter("frames", stats["frames"])
+        self.profiler.set_counter("frames_dropped", stats.get("frames_dropped", 0))
+        self.profiler.set_counter("frames_skipped", self.sampler.frames_skipped if self.sampler else 0)
+        self.profiler.set_counter("reps", len(self.rep_scores))
+        if detector_metrics is not None:
+            self.profiler.set_counter("tracking_losses", detector_metrics["tracking_losses"])
+            self.profiler.set_counter("redetections", detector_metrics["redetections"])
 
-            if self.squat_readiness_checker.get_finish() == 1:
-                self.handle_finished()
-                return
+    def detect(self, frame):
+        """Run pose inference on a frame. In pipelined mode this runs on the inference thread."""
+        self.frames_processed += 1
+        landmarks = self.detector.find_dominant_person(frame)
+        if self.cache_writer is not None:
+            self.cache_writer.append(landmarks)
+        return landmarks
 
-            if self.squat_readiness_checker.get_ready() == 1 or self.squat_readiness_checker.get_inrep() == 1:
-                self.handle_rep_progress(landmarks)
-            else:
-                self.squat_readiness_checker.is_ready_to_squat(landmarks)
+    def score_frame(self, frame, landmarks):
+        """Advance the tracker/assessor for one frame and draw the landmarks."""
+        self.frames_scored += 1
+        # Video frame index; frames skipped by the sampler still count
+        frame_index = self.frames_scored - 1 + (self.sampler.frames_skipped if self.sampler else 0)
+        self.events.frame = frame_index
+        if landmarks is None:
+            self.profiler.count("frames_without_landmarks")
+            if self.writer is not None and frame is not None:
+                self.writer.write(frame, None, frame_index, self.squat_readiness_checker.get_current_state())
+            return
+
+        profiler = self.profiler
+        if self.landmark_filter is not None:
+            started = profiler.start()
+            landmarks = self.landmark_filter.apply(landmarks, frame_index)
+            profiler.stop("filter", started)
 
-        self.video_processor.process_video(process_frame, self.squat_readiness_checker)
+        started = profiler.start()
+        if self.squat_readiness_checker.get_finish() == 1:
+            self.handle_finished()
+        else:
+            self.update_state(landmarks, frame_index)
+        profiler.stop("scoring", started)
+
+        if self.writer is not None and frame is not None:
+            # Before the in-place overlays, the writer draws its own on a copy
+            started = profiler.start()
+            self.writer.write(frame, landmarks, frame_index, self.squat_readiness_checker.get_current_state())
+            profiler.stop("output", started)
+
+        # Drawn after scoring, so a throttled renderer can pick the frames where the state changed
+        if not self.headless and frame is not None and \
+                self.renderer.should_render(frame_index, self.squat_readiness_checker.get_current_state()):
+            started = profiler.start()
+            self.renderer.draw(frame, landmarks)
+            profiler.stop("render", started)
+
+    def update_state(self, landmarks, frame_index):
+        # Every joint angle the tracker and assessor need, computed once for this frame
+        angles = joint_angles(landmarks)
+        metrics = None
+        reps_before = len(self.rep_scores)
+        if self.squat_readiness_checker.get_ready() == 1 or self.squat_readiness_checker.get_inrep() == 1:
+            metrics = self.handle_rep_progress(landmarks, angles)
+        else:
+            self.squat_readiness_checker.is_ready_to_squat(landmarks, angles)
+
+        rep_scored = len(self.rep_scores) > reps_before
+        if self.recorder is not None:
+            self.recorder.record(frame_index, self.squat_readiness_checker.get_current_state(),
+                                 angles[LEFT_KNEE_ANGLE], metrics)
+            if rep_scored:
+                self.recorder.close_rep(self.rep_scores[-1])
+        if rep_scored and self.writer is not None:
+            self.writer.show_card(len(self.rep_scores), self.rep_scores[-1], frame_index)
+
+        if self.sampler is not None:
+            self.sampler.update(self.squat_readiness_checker.get_current_state(), angles[LEFT_KNEE_ANGLE])
 
     def handle_finished(self):
-        final_score = self.squat_assesor.get_total_exercise_score()
-   #     print(f"final score:{final_score:.2f}")
-        self.print_final_scores()
-        print("Workout Done")
+        if self.workout_done:
+            return
+        self.workout_done = True
+        self.events.emit(WorkoutFinished(len(self.rep_scores), self.get_final_scores()))
 
-    def handle_rep_progress(self, landmarks):
-        self.squat_readiness_checker.squat_rep_position(landmarks)
+    def handle_rep_progress(self, landmarks, angles=None):
+        """Advance the rep state; returns the frame's metrics while IN_REP, otherwise None."""
+        if angles is None:
+            angles = joint_angles(landmarks)
+        self.squat_readiness_checker.squat_rep_position(landmarks, angles)
         self.squat_readiness_checker.check_finished_transition(landmarks)
 
         if self.squat_readiness_checker.get_inrep() == 1:
-            self.squat_assesor.evaluate_shoulder_alignment(landmarks)
-            self.squat_assesor.evaluate_knee_alignment(landmarks)
-            self.squat_assesor.get_depth(landmarks)
-            self.squat_assesor.evaluate_knee_tracking(landmarks)
             self.rep_scored = False
+            return self.squat_assesor.evaluate_frame(landmarks, angles)
 
-        elif self.squat_readiness_checker.get_ready() == 1 and not self.rep_scored:
-            self.squat_assesor.assess_squat(landmarks)
+        if self.squat_readiness_checker.get_ready() == 1 and not self.rep_scored:
+            self.rep_scores.append(self.squat_assesor.assess_squat(landmarks, angles))
             self.squat_assesor.reset()
             self.rep_scored = True
+        return None
+
+    def get_final_scores(self):
+        """Return the averaged scores over all reps together with the feedback lines."""
+        return self.squat_assesor.get_summary()
 
     def print_final_scores(self):
-        shoulder_avg = self.squat_assesor.get_total_shoulder_score()
-        depth_avg = self.squat_assesor.get_total_depth_score()
-        knee_track_avg = self.squat_assesor.get_total_knee_tracking_score()
-        knee_align_avg = self.squat_assesor.get_total_knee_alignment_score()
-        overall = self.squat_assesor.get_total_exercise_score()
+        print("\n".join(format_summary(self.get_final_scores())))
+
+
+# Run the application
+if __name__ == "__main__":
+    import argparse
+    import json
 
-        print("\n📊 Final Scores Summary:")
-        print(f"   🟪 Shoulder Alignment:     {shoulder_avg:.2f}/20")
-        print(f"   🟦 Depth Score:            {depth_avg:.2f}/20")
-        print(f"   🟩 Knee Tracking:          {knee_track_avg:.2f}/20")
-        print(f"   🟨 Knee Alignment:         {knee_align_avg:.2f}/20")
-        print(f"   🟫 Overall Exercise Score: {overall:.2f}/20")
+    import cv2
 
-        feedback = self.squat_assesor.generate_feedback(shoulder_avg, depth_avg, knee_track_avg, knee_align_avg)
+    from landmark_filter import LandmarkFilter
+    from pose_backends import parse_backend_spec
+    from scoring_kernel import load_rules
 
-        print("\n💬 personal feedback:")
-        for line in feedback:
-            print(f"  - {line}")
+    parser = argparse.ArgumentParser(description="Score a squat video.")
+    parser.add_argument("video_path", nargs="?", default="squat_bad.mp4",
+                        help="video file, or with --live a camera index or stream URL")
+    parser.add_argument("--live", action="store_true",
+                        help="process a camera/stream in real time, dropping stale frames")
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="stop a live session after this many seconds")
+    parser.add_argument("--headless", action="store_true",
+                        help="skip all GUI/overlay work and print the result as JSON")
+    parser.add_argument("--pipelined", action="store_true",
+                        help="overlap decoding, pose inference and scoring on separate threads")
+    parser.add_argument("--queue-depth", type=int, default=4,
+                        help="frames buffered between pipeline stages (default: 4)")
+    parser.add_argument("--cache-dir", default=None,
+                        help="record landmarks here and replay them on later runs of the same video")
+    parser.add_argument("--adaptive-stride", type=int, default=None,
+                        help="only infer every Nth frame until a rep is about to start")
+    parser.add_argument("--inference-size", type=int, default=None,
+                        help="crop to the lifter and downscale to this many pixels before pose inference")
+    parser.add_argument("--pose-backend", default="mediapipe",
+                        help="mediapipe[:model complexity 0-2] or landmarker:<PoseLandmarker .task file> "
+                             "(default: mediapipe, complexity 1)")
+    parser.add_argument("--multi-person", action="store_true",
+                        help="track everyone in view with persistent IDs and score only the lifter")
+    parser.add_argument("--smooth", action="store_true",
+                        help="smooth the landmarks with a One-Euro filter before scoring")
+    parser.add_argument("--dwell-frames", type=int, default=1,
+                        help="frames a rep start/end or finish condition must hold before it counts")
+    parser.add_argument("--render-every", type=int, default=1,
+                        help="only draw the pose overlays on every Nth frame")
+    parser.add_argument("--render-keyframes", action="store_true",
+                        help="only draw the pose overlays on frames where the squat state changes")
+    parser.add_argument("--output-video", default=None,
+                        help="write the annotated frames (skeleton, state, rep score cards) to this video file")
+    parser.add_argument("--output-size", default=None,
+                        help="resolution of the output video as WxH (default: the source resolution)")
+    parser.add_argument("--output-every", type=int, default=1,
+                        help="only write every Nth frame to the output video")
+    parser.add_argument("--highlights", action="store_true",
+                        help="only write the IN_REP segments to the output video")
+    parser.add_argument("--rep-index", default=None,
+                        help="save the start/end frame and scores of every rep to this JSON file (see rep_index.py)")
+    parser.add_argument("--scoring-config", default=None,
+                        help="scoring thresholds and weights (default: scoring_config.json)")
+    parser.add_argument("--record", default=None,
+                        help="save every scored frame's metrics to this .csv, .parquet or .npy file")
+    parser.add_argument("--profile", default=None,
+                        help="time every frame loop stage and write the JSON summary to this file")
+    parser.add_argument("--metrics-file", default=None,
+                        help="also write the stage timers and counters in Prometheus text format")
+    parser.add_argument("--events", default=None,
+                        help="append state changes, rep scores and the summary to this NDJSON file")
+    args = parser.parse_args()
+    if args.live and args.pipelined:
+        parser.error("--live cannot be combined with --pipelined")
 
+    events = None
+    if args.events:
+        from events import AsyncSink, NdjsonSink
+        events = EventBus([AsyncSink(NdjsonSink(args.events))])
+        if not args.headless:
+            events.subscribe(ConsoleSink())
 
-# Run the application
-if __name__ == "__main__":
-    controller = MainController(video_path="squat_bad.mp4")
-    controller.run()
+    profiler = None
+    if args.profile or args.metrics_file:
+        from profiling import StageProfiler
+        profiler = StageProfiler()
+
+    recorder = None
+    if args.record:
+        from rep_recorder import RepRecorder
+        recorder = RepRecorder()
+
+    writer = None
+    if args.output_video:
+        from video_writer import AnnotatedVideoWriter
+        if args.live:
+            fps = 30.0
+        else:
+            cap = cv2.VideoCapture(args.video_path)
+            fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+            cap.release()
+        writer = AnnotatedVideoWriter(args.output_video, fps=fps, every=args.output_every,
+                                      size=tuple(map(int, args.output_size.lower().split("x")))
+                                      if args.output_size else None,
+                                      highlights_only=args.highlights,
+                                      # Only a live session has to keep up; files get every frame
+                                      drop_frames=args.live)
+
+    video_processor = None
+    if args.live:
+        source = int(args.video_path) if args.video_path.isdigit() else args.video_path
+        video_processor = LiveVideoProcessor(source, headless=args.headless, max_seconds=args.max_seconds)
+
+    controller = MainController(video_path=args.video_path, headless=args.headless,
+                                pipelined=args.pipelined, queue_depth=args.queue_depth,
+                                cache_dir=args.cache_dir, adaptive_stride=args.adaptive_stride,
+                                detector_options={"inference_size": args.inference_size,
+                                                  **parse_backend_spec(args.pose_backend)[1]},
+                                video_processor=video_processor, profiler=profiler, events=events,
+                                multi_person=args.multi_person,
+                                landmark_filter=LandmarkFilter() if args.smooth else None,
+                                tracker_options={"start_dwell": args.dwell_frames, "end_dwell": args.dwell_frames,
+                                                 "finish_dwell": args.dwell_frames},
+                                recorder=recorder,
+                                renderer=OverlayRenderer(every=args.render_every,
+                                                         keyframes_only=args.render_keyframes),
+                                writer=writer,
+                                scoring_rules=load_rules(args.scoring_config),
+                                rep_index=bool(args.rep_index))
+    try:
+        result = controller.run()
+    finally:
+        controller.events.close()
+    if args.profile:
+        with open(args.profile, "w") as f:
+            json.dump(result["profile"], f, indent=2)
+    if args.metrics_file:
+        profiler.write_prometheus(args.metrics_file)
+    if recorder is not None:
+        recorder.write(args.record)
+    if args.rep_index:
+        controller.rep_index.save(args.rep_index)
+    if args.headless:
+        print(json.dumps(result, indent=2))
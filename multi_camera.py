@@ -0,0 +1,377 @@
+"""
+Several video sources at once: a front and a side camera on one lifter, or
+several gym-floor stations on one machine.
+
+Each source is decoded in its own process. Decoded frames go straight into
+that source's shared-memory ring buffer (cap.read() writes into the slot), so
+a full-resolution frame is never pickled or copied between processes. Only
+(source, slot, frame index, timestamp) tuples travel over the queues. Pose
+inference runs in a pool of worker processes. Each source is pinned to one
+worker, which keeps a detector per source, because pose tracking needs that
+source's frames in order. A worker hands the slot back to the decoder as soon
+as the landmarks are out, and the decoder blocks on a full ring (files) or
+drops the frame (live cameras). Throughput therefore grows with the number of
+sources until there is one worker per core.
+
+Every frame keeps its capture timestamp, the position in the file or the
+monotonic clock for cameras. align_views() matches a front view to a side view
+by nearest timestamp. score_views() then scores depth and the rep segmentation
+from the side view, and the alignment and knee tracking metrics from the front
+view (batch_scoring.score_landmarks(front=...)).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from landmark_cache import ROW_DTYPE, ROW_SHAPE
+from pose_backends import parse_backend_spec
+
+
+def _is_camera(source):
+    return isinstance(source, int) or str(source).isdigit()
+
+
+def _open(source):
+    cap = cv2.VideoCapture(int(source) if _is_camera(source) else str(source))
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Unable to open video: {source}")
+    return cap
+
+
+def probe_frame_shape(source):
+    """(h, w, 3) of the source's frames, read from the first frame."""
+    cap = _open(source)
+    ret, frame = cap.read()
+    cap.release()
+    if not ret:
+        raise IOError(f"No frames in {source}")
+    return frame.shape
+
+
+class FrameRing:
+    """
+    `slots` frames of one shape in one shared-memory block. The creating
+    process owns the block (unlink=True on close); the others attach by name.
+    """
+
+    def __init__(self, shape, slots, name=None):
+        self.shape = tuple(shape)
+        self.slots = slots
+        size = slots * int(np.prod(self.shape))
+        self.shm = shared_memory.SharedMemory(name=name, create=name is None, size=size if name is None else 0)
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self.shm.buf)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self, unlink=False):
+        # The ndarray view must go before the mapping can be closed
+        self.frames = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def _fit(frame, slot):
+    """Put a frame that cap.read() could not decode in place into the slot."""
+    if frame.shape == slot.shape:
+        np.copyto(slot, frame)
+    else:
+        cv2.resize(frame, (slot.shape[1], slot.shape[0]), dst=slot, interpolation=cv2.INTER_AREA)
+
+
+def _decode_source(source_id, source, ring_name, shape, slots, free, tasks, max_frames):
+    """Decoder process: fill free ring slots and queue them for the source's inference worker."""
+    ring = FrameRing(shape, slots, name=ring_name)
+    live = _is_camera(source)
+    cap = _open(source)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frame_index = 0
+    dropped = 0
+    frame = None
+    try:
+        while max_frames is None or frame_index < max_frames:
+            try:
+                slot = free.get(block=not live)
+            except queue.Empty:
+                # Every slot is still waiting for inference: a camera moves on without us
+                if not cap.grab():
+                    break
+                dropped += 1
+                continue
+            ret, frame = cap.read(ring.frames[slot])
+            if not ret:
+                free.put(slot)
+                break
+            if not np.shares_memory(frame, ring.frames[slot]):
+                _fit(frame, ring.frames[slot])
+            if live:
+                timestamp = time.monotonic() * 1000.0
+            else:
+                timestamp = cap.get(cv2.CAP_PROP_POS_MSEC) or frame_index * 1000.0 / fps
+            tasks.put((source_id, slot, frame_index, timestamp))
+            frame_index += 1
+    finally:
+        cap.release()
+        tasks.put((source_id, None, frame_index, dropped))
+        frame = None
+        ring.close()
+
+
+def _build_detector(multi_person, detector_options, detector_factory):
+    if detector_factory is not None:
+        return detector_factory()
+    if multi_person:
+        from person_tracker import MultiPersonDetector
+        return MultiPersonDetector(**(detector_options or {}))
+    from dominant_person import DominantPersonDetector
+    return DominantPersonDetector(**(detector_options or {}))
+
+
+def _infer_worker(rings, free, tasks, results, multi_person, detector_options, detector_factory):
+    """
+    Inference process for the sources in `rings` ({source_id: (name, shape, slots)}).
+    Sends ("ready",) once its detectors are warm, then one result per frame.
+    """
+    views = {}
+    detectors = {}
+    for source_id, (name, shape, slots) in rings.items():
+        views[source_id] = FrameRing(shape, slots, name=name)
+        detector = detectors[source_id] = _build_detector(multi_person, detector_options, detector_factory)
+        if hasattr(detector, "warm_up"):
+            detector.warm_up(shape[1::-1])
+    results.put(("ready",))
+    try:
+        open_sources = len(rings)
+        while open_sources:
+            source_id, slot, frame_index, value = tasks.get()
+            if slot is None:
+                # End of the source: value is the number of dropped frames
+                results.put(("end", source_id, frame_index, value, detectors[source_id].metrics()))
+                open_sources -= 1
+                continue
+            landmarks = detectors[source_id].find_dominant_person(views[source_id].frames[slot])
+            free[source_id].put(slot)
+            results.put(("frame", source_id, frame_index, value, landmarks))
+    finally:
+        for source_id, ring in views.items():
+            ring.close()
+            detectors[source_id].close()
+
+
+def run_sources(sources, workers=None, slots=8, multi_person=False, detector_options=None,
+                detector_factory=None, max_frames=None):
+    """
+    Decode and run pose inference on every source concurrently. Returns a dict
+    with one entry per source under "sources" ("landmarks" (T, 33, 4) with NaN
+    rows where no pose was found, "timestamps_ms", "frames", "dropped",
+    "detector"), plus "elapsed_sec", "fps" (all sources together) and "workers".
+    """
+    sources = list(sources)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(sources)))
+    context = multiprocessing.get_context()
+    shapes = [probe_frame_shape(source) for source in sources]
+    rings = [FrameRing(shape, slots) for shape in shapes]
+    free = [context.Queue() for _ in sources]
+    for free_slots in free:
+        for slot in range(slots):
+            free_slots.put(slot)
+    tasks = [context.Queue() for _ in range(workers)]
+    results = context.Queue()
+
+    # Source i goes to worker i % workers
+    pinned = [{i: (rings[i].name, rings[i].shape, slots) for i in range(w, len(sources), workers)}
+              for w in range(workers)]
+    processes = [context.Process(target=_infer_worker, name=f"pose-worker-{w}", daemon=True,
+                                 args=(pinned[w], free, tasks[w], results, multi_person, detector_options,
+                                       detector_factory))
+                 for w in range(workers)]
+    decoders = [context.Process(target=_decode_source, name=f"decode-{i}", daemon=True,
+                                args=(i, source, rings[i].name, rings[i].shape, slots, free[i],
+                                      tasks[i % workers], max_frames))
+                for i, source in enumerate(sources)]
+
+    collected = [{"rows": {}, "timestamps": {}} for _ in sources]
+    try:
+        for process in processes:
+            process.start()
+        for _ in processes:
+            _wait_for(results, processes + decoders)
+        start = time.perf_counter()
+        for decoder in decoders:
+            decoder.start()
+        open_sources = len(sources)
+        while open_sources:
+            message = _wait_for(results, processes + decoders)
+            if message[0] == "frame":
+                _, source_id, frame_index, timestamp, landmarks = message
+                collected[source_id]["rows"][frame_index] = landmarks
+                collected[source_id]["timestamps"][frame_index] = timestamp
+            else:
+                _, source_id, frames, dropped, metrics = message
+                collected[source_id].update(frames=frames, dropped=dropped, detector=metrics)
+                open_sources -= 1
+        elapsed = time.perf_counter() - start
+        for process in decoders + processes:
+            process.join()
+    finally:
+        for process in decoders + processes:
+            if process.is_alive():
+                process.terminate()
+        for ring in rings:
+            ring.close(unlink=True)
+
+    report = []
+    total_frames = 0
+    for source, entry in zip(sources, collected):
+        indices = sorted(entry["rows"])
+        landmarks = np.full((len(indices),) + ROW_SHAPE, np.nan, dtype=ROW_DTYPE)
+        for row, frame_index in enumerate(indices):
+            if entry["rows"][frame_index] is not None:
+                landmarks[row] = entry["rows"][frame_index]
+        total_frames += len(indices)
+        report.append({
+            "source": str(source),
+            "landmarks": landmarks,
+            "timestamps_ms": np.array([entry["timestamps"][i] for i in indices], dtype=np.float64),
+            "frames": len(indices),
+            "dropped": entry["dropped"],
+            "detector": entry["detector"]
+        })
+    return {"sources": report, "elapsed_sec": elapsed, "fps": total_frames / elapsed if elapsed > 0 else 0.0,
+            "workers": workers}
+
+
+def _wait_for(results, processes, poll_sec=1.0):
+    """Next result message; fails instead of hanging if a decoder or worker died."""
+    while True:
+        try:
+            return results.get(timeout=poll_sec)
+        except queue.Empty:
+            dead = [process.name for process in processes if process.exitcode not in (None, 0)]
+            if dead:
+                raise RuntimeError(f"{', '.join(dead)} exited unexpectedly")
+
+
+def align(timestamps_ms, reference_ms, tolerance_ms):
+    """For each reference timestamp, the index of the nearest frame within tolerance_ms, or -1."""
+    if len(timestamps_ms) == 0:
+        return np.full(len(reference_ms), -1, dtype=np.intp)
+    right = np.clip(np.searchsorted(timestamps_ms, reference_ms), 0, len(timestamps_ms) - 1)
+    left = np.maximum(right - 1, 0)
+    nearest = np.where(np.abs(timestamps_ms[left] - reference_ms) <= np.abs(timestamps_ms[right] - reference_ms),
+                       left, right)
+    return np.where(np.abs(timestamps_ms[nearest] - reference_ms) <= tolerance_ms, nearest, -1)
+
+
+def align_views(front, side, offset_ms=0.0, tolerance_ms=None):
+    """
+    Match the front view to the side view's frames. front and side are
+    run_sources() entries. offset_ms is added to the front timestamps (for
+    cameras started at different times). The default tolerance is half a side
+    frame. Returns (side landmarks, front landmarks with a row per side frame,
+    NaN where no front frame was close enough).
+    """
+    side_ms = side["timestamps_ms"]
+    if tolerance_ms is None:
+        tolerance_ms = float(np.median(np.diff(side_ms))) / 2 if len(side_ms) > 1 else 0.0
+    matches = align(front["timestamps_ms"] + offset_ms, side_ms, tolerance_ms)
+    aligned = np.full(side["landmarks"].shape, np.nan, dtype=ROW_DTYPE)
+    matched = matches >= 0
+    aligned[matched] = front["landmarks"][matches[matched]]
+    return side["landmarks"], aligned
+
+
+def score_views(front, side, offset_ms=0.0, tolerance_ms=None, tracker=None, assessor=None):
+    """Score one lifter from two cameras: depth from the side, alignment and knee tracking from the front."""
+    from batch_scoring import score_landmarks
+
+    side_landmarks, front_landmarks = align_views(front, side, offset_ms, tolerance_ms)
+    result = score_landmarks(side_landmarks, tracker=tracker, assessor=assessor, front=front_landmarks)
+    result["aligned_frames"] = int((~np.isnan(front_landmarks[:, 0, 0])).sum())
+    return result
+
+
+def scaling_report(source, counts, slots=8, multi_person=False, detector_options=None, detector_factory=None,
+                   max_frames=None):
+    """Run 1, 2, ... copies of one source, one worker each, and report how the total fps scales."""
+    report = {"source": str(source), "cpu_count": os.cpu_count(), "runs": []}
+    base_fps = None
+    for count in counts:
+        run = run_sources([source] * count, workers=count, slots=slots, multi_person=multi_person,
+                          detector_options=detector_options, detector_factory=detector_factory,
+                          max_frames=max_frames)
+        base_fps = base_fps or run["fps"]
+        report["runs"].append({
+            "sources": count,
+            "elapsed_sec": run["elapsed_sec"],
+            "fps": run["fps"],
+            "fps_per_source": run["fps"] / count,
+            "scaling": run["fps"] / base_fps if base_fps else 0.0
+        })
+    return report
+
+
+if __name__ == "__main__":
+    from batch_scoring import score_landmarks
+
+    parser = argparse.ArgumentParser(description="Score several cameras or stations at once.")
+    parser.add_argument("sources", nargs="*", help="videos or camera indices, each scored as its own station")
+    parser.add_argument("--front", default=None, help="front camera of a two-camera setup (needs --side)")
+    parser.add_argument("--side", default=None, help="side camera of a two-camera setup (needs --front)")
+    parser.add_argument("--offset-ms", type=float, default=0.0,
+                        help="added to the front camera's timestamps to line it up with the side camera")
+    parser.add_argument("--workers", type=int, default=None, help="inference processes (default: one per source "
+                                                                 "up to the CPU count)")
+    parser.add_argument("--slots", type=int, default=8, help="frames in each source's shared-memory ring")
+    parser.add_argument("--max-frames", type=int, default=None, help="stop each source after this many frames")
+    parser.add_argument("--inference-size", type=int, default=None,
+                        help="crop to the lifter and downscale to this many pixels before pose inference")
+    parser.add_argument("--pose-backend", default="mediapipe",
+                        help="mediapipe[:model complexity 0-2] or landmarker:<PoseLandmarker .task file> "
+                             "(default: mediapipe, complexity 1)")
+    parser.add_argument("--multi-person", action="store_true",
+                        help="track everyone in view and score only the lifter")
+    parser.add_argument("--report", action="store_true",
+                        help="measure throughput for 1, 2, 4, ... copies of the first source up to the CPU count")
+    args = parser.parse_args()
+
+    options = {"inference_size": args.inference_size, **parse_backend_spec(args.pose_backend)[1]}
+    if args.report:
+        counts = [1]
+        while counts[-1] * 2 <= (args.workers or os.cpu_count() or 1):
+            counts.append(counts[-1] * 2)
+        source = (args.sources or [args.side or args.front])[0]
+        if source is None:
+            parser.error("--report needs a source")
+        report = scaling_report(source, counts, slots=args.slots,
+                                multi_person=args.multi_person, detector_options=options,
+                                max_frames=args.max_frames)
+        print(f"{'sources':>8}{'seconds':>10}{'fps':>10}{'per source':>12}{'scaling':>9}")
+        for run in report["runs"]:
+            print(f"{run['sources']:>8}{run['elapsed_sec']:>10.1f}{run['fps']:>10.1f}{run['fps_per_source']:>12.1f}"
+                  f"{run['scaling']:>9.2f}")
+        raise SystemExit(0)
+
+    if bool(args.front) != bool(args.side):
+        parser.error("--front and --side go together")
+    views = [args.front, args.side] if args.front else []
+    run = run_sources(views + args.sources, workers=args.workers, slots=args.slots,
+                      multi_person=args.multi_person, detector_options=options, max_frames=args.max_frames)
+    output = {"elapsed_sec": run["elapsed_sec"], "fps": run["fps"], "workers": run["workers"], "results": []}
+    if views:
+        front, side = run["sources"][:2]
+        output["results"].append({"front": front["source"], "side": side["source"],
+                                  **score_views(front, side, offset_ms=args.offset_ms)})
+    for entry in run["sources"][len(views):]:
+        output["results"].append({"source": entry["source"], "frames": entry["frames"], "dropped": entry["dropped"],
+                                  **score_landmarks(entry["landmarks"])})
+    print(json.dumps(output, indent=2, default=float))
@@ -0,0 +1,323 @@
+"""
+Multi-person tracking for busy gyms.
+
+MediaPipe Pose only follows one person, and once someone else walks closer to
+the camera the pose can jump to them. MultiPersonDetector runs a cheap person
+detector (OpenCV's HOG people detector) every detect_every frames, associates
+the boxes with persistent track IDs by IoU (falling back to centroid distance),
+and picks the lifter by the same dominance score that DominantPersonDetector
+draws, smoothed over time and with hysteresis before switching. Pose inference
+still runs once per frame, only on the selected person's crop, so the cost
+stays close to the single-person detector.
+"""
+import cv2
+import numpy as np
+
+from dominant_person import DominantPersonDetector
+from pose_array import X, Y, dominance_score
+from roi import RoiPreprocessor
+
+
+def iou_matrix(a, b):
+    """IoU between every box in a (N, 4) and b (M, 4), boxes as (x0, y0, x1, y1)."""
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 4)[:, None, :]
+    b = np.asarray(b, dtype=np.float64).reshape(-1, 4)[None, :, :]
+    inter_w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    intersection = inter_w * inter_h
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    union = area_a + area_b - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+def landmark_box(landmarks, frame_shape, padding=0.0):
+    """Pixel bounding box of a (33, 4) landmark array, optionally padded by a fraction of its size."""
+    h, w = frame_shape[:2]
+    min_x, max_x = landmarks[:, X].min() * w, landmarks[:, X].max() * w
+    min_y, max_y = landmarks[:, Y].min() * h, landmarks[:, Y].max() * h
+    pad_x, pad_y = (max_x - min_x) * padding, (max_y - min_y) * padding
+    return np.array([min_x - pad_x, min_y - pad_y, max_x + pad_x, max_y + pad_y])
+
+
+class HogPersonDetector:
+    """
+    OpenCV's built-in HOG + linear SVM people detector, run on a downscaled copy
+    of the frame (longer side = detection_size). No model files needed.
+    """
+
+    def __init__(self, detection_size=480, hit_threshold=0.0):
+        self.detection_size = detection_size
+        self.hit_threshold = hit_threshold
+        self.hog = cv2.HOGDescriptor()
+        self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+
+    def detect(self, frame):
+        """Return (boxes, confidences): (N, 4) boxes in frame pixels and (N,) SVM scores."""
+        h, w = frame.shape[:2]
+        scale = min(1.0, self.detection_size / max(h, w))
+        small = cv2.resize(frame, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_LINEAR) \
+            if scale < 1.0 else frame
+        rects, weights = self.hog.detectMultiScale(small, hitThreshold=self.hit_threshold,
+                                                   winStride=(8, 8), padding=(8, 8), scale=1.05)
+        if len(rects) == 0:
+            return np.empty((0, 4)), np.empty(0)
+        rects = np.asarray(rects, dtype=np.float64) / scale
+        boxes = np.column_stack([rects[:, 0], rects[:, 1], rects[:, 0] + rects[:, 2], rects[:, 1] + rects[:, 3]])
+        return boxes, np.asarray(weights, dtype=np.float64).reshape(-1)
+
+
+class Track:
+    """One person across frames. score is the smoothed dominance score."""
+
+    def __init__(self, track_id, box, confidence):
+        self.track_id = track_id
+        self.box = np.asarray(box, dtype=np.float64)
+        self.confidence = confidence
+        self.score = None
+        self.hits = 1
+        self.misses = 0
+
+
+class PersonTracker:
+    """
+    Associates per-frame person boxes with persistent track IDs and selects the lifter.
+
+    Detections are matched to tracks greedily by IoU (at least min_iou); boxes
+    left over are matched by centroid distance, relative to the track's box
+    diagonal, up to max_center_shift. Unmatched detections start new tracks and
+    tracks unmatched for more than max_misses updates are dropped.
+
+    Each track's dominance score (0.7 * visibility + 0.3 * area share) is
+    smoothed with an exponential moving average. Pose only runs on the selected
+    track, so every track uses the detector confidence, clipped to [0, 1], as
+    its visibility; mixing in the selected track's landmark visibility would put
+    it on another scale than the tracks it competes with. Another track only
+    takes over when its score beats the selected one by switch_margin for
+    switch_rounds updates in a row.
+    """
+
+    def __init__(self, min_iou=0.3, max_center_shift=0.5, max_misses=5, smoothing=0.3,
+                 switch_margin=0.1, switch_rounds=3):
+        self.min_iou = min_iou
+        self.max_center_shift = max_center_shift
+        self.max_misses = max_misses
+        self.smoothing = smoothing
+        self.switch_margin = switch_margin
+        self.switch_rounds = switch_rounds
+        self.reset()
+
+    def reset(self):
+        self.tracks = []
+        self.next_id = 1
+        self.selected = None
+        self.challenger = None
+        self.challenger_rounds = 0
+        self.switches = 0
+
+    def _associate(self, boxes):
+        """Return a list of (track_index, detection_index) pairs."""
+        if not self.tracks or len(boxes) == 0:
+            return []
+        track_boxes = np.stack([track.box for track in self.tracks])
+        iou = iou_matrix(track_boxes, boxes)
+        pairs = []
+        while True:
+            t, d = np.unravel_index(np.argmax(iou), iou.shape)
+            if iou[t, d] < self.min_iou:
+                break
+            pairs.append((t, d))
+            iou[t, :] = -1
+            iou[:, d] = -1
+
+        # Centroid fallback for fast movement, where boxes no longer overlap much
+        matched_tracks = {t for t, _ in pairs}
+        matched_detections = {d for _, d in pairs}
+        track_centers = (track_boxes[:, :2] + track_boxes[:, 2:]) / 2
+        detection_centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+        diagonals = np.hypot(track_boxes[:, 2] - track_boxes[:, 0], track_boxes[:, 3] - track_boxes[:, 1])
+        distance = np.linalg.norm(track_centers[:, None] - detection_centers[None], axis=2) / diagonals[:, None]
+        distance[list(matched_tracks), :] = np.inf
+        distance[:, list(matched_detections)] = np.inf
+        while True:
+            t, d = np.unravel_index(np.argmin(distance), distance.shape)
+            if distance[t, d] > self.max_center_shift:
+                break
+            pairs.append((t, d))
+            distance[t, :] = np.inf
+            distance[:, d] = np.inf
+        return pairs
+
+    def update(self, boxes, confidences, frame_shape):
+        """Feed one frame's person detections. Returns the selected Track (or None)."""
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        pairs = self._associate(boxes)
+
+        matched_tracks = set()
+        matched_detections = set()
+        for t, d in pairs:
+            track = self.tracks[t]
+            track.box = boxes[d]
+            track.confidence = float(confidences[d])
+            track.hits += 1
+            track.misses = 0
+            matched_tracks.add(t)
+            matched_detections.add(d)
+
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.misses += 1
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_misses]
+
+        for d in range(len(boxes)):
+            if d not in matched_detections:
+                self.tracks.append(Track(self.next_id, boxes[d], float(confidences[d])))
+                self.next_id += 1
+
+        h, w = frame_shape[:2]
+        for track in self.tracks:
+            visibility = min(1.0, max(0.0, track.confidence))
+            area = (track.box[2] - track.box[0]) * (track.box[3] - track.box[1])
+            score = float(dominance_score(visibility, area, h * w))
+            track.score = score if track.score is None else track.score + self.smoothing * (score - track.score)
+
+        self._select()
+        return self.selected
+
+    def _select(self):
+        if not self.tracks:
+            self.selected = None
+            return
+        best = max(self.tracks, key=lambda track: track.score)
+        if self.selected not in self.tracks:
+            # Nobody selected yet, or the lifter's track was dropped
+            self.selected = best
+            self.challenger = None
+            return
+
+        if best is self.selected or best.score < self.selected.score + self.switch_margin:
+            self.challenger = None
+            return
+        if best is self.challenger:
+            self.challenger_rounds += 1
+        else:
+            self.challenger = best
+            self.challenger_rounds = 1
+        if self.challenger_rounds >= self.switch_rounds:
+            self.selected = best
+            self.challenger = None
+            self.switches += 1
+
+    def confirm(self, track, box):
+        """
+        The pose found a person at `box`. If that overlaps the track by min_iou it
+        is the track's person: refresh the box even if HOG missed them. Otherwise
+        (e.g. the full-frame fallback found someone else) the track gets a miss.
+        Returns whether the track was confirmed.
+        """
+        box = np.asarray(box, dtype=np.float64)
+        if iou_matrix(track.box, box)[0, 0] < self.min_iou:
+            track.misses += 1
+            return False
+        track.box = box
+        track.misses = 0
+        return True
+
+
+class MultiPersonDetector(DominantPersonDetector):
+    """
+    DominantPersonDetector that follows one selected person in a multi-person scene.
+
+    Every detect_every frames the person detector and PersonTracker run. The
+    pose crop is moved onto the selected track when the selection changes, or
+    when the pose has drifted off that track. In both cases the pose graph's
+    temporal state is reset, because it belongs to someone else. In between,
+    the crop follows the pose as in DominantPersonDetector. If nobody is
+    detected, it falls back to single-person behaviour.
+    """
+
+    def __init__(self, detect_every=10, detection_size=480, person_detector=None, tracker=None, **kwargs):
+        super().__init__(**kwargs)
+        if self.preprocessor is None:
+            # Cropping is how pose is restricted to the selected person, even without downscaling
+            self.preprocessor = RoiPreprocessor(inference_size=None, padding=kwargs.get("roi_padding", 0.25))
+        self.preprocessor.crop = True
+        self.detect_every = detect_every
+        self.person_detector = person_detector or HogPersonDetector(detection_size)
+        self.tracker = tracker or PersonTracker()
+        self.pose_track_id = None
+
+    @classmethod
+    def settings_for(cls, detect_every=10, detection_size=480, person_detector=None, tracker=None, **kwargs):
+        settings = super().settings_for(**kwargs)
+        settings.update({
+            "model": settings["model"] + "+hog_person_tracker",
+            # __init__ always crops, with or without inference_size
+            "roi_padding": kwargs.get("roi_padding", 0.25),
+            "roi_crop": True,
+            "detect_every": detect_every,
+            "detection_size": getattr(person_detector, "detection_size", None) if person_detector is not None
+            else detection_size
+        })
+        return settings
+
+    def settings(self):
+        settings = super().settings()
+        settings.update({
+            "model": settings["model"] + "+hog_person_tracker",
+            "detect_every": self.detect_every,
+            "detection_size": getattr(self.person_detector, "detection_size", None)
+        })
+        return settings
+
+    def reset(self):
+        super().reset()
+        self.tracker.reset()
+        self.pose_track_id = None
+
+    def find_dominant_person(self, frame):
+        if self.closed:
+            raise RuntimeError("DominantPersonDetector is closed")
+
+        if self.frames % self.detect_every == 0:
+            started = self.profiler.start()
+            boxes, confidences = self.person_detector.detect(frame)
+            self.tracker.update(boxes, confidences, frame.shape)
+            self.profiler.stop("person_detection", started)
+            self._follow_selected(frame.shape)
+
+        landmarks = super().find_dominant_person(frame)
+        selected = self.tracker.selected
+        if selected is not None and landmarks is not None:
+            self.tracker.confirm(selected, landmark_box(landmarks, frame.shape, padding=0.1))
+        return landmarks
+
+    def _follow_selected(self, frame_shape):
+        selected = self.tracker.selected
+        if selected is None:
+            return
+
+        roi = self.preprocessor.roi
+        on_track = False
+        if roi is not None and selected.track_id == self.pose_track_id:
+            center_x, center_y = (roi[0] + roi[2]) / 2, (roi[1] + roi[3]) / 2
+            x0, y0, x1, y1 = selected.box
+            on_track = x0 <= center_x <= x1 and y0 <= center_y <= y1
+        if on_track:
+            return
+
+        self.pose.reset()
+        self.pose_track_id = selected.track_id
+        h, w = frame_shape[:2]
+        x0, y0, x1, y1 = selected.box
+        pad_x = (x1 - x0) * self.preprocessor.padding
+        pad_y = (y1 - y0) * self.preprocessor.padding
+        x0, y0 = int(max(0, x0 - pad_x)), int(max(0, y0 - pad_y))
+        x1, y1 = int(min(w, np.ceil(x1 + pad_x))), int(min(h, np.ceil(y1 + pad_y)))
+        self.preprocessor.roi = (x0, y0, x1, y1) if x1 - x0 > 1 and y1 - y0 > 1 else None
+
+    def metrics(self):
+        metrics = super().metrics()
+        metrics["people_tracked"] = self.tracker.next_id - 1
+        metrics["track_switches"] = self.tracker.switches
+        return metrics
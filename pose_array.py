@@ -0,0 +1,83 @@
+"""
+Per-frame landmark representation shared by the detector, tracker and assessor.
+
+A frame's pose is a (33, 4) float32 array of MediaPipe Pose landmarks with the
+columns x, y, z, visibility (x/y normalized to the frame). A whole clip is a
+(T, 33, 4) array, and every function here works on either shape.
+"""
+import numpy as np
+
+NUM_LANDMARKS = 33
+
+# Columns of the landmark array
+X, Y, Z, VISIBILITY = 0, 1, 2, 3
+
+# MediaPipe Pose landmark indices used by the scoring code
+NOSE = 0
+LEFT_SHOULDER = 11
+RIGHT_SHOULDER = 12
+LEFT_ELBOW = 13
+RIGHT_ELBOW = 14
+LEFT_WRIST = 15
+RIGHT_WRIST = 16
+LEFT_HIP = 23
+RIGHT_HIP = 24
+LEFT_KNEE = 25
+RIGHT_KNEE = 26
+LEFT_ANKLE = 27
+RIGHT_ANKLE = 28
+LEFT_FOOT_INDEX = 31
+RIGHT_FOOT_INDEX = 32
+
+# Same topology as mp.solutions.pose.POSE_CONNECTIONS
+POSE_CONNECTIONS = (
+    (0, 1), (1, 2), (2, 3), (3, 7), (0, 4), (4, 5), (5, 6), (6, 8), (9, 10),
+    (11, 12), (11, 13), (13, 15), (15, 17), (15, 19), (15, 21), (17, 19),
+    (12, 14), (14, 16), (16, 18), (16, 20), (16, 22), (18, 20),
+    (11, 23), (12, 24), (23, 24), (23, 25), (24, 26), (25, 27), (26, 28),
+    (27, 29), (28, 30), (29, 31), (30, 32), (27, 31), (28, 32)
+)
+
+# Joint angles computed for every frame, as (end, vertex, end) landmark triplets
+LEFT_KNEE_ANGLE = 0
+RIGHT_KNEE_ANGLE = 1
+LEFT_ARM_ANGLE = 2
+ANGLE_JOINTS = np.array([
+    (LEFT_HIP, LEFT_KNEE, LEFT_ANKLE),
+    (RIGHT_HIP, RIGHT_KNEE, RIGHT_ANKLE),
+    (LEFT_SHOULDER, LEFT_ELBOW, LEFT_WRIST),
+])
+
+
+def landmarks_to_array(pose_landmarks, out=None):
+    """Convert a MediaPipe NormalizedLandmarkList (or Tasks landmark list) to a (33, 4) float32 array."""
+    if out is None:
+        out = np.empty((NUM_LANDMARKS, 4), dtype=np.float32)
+    for i, landmark in enumerate(getattr(pose_landmarks, "landmark", pose_landmarks)):
+        out[i] = (landmark.x, landmark.y, landmark.z, landmark.visibility)
+    return out
+
+
+def joint_angles(landmarks, joints=ANGLE_JOINTS):
+    """
+    Compute the 2D angle in degrees at the vertex of every joint triplet.
+    landmarks is (..., 33, 4); the result is (..., len(joints)) float64, so a
+    single frame gives a (3,) vector and a clip gives a (T, 3) array.
+    """
+    xy = np.asarray(landmarks)[..., :2].astype(np.float64)
+    vertex = xy[..., joints[:, 1], :]
+    vector1 = xy[..., joints[:, 0], :] - vertex
+    vector2 = xy[..., joints[:, 2], :] - vertex
+
+    dot_product = np.einsum("...i,...i->...", vector1, vector2)
+    magnitude1 = np.sqrt(np.einsum("...i,...i->...", vector1, vector1))
+    magnitude2 = np.sqrt(np.einsum("...i,...i->...", vector2, vector2))
+
+    # Clip so that rounding on fully straight limbs gives 180 degrees instead of NaN
+    cosine = np.clip(dot_product / (magnitude1 * magnitude2), -1.0, 1.0)
+    return np.degrees(np.arccos(cosine))
+
+
+def dominance_score(visibility, box_area, frame_area):
+    """Combine visibility and the person's share of the frame into a dominance score."""
+    return 0.7 * visibility + 0.3 * (box_area / frame_area)
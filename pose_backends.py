@@ -0,0 +1,289 @@
+"""
+Pose estimation backends behind DominantPersonDetector.
+
+A backend takes an RGB frame (or crop) and returns the 33 MediaPipe Pose
+landmarks as a (33, 4) float32 array normalized to that image, or None if
+nobody was found. It also has reset() (forget the temporal tracking state),
+close() and settings() (everything that changes its output, part of the
+landmark cache key). settings_for(**options) gives the same dict without
+building the backend, so a cache hit never loads a model. Whatever runs
+inside, the tracker and assessor only ever see that array.
+
+    mediapipe   mp.solutions.pose.Pose. model_complexity 0 (lite), 1 (full) or
+                2 (heavy), static_image_mode and landmark smoothing are
+                configurable.
+    landmarker  The MediaPipe Tasks PoseLandmarker on the CPU (XNNPACK)
+                delegate, running a .task model bundle such as
+                pose_landmarker_lite.task. These bundles ship reduced-precision
+                weights and are what newer MediaPipe releases install (some
+                no longer include mp.solutions).
+
+compare_backends() runs several backend configurations over the same clips
+and reports inference throughput, plus how far the landmarks and the per-rep
+SquatAssessor scores move against the first (reference) configuration.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from pose_array import X, Y, landmarks_to_array
+
+
+class MediaPipePoseBackend:
+    name = "mediapipe"
+
+    def __init__(self, model_complexity=1, static_image_mode=False, smooth_landmarks=True,
+                 min_detection_confidence=0.5, min_tracking_confidence=0.5):
+        self.model_complexity = model_complexity
+        self.static_image_mode = static_image_mode
+        self.smooth_landmarks = smooth_landmarks
+        self.min_detection_confidence = min_detection_confidence
+        self.min_tracking_confidence = min_tracking_confidence
+        # Imported here so code that only scores or replays landmarks never loads MediaPipe
+        import mediapipe as mp
+        self.pose = mp.solutions.pose.Pose(static_image_mode=static_image_mode,
+                                           model_complexity=model_complexity,
+                                           smooth_landmarks=smooth_landmarks,
+                                           min_detection_confidence=min_detection_confidence,
+                                           min_tracking_confidence=min_tracking_confidence)
+
+    @staticmethod
+    def settings_for(model_complexity=1, static_image_mode=False, smooth_landmarks=True, **_):
+        return {
+            "model": "mediapipe.solutions.pose",
+            "model_complexity": model_complexity,
+            "static_image_mode": static_image_mode,
+            "smooth_landmarks": smooth_landmarks
+        }
+
+    def settings(self):
+        return self.settings_for(self.model_complexity, self.static_image_mode, self.smooth_landmarks)
+
+    def process(self, image_rgb):
+        results = self.pose.process(image_rgb)
+        return landmarks_to_array(results.pose_landmarks) if results.pose_landmarks else None
+
+    def reset(self):
+        self.pose.reset()
+
+    def close(self):
+        self.pose.close()
+
+
+class PoseLandmarkerBackend:
+    """
+    In video mode the landmarker needs strictly increasing timestamps. They are
+    derived from a frame counter at `fps`, so the tracking behaves the same on
+    every run. The Tasks API has no reset, so reset() recreates the landmarker.
+    """
+    name = "landmarker"
+
+    def __init__(self, model_path, static_image_mode=False, fps=30.0,
+                 min_detection_confidence=0.5, min_tracking_confidence=0.5, min_presence_confidence=0.5):
+        if not model_path:
+            raise ValueError("the landmarker backend needs model_path (a PoseLandmarker .task file)")
+        self.model_path = str(model_path)
+        self.static_image_mode = static_image_mode
+        self.fps = fps
+        self.min_detection_confidence = min_detection_confidence
+        self.min_tracking_confidence = min_tracking_confidence
+        self.min_presence_confidence = min_presence_confidence
+        import mediapipe as mp
+        self.mp = mp
+        self.landmarker = self._create()
+        self.frame_index = 0
+
+    def _create(self):
+        from mediapipe.tasks.python import BaseOptions, vision
+
+        base_options = BaseOptions(model_asset_path=self.model_path, delegate=BaseOptions.Delegate.CPU)
+        mode = vision.RunningMode.IMAGE if self.static_image_mode else vision.RunningMode.VIDEO
+        options = vision.PoseLandmarkerOptions(base_options=base_options, running_mode=mode, num_poses=1,
+                                               min_pose_detection_confidence=self.min_detection_confidence,
+                                               min_pose_presence_confidence=self.min_presence_confidence,
+                                               min_tracking_confidence=self.min_tracking_confidence)
+        return vision.PoseLandmarker.create_from_options(options)
+
+    @staticmethod
+    def settings_for(model_path=None, static_image_mode=False, fps=30.0, min_presence_confidence=0.5, **_):
+        return {
+            "model": f"mediapipe.tasks.pose_landmarker:{model_path}",
+            "static_image_mode": static_image_mode,
+            "fps": fps,
+            "min_presence_confidence": min_presence_confidence
+        }
+
+    def settings(self):
+        return self.settings_for(self.model_path, self.static_image_mode, self.fps, self.min_presence_confidence)
+
+    def process(self, image_rgb):
+        image = self.mp.Image(image_format=self.mp.ImageFormat.SRGB, data=np.ascontiguousarray(image_rgb))
+        if self.static_image_mode:
+            result = self.landmarker.detect(image)
+        else:
+            result = self.landmarker.detect_for_video(image, int(self.frame_index * 1000 / self.fps))
+            self.frame_index += 1
+        return landmarks_to_array(result.pose_landmarks[0]) if result.pose_landmarks else None
+
+    def reset(self):
+        self.landmarker.close()
+        self.landmarker = self._create()
+        self.frame_index = 0
+
+    def close(self):
+        self.landmarker.close()
+
+
+BACKENDS = {
+    MediaPipePoseBackend.name: MediaPipePoseBackend,
+    PoseLandmarkerBackend.name: PoseLandmarkerBackend,
+}
+
+
+def _backend_class(name):
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"unknown pose backend {name!r} (available: {', '.join(BACKENDS)})") from None
+
+
+def create_backend(name="mediapipe", **options):
+    return _backend_class(name)(**options)
+
+
+def backend_settings(name="mediapipe", **options):
+    """settings() of create_backend(name, **options), without creating it."""
+    return _backend_class(name).settings_for(**options)
+
+
+def parse_backend_spec(spec):
+    """
+    "mediapipe", "mediapipe:0" (model complexity) or "landmarker:<model.task>"
+    -> (label, detector options for DominantPersonDetector).
+    """
+    name, _, argument = spec.partition(":")
+    options = {}
+    if argument:
+        if name == "mediapipe":
+            options["model_complexity"] = int(argument)
+        else:
+            options["model_path"] = argument
+    return spec, {"backend": name, "backend_options": options}
+
+
+def infer_clip(video_path, detector_options):
+    """Run one detector configuration over a clip: (T, 33, 4) landmarks and per-frame inference seconds."""
+    import cv2
+    from dominant_person import DominantPersonDetector
+    from landmark_cache import ROW_DTYPE, ROW_SHAPE
+
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Unable to open video: {video_path}")
+    rows, seconds = [], []
+    with DominantPersonDetector(**detector_options) as detector:
+        detector.warm_up((int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))))
+        try:
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                start = time.perf_counter()
+                landmarks = detector.find_dominant_person(frame)
+                seconds.append(time.perf_counter() - start)
+                rows.append(np.full(ROW_SHAPE, np.nan, dtype=ROW_DTYPE) if landmarks is None else landmarks)
+        finally:
+            cap.release()
+    landmarks = np.stack(rows) if rows else np.empty((0,) + ROW_SHAPE, dtype=ROW_DTYPE)
+    return landmarks, np.array(seconds)
+
+
+def landmark_error(landmarks, reference):
+    """Mean x/y distance (normalized units) over the frames where both found a pose, and how many those were."""
+    n = min(len(landmarks), len(reference))
+    both = ~np.isnan(landmarks[:n, 0, 0]) & ~np.isnan(reference[:n, 0, 0])
+    if not both.any():
+        return None, 0
+    delta = landmarks[:n][both][..., [X, Y]] - reference[:n][both][..., [X, Y]]
+    return float(np.linalg.norm(delta, axis=-1).mean()), int(both.sum())
+
+
+def rep_score_differences(reps, reference):
+    """Per score key, the largest absolute difference between matching reps (None if the rep counts differ)."""
+    if len(reps) != len(reference):
+        return None
+    keys = reference[0].keys() if reference else ()
+    return {key: max(abs(rep[key] - ref[key]) for rep, ref in zip(reps, reference)) for key in keys}
+
+
+def compare_backends(video_paths, configs):
+    """
+    configs is a list of (label, detector options); the first is the reference.
+    Returns one entry per clip with a row per configuration.
+    """
+    from batch_scoring import score_landmarks
+
+    report = []
+    for video_path in video_paths:
+        runs = []
+        reference = None
+        for label, options in configs:
+            landmarks, seconds = infer_clip(video_path, options)
+            scored = score_landmarks(landmarks)
+            found = ~np.isnan(landmarks[:, 0, 0])
+            run = {
+                "backend": label,
+                "frames": len(landmarks),
+                "detection_rate": float(found.mean()) if len(found) else 0.0,
+                "inference_fps": len(seconds) / seconds.sum() if seconds.sum() > 0 else 0.0,
+                "p95_ms": float(np.percentile(seconds, 95) * 1000) if len(seconds) else 0.0,
+                "reps": scored["reps"]
+            }
+            if reference is None:
+                reference = (landmarks, scored["reps"])
+            else:
+                run["landmark_error"], run["frames_compared"] = landmark_error(landmarks, reference[0])
+                run["rep_score_diff"] = rep_score_differences(scored["reps"], reference[1])
+            runs.append(run)
+        report.append({"video": str(video_path), "runs": runs})
+    return report
+
+
+def print_comparison(report):
+    for clip in report:
+        reference = clip["runs"][0]
+        print(f"{clip['video']} (reference: {reference['backend']}, {len(reference['reps'])} reps)")
+        print(f"{'backend':>28}{'fps':>9}{'p95 ms':>9}{'found':>8}{'reps':>6}{'lm err':>9}{'max overall diff':>18}")
+        for run in clip["runs"]:
+            error = f"{run['landmark_error']:.4f}" if run.get("landmark_error") is not None else "-"
+            if run is reference:
+                diff = "-"
+            elif run["rep_score_diff"] is None:
+                diff = "reps differ"
+            else:
+                diff = f"{run['rep_score_diff'].get('overall_score', 0.0):.2f}"
+            print(f"{run['backend']:>28}{run['inference_fps']:>9.1f}{run['p95_ms']:>9.1f}"
+                  f"{run['detection_rate']:>8.0%}{len(run['reps']):>6}{error:>9}{diff:>18}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare pose backends on accuracy (per-rep scores) and speed.")
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--backend", action="append", dest="backends", default=None,
+                        help="mediapipe[:complexity] or landmarker:<model.task>; repeat for each backend, "
+                             "the first is the reference (default: mediapipe:1, then :0 and :2)")
+    parser.add_argument("--inference-size", type=int, default=None,
+                        help="crop to the lifter and downscale to this many pixels before pose inference")
+    parser.add_argument("--output", default=None, help="write the full comparison as JSON")
+    args = parser.parse_args()
+
+    configs = [parse_backend_spec(spec) for spec in args.backends or ("mediapipe:1", "mediapipe:0", "mediapipe:2")]
+    for _, options in configs:
+        options["inference_size"] = args.inference_size
+    report = compare_backends(args.videos, configs)
+    print_comparison(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, default=float)
@@ -0,0 +1,124 @@
+import json
+import time
+
+
+class StageProfiler:
+    """
+    Per-stage timers and run counters for the frame loop.
+
+    Stages are timed with start()/stop(): stop() records the time since `started`
+    and returns the current timestamp, so consecutive stages can be chained
+    without reading the clock twice:
+
+        t = profiler.start()
+        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        t = profiler.stop("preprocess", t)
+        results = pose.process(frame_rgb)
+        profiler.stop("pose", t)
+
+    Each stage only keeps a call count, the total and the maximum in ns, so the
+    cost per call is one clock read and a few integer updates. A stage should
+    only be timed from one thread (the pipelined processor times decode,
+    inference and scoring on different threads, but never the same stage).
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.stages = {}  # stage -> [calls, total_ns, max_ns]
+        self.counters = {}
+
+    def start(self):
+        return time.perf_counter_ns()
+
+    def stop(self, stage, started):
+        now = time.perf_counter_ns()
+        elapsed = now - started
+        timer = self.stages.get(stage)
+        if timer is None:
+            self.stages[stage] = [1, elapsed, elapsed]
+        else:
+            timer[0] += 1
+            timer[1] += elapsed
+            if elapsed > timer[2]:
+                timer[2] = elapsed
+        return now
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def set_counter(self, name, value):
+        """Record a count that another component already keeps (e.g. the detector's re-detections)."""
+        self.counters[name] = value
+
+    def summary(self, elapsed_sec=None):
+        """JSON-friendly summary: per-stage calls, total/mean/max ms and the share of the run."""
+        total_ns = sum(timer[1] for timer in self.stages.values())
+        wall_ns = elapsed_sec * 1e9 if elapsed_sec else total_ns
+        stages = {}
+        for stage, (calls, stage_ns, max_ns) in sorted(self.stages.items(), key=lambda item: -item[1][1]):
+            stages[stage] = {
+                "calls": calls,
+                "total_ms": stage_ns / 1e6,
+                "mean_ms": stage_ns / calls / 1e6,
+                "max_ms": max_ns / 1e6,
+                "share": stage_ns / wall_ns if wall_ns else 0.0
+            }
+        return {"elapsed_sec": elapsed_sec, "stages": stages, "counters": dict(self.counters)}
+
+    def to_prometheus(self, prefix="squat"):
+        """Render the timers and counters in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {prefix}_stage_seconds_total Time spent in each frame loop stage.",
+            f"# TYPE {prefix}_stage_seconds_total counter"
+        ]
+        for stage, (_, stage_ns, _) in self.stages.items():
+            lines.append(f'{prefix}_stage_seconds_total{{stage="{stage}"}} {stage_ns / 1e9:.9f}')
+        lines += [
+            f"# HELP {prefix}_stage_calls_total Number of times each stage ran.",
+            f"# TYPE {prefix}_stage_calls_total counter"
+        ]
+        for stage, (calls, _, _) in self.stages.items():
+            lines.append(f'{prefix}_stage_calls_total{{stage="{stage}"}} {calls}')
+        lines += [
+            f"# HELP {prefix}_stage_max_seconds Slowest single call of each stage.",
+            f"# TYPE {prefix}_stage_max_seconds gauge"
+        ]
+        for stage, (_, _, max_ns) in self.stages.items():
+            lines.append(f'{prefix}_stage_max_seconds{{stage="{stage}"}} {max_ns / 1e9:.9f}')
+        for name, value in self.counters.items():
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path, elapsed_sec=None):
+        with open(path, "w") as f:
+            json.dump(self.summary(elapsed_sec), f, indent=2)
+
+    def write_prometheus(self, path, prefix="squat"):
+        with open(path, "w") as f:
+            f.write(self.to_prometheus(prefix))
+
+
+class NullProfiler:
+    """Drop-in for StageProfiler when profiling is off: every call is an empty method."""
+
+    enabled = False
+
+    def start(self):
+        return 0
+
+    def stop(self, stage, started):
+        return 0
+
+    def count(self, name, n=1):
+        pass
+
+    def set_counter(self, name, value):
+        pass
+
+    def summary(self, elapsed_sec=None):
+        return None
+
+
+NULL_PROFILER = NullProfiler()
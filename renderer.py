@@ -0,0 +1,120 @@
+"""
+Overlay rendering on the shared (33, 4) landmark array.
+
+The bounding box and dominance score come from NumPy reductions over the
+array, and the skeleton and joints are each drawn with a single
+cv2.polylines call. The joints are zero-length segments, whose round caps
+make dots. OverlayRenderer draws in place, on the live window's frame or on
+one of the output video's preallocated buffers (video_writer.py), and can
+throttle to every Nth frame or to rep keyframes only. draw_score_card() adds
+a rep's scores for output videos.
+"""
+import cv2
+import numpy as np
+
+from pose_array import POSE_CONNECTIONS, VISIBILITY, X, Y, dominance_score
+
+SKELETON_COLOR = (224, 224, 224)
+JOINT_COLOR = (0, 0, 255)
+BOX_COLOR = (0, 255, 0)
+STATE_COLOR = (0, 0, 255)
+CARD_COLOR = (40, 40, 40)
+CARD_TEXT_COLOR = (255, 255, 255)
+
+_CONNECTIONS = np.array(POSE_CONNECTIONS, dtype=np.intp)
+_STATE_LABELS = {}
+
+
+def pose_box(landmarks, w, h):
+    """Pixel bounding box (min_x, min_y, max_x, max_y) and dominance score of a (33, 4) landmark array."""
+    xy = landmarks[:, :Y + 1]
+    low, high = xy.min(axis=0), xy.max(axis=0)
+    min_x, min_y = int(low[X] * w), int(low[Y] * h)
+    max_x, max_y = int(high[X] * w), int(high[Y] * h)
+    score = dominance_score(landmarks[:, VISIBILITY].mean(), (max_x - min_x) * (max_y - min_y), h * w)
+    return (min_x, min_y, max_x, max_y), score
+
+
+def draw_skeleton(frame, landmarks, min_visibility=0.5):
+    """Draw the pose connections and joints, skipping landmarks that are not visible."""
+    h, w = frame.shape[:2]
+    points = np.rint(landmarks[:, :Y + 1] * (w, h)).astype(np.int32)
+    visible = landmarks[:, VISIBILITY] >= min_visibility
+
+    segments = points[_CONNECTIONS[visible[_CONNECTIONS].all(axis=1)]]
+    if len(segments):
+        cv2.polylines(frame, segments, False, SKELETON_COLOR, 2)
+    joints = points[visible]
+    if len(joints):
+        cv2.polylines(frame, np.repeat(joints[:, None, :], 2, axis=1), False, JOINT_COLOR, 6)
+
+
+def draw_box(frame, landmarks):
+    """Draw the bounding box, dominance score and center of the person."""
+    h, w = frame.shape[:2]
+    (min_x, min_y, max_x, max_y), score = pose_box(landmarks, w, h)
+    cv2.rectangle(frame, (min_x, min_y), (max_x, max_y), BOX_COLOR, 2)
+    cv2.putText(frame, f"Score: {score:.2f}", (min_x, min_y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, BOX_COLOR, 2)
+    cv2.circle(frame, ((min_x + max_x) // 2, (min_y + max_y) // 2), 10, BOX_COLOR, -1)
+
+
+def draw_state(frame, state):
+    label = _STATE_LABELS.get(state)
+    if label is None:
+        label = _STATE_LABELS[state] = f"State: {state}"
+    cv2.putText(frame, label, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, STATE_COLOR, 2)
+
+
+def draw_score_card(frame, rep, scores):
+    """Draw a rep's scores (an assess_squat dict) in the top-right corner."""
+    lines = (f"Rep {rep}: {scores['overall_score']:.1f}",
+             f"Depth {scores['depth']:.1f}",
+             f"Shoulders {scores['shoulders']:.1f}",
+             f"Knee tracking {scores['knees']:.1f}",
+             f"Knee alignment {scores['knees_alinment']:.1f}")
+    w = frame.shape[1]
+    left = max(0, w - 250)
+    cv2.rectangle(frame, (left, 10), (w - 10, 20 + 25 * len(lines)), CARD_COLOR, -1)
+    for i, line in enumerate(lines):
+        cv2.putText(frame, line, (left + 10, 35 + 25 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.6 if i else 0.7,
+                    CARD_TEXT_COLOR, 2 if i == 0 else 1)
+
+
+class OverlayRenderer:
+    """
+    Draws the pose overlays for one stream of frames.
+
+    every=N renders only every Nth video frame. keyframes_only renders only
+    the frames on which the tracker state changes (ready, rep start, rep end,
+    finished). should_render() takes the decision and counts the frames.
+    """
+
+    def __init__(self, min_visibility=0.5, every=1, keyframes_only=False):
+        self.min_visibility = min_visibility
+        self.every = max(1, every)
+        self.keyframes_only = keyframes_only
+        self.previous_state = None
+        self.frames_rendered = 0
+        self.frames_skipped = 0
+
+    def should_render(self, frame_index, state=None):
+        keyframe = state != self.previous_state
+        self.previous_state = state
+        render = keyframe if self.keyframes_only else frame_index % self.every == 0
+        if render:
+            self.frames_rendered += 1
+        else:
+            self.frames_skipped += 1
+        return render
+
+    def draw(self, frame, landmarks, state=None):
+        """Draw every overlay onto the frame in place."""
+        if landmarks is not None:
+            draw_skeleton(frame, landmarks, self.min_visibility)
+            draw_box(frame, landmarks)
+        if state is not None:
+            draw_state(frame, state)
+        return frame
+
+    def stats(self):
+        return {"frames_rendered": self.frames_rendered, "frames_skipped": self.frames_skipped}
@@ -0,0 +1,228 @@
+"""
+Seekable index of the reps in a processed video.
+
+RepIndex is an event sink. It takes the start frame of each rep from the
+tracker's "Ready" -> "In Rep" StateChanged event. It takes the end frame and
+the assess_squat scores from RepCompleted. MainController keeps one for runs
+that ask for it (rep_index=True, --rep-index), and it is saved as JSON next to
+the results.
+
+rescore() re-runs the tracker and assessor on a single rep, with the tracker
+resumed in the state it was in when the rep started. It reads either the
+rows of the cached landmarks or the rep's frames from the video, after a
+seek to the start frame with CAP_PROP_POS_FRAMES. The cost is therefore
+proportional to the length of the rep, not the video. On cached landmarks
+the scores match the full run exactly. From the video they can differ
+slightly, because pose tracking restarts at the seek point. With a
+LandmarkFilter, warmup_sec of frames before the rep prime the filter first.
+On synthetic sessions two seconds bring the scores back to the full run's
+values, and one second leaves them within 1e-6.
+Passing an AnnotatedVideoWriter renders just that rep.
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from events import RepCompleted, StateChanged
+
+
+def probe_fps(video_path):
+    import cv2
+
+    cap = cv2.VideoCapture(str(video_path))
+    fps = cap.get(cv2.CAP_PROP_FPS) if cap.isOpened() else 0.0
+    cap.release()
+    return fps or None
+
+
+class RepIndex:
+    def __init__(self, video=None, fps=None, tracker_options=None, cache_key=None, reps=None):
+        self.video = video
+        self.fps = fps
+        # Dwell settings of the run, reused when re-scoring
+        self.tracker_options = dict(tracker_options or {})
+        # Landmark cache entry of the run, if it used one
+        self.cache_key = cache_key
+        self.reps = list(reps or [])
+        self.open_start = None
+
+    # Event sink interface
+    def write(self, event):
+        if isinstance(event, StateChanged):
+            if event.state == "In Rep":
+                self.open_start = event.frame
+        elif isinstance(event, RepCompleted):
+            self.add(event.rep, self.open_start, event.frame, event.scores)
+            self.open_start = None
+
+    def close(self):
+        pass
+
+    def seconds(self, frame):
+        return frame / self.fps if self.fps and frame is not None else None
+
+    def add(self, rep, start_frame, end_frame, scores):
+        entry = {
+            "rep": rep,
+            "start_frame": start_frame,
+            "end_frame": end_frame,
+            "start_sec": self.seconds(start_frame),
+            "end_sec": self.seconds(end_frame),
+            "scores": scores
+        }
+        self.reps.append(entry)
+        return entry
+
+    def get(self, rep):
+        for entry in self.reps:
+            if entry["rep"] == rep:
+                return entry
+        raise KeyError(f"no rep {rep} in the index")
+
+    def to_dict(self):
+        return {
+            "video": self.video,
+            "fps": self.fps,
+            "tracker_options": self.tracker_options,
+            "cache_key": self.cache_key,
+            "reps": self.reps
+        }
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            # numpy scalars in the score dicts are written as plain floats
+            json.dump(self.to_dict(), f, indent=2, default=float)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["video"], data["fps"], data["tracker_options"], data["cache_key"], data["reps"])
+
+    def _warmup_frames(self, landmark_filter, warmup_sec):
+        if landmark_filter is None:
+            return 0
+        return int(round(warmup_sec * (self.fps or landmark_filter.fps)))
+
+    def _rep_controller(self, entry, **controller_options):
+        from main_controller import MainController
+
+        controller = MainController(self.video, headless=True, tracker_options=self.tracker_options,
+                                    **controller_options)
+        # Resume the state machine on the frame the rep started: the READY -> IN_REP
+        # transition has just fired, so both streaks are back at zero
+        tracker = controller.squat_readiness_checker
+        tracker.NOTHING = 0
+        tracker.READY = 0
+        tracker.IN_REP = 1
+        tracker.squat_started = True
+        controller.frames_scored = entry["start_frame"]
+        return controller
+
+    def rescore(self, rep, landmarks=None, video_path=None, detector=None, landmark_filter=None,
+                warmup_sec=2.0, writer=None):
+        """
+        Re-score one rep. Give either the run's (T, 33, 4) landmark array (e.g. a
+        LandmarkCache entry, memory-mapped) or the video (video_path, default the
+        indexed one) plus optionally a detector. A writer renders the rep, which
+        needs the video. Returns the entry with the new scores under "scores".
+        """
+        entry = self.get(rep)
+        start, end = entry["start_frame"], entry["end_frame"]
+        first = max(0, start - self._warmup_frames(landmark_filter, warmup_sec))
+        if writer is not None and landmarks is not None:
+            raise ValueError("rendering a rep needs the video, not cached landmarks")
+
+        begin = time.perf_counter()
+        controller = self._rep_controller(entry, detector=detector, landmark_filter=landmark_filter,
+                                          writer=writer)
+        try:
+            frames = self._read_frames(first, end, landmarks, video_path, controller)
+            for frame_index, frame, frame_landmarks in frames:
+                if frame_index < start:
+                    # Only primes the landmark filter
+                    if frame_landmarks is not None:
+                        landmark_filter.apply(frame_landmarks, frame_index)
+                    continue
+                controller.score_frame(frame, frame_landmarks)
+        finally:
+            if landmarks is None:
+                controller.close_detector()
+            if writer is not None:
+                writer.close()
+
+        return {
+            "rep": rep,
+            "start_frame": start,
+            "end_frame": end,
+            "start_sec": entry["start_sec"],
+            "end_sec": entry["end_sec"],
+            # None if the rep no longer completes (e.g. different landmarks from a re-run detector)
+            "scores": controller.rep_scores[0] if controller.rep_scores else None,
+            "frames": end - first + 1,
+            "elapsed_sec": time.perf_counter() - begin
+        }
+
+    def _read_frames(self, first, end, landmarks, video_path, controller):
+        """Yield (frame_index, frame or None, landmarks or None) for frames first..end."""
+        if landmarks is not None:
+            for frame_index in range(first, min(end + 1, len(landmarks))):
+                row = np.asarray(landmarks[frame_index])
+                yield frame_index, None, None if np.isnan(row[0, 0]) else row
+            return
+
+        import cv2
+
+        video_path = video_path or self.video
+        cap = cv2.VideoCapture(str(video_path))
+        if not cap.isOpened():
+            raise FileNotFoundError(f"Unable to open video: {video_path}")
+        try:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+            for frame_index in range(first, end + 1):
+                ret, frame = cap.read()
+                if not ret:
+                    return
+                yield frame_index, frame, controller.detect(frame)
+        finally:
+            cap.release()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-score (and optionally render) single reps from a rep index.")
+    parser.add_argument("index", help="rep index JSON written by main_controller.py --rep-index")
+    parser.add_argument("reps", type=int, nargs="*", help="rep numbers (default: all)")
+    parser.add_argument("--cache-dir", default=None,
+                        help="read the landmarks from this landmark cache instead of running pose inference")
+    parser.add_argument("--video", default=None, help="video file, if it moved since the index was written")
+    parser.add_argument("--smooth", action="store_true", help="apply the One-Euro landmark filter")
+    parser.add_argument("--output-dir", default=None, help="also render each rep to <dir>/rep_<n>.mp4")
+    args = parser.parse_args()
+
+    index = RepIndex.load(args.index)
+    landmarks = None
+    if args.cache_dir:
+        from landmark_cache import LandmarkCache
+        cached = LandmarkCache(args.cache_dir).load(index.cache_key) if index.cache_key else None
+        if cached is None:
+            raise SystemExit("the landmark cache has no entry for this index")
+        landmarks = cached[0]
+
+    results = []
+    for rep in args.reps or [entry["rep"] for entry in index.reps]:
+        landmark_filter = None
+        if args.smooth:
+            from landmark_filter import LandmarkFilter
+            landmark_filter = LandmarkFilter(fps=index.fps or 30.0)
+        writer = None
+        if args.output_dir:
+            from video_writer import AnnotatedVideoWriter
+            os.makedirs(args.output_dir, exist_ok=True)
+            writer = AnnotatedVideoWriter(os.path.join(args.output_dir, f"rep_{rep}.mp4"), fps=index.fps or 30.0,
+                                          drop_frames=False)
+        results.append(index.rescore(rep, landmarks=landmarks, video_path=args.video,
+                                     landmark_filter=landmark_filter, writer=writer))
+    print(json.dumps(results, indent=2, default=float))
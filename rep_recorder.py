@@ -0,0 +1,197 @@
+"""
+Per-frame metric recorder for coaching replays.
+
+Every scored frame is stored as one row of FRAME_DTYPE: the video frame index,
+the tracker state, the knee angle and, for IN_REP frames, the raw tilts and
+knee deviation together with the per-frame scores (NaN outside reps). Reps are
+kept as RepRecord objects pointing at their rows.
+
+Rows live in a preallocated NumPy buffer that doubles as needed up to
+max_frames and then becomes a ring buffer, dropping the oldest frames. Every
+row is written twice, at i and i + capacity, so the last `capacity` rows are
+always one contiguous slice: rep_frames() and frames() return views, never
+copies, even across the ring's wrap-around.
+"""
+import collections
+
+import numpy as np
+
+NOT_READY, READY, IN_REP, FINISHED = range(4)
+STATE_NAMES = ("Not Ready", "Ready", "In Rep", "Finished")
+STATE_CODES = {name: code for code, name in enumerate(STATE_NAMES)}
+
+METRIC_FIELDS = ("shoulder_tilt", "knee_tilt", "knee_deviation", "shoulder_score",
+                 "knee_alignment_score", "depth_score", "knee_tracking_score")
+FRAME_DTYPE = np.dtype([("frame", np.int64), ("state", np.int8), ("knee_angle", np.float32)]
+                       + [(name, np.float32) for name in METRIC_FIELDS])
+
+_NO_METRICS = (np.nan,) * len(METRIC_FIELDS)
+
+
+class RepRecord:
+    __slots__ = ("rep", "start_frame", "end_frame", "first_row", "end_row",
+                 "shoulders", "depth", "knees", "knees_alinment", "overall_score")
+
+    def __init__(self, rep, start_frame, end_frame, first_row, end_row, scores):
+        self.rep = rep
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        # Absolute row numbers [first_row, end_row) in the recorder
+        self.first_row = first_row
+        self.end_row = end_row
+        self.shoulders = scores["shoulders"]
+        self.depth = scores["depth"]
+        self.knees = scores["knees"]
+        self.knees_alinment = scores["knees_alinment"]
+        self.overall_score = scores["overall_score"]
+
+    def scores(self):
+        return {"shoulders": self.shoulders, "depth": self.depth, "knees": self.knees,
+                "knees_alinment": self.knees_alinment, "overall_score": self.overall_score}
+
+    def to_dict(self):
+        return {"rep": self.rep, "start_frame": self.start_frame, "end_frame": self.end_frame, **self.scores()}
+
+
+class RepRecorder:
+    """
+    Retains the last max_frames frame rows and the last max_reps rep records
+    (the default is an hour at 30 fps, ~9 MB).
+    """
+
+    def __init__(self, max_frames=30 * 60 * 60, max_reps=1000, initial_capacity=1024):
+        self.max_frames = max_frames
+        self.capacity = min(initial_capacity, max_frames)
+        self.buffer = np.zeros(2 * self.capacity, dtype=FRAME_DTYPE)
+        self.rows = 0  # rows ever recorded
+        self.reps = collections.deque(maxlen=max_reps)
+        self.reps_recorded = 0
+        self.open_rep = None  # (first_row, start_frame) of the rep in progress
+        self.previous_state = None
+
+    def _grow(self, needed):
+        """Before the first wrap-around, enlarge the buffer so `needed` rows fit (up to max_frames)."""
+        capacity = self.capacity
+        while capacity < needed and capacity < self.max_frames:
+            capacity = min(2 * capacity, self.max_frames)
+        if capacity == self.capacity:
+            return
+        buffer = np.zeros(2 * capacity, dtype=FRAME_DTYPE)
+        # Nothing has been overwritten yet, so row i is still at index i
+        buffer[:self.rows] = self.buffer[:self.rows]
+        buffer[capacity:capacity + self.rows] = self.buffer[:self.rows]
+        self.buffer = buffer
+        self.capacity = capacity
+
+    def record(self, frame, state, knee_angle, metrics=None):
+        """
+        Append one frame. state is a tracker state name or code; metrics are
+        the METRIC_FIELDS values of an IN_REP frame (SquatAssessor.evaluate_frame).
+        """
+        if isinstance(state, str):
+            state = STATE_CODES[state]
+        if state == IN_REP and self.previous_state != IN_REP:
+            self.open_rep = (self.rows, frame)
+        self.previous_state = state
+
+        if self.rows == self.capacity:
+            self._grow(self.rows + 1)
+        i = self.rows % self.capacity
+        row = (frame, state, knee_angle) + (tuple(metrics) if metrics is not None else _NO_METRICS)
+        self.buffer[i] = row
+        self.buffer[i + self.capacity] = row
+        self.rows += 1
+
+    def extend(self, rows):
+        """Append a FRAME_DTYPE array of rows at once (used by the offline engine)."""
+        n = len(rows)
+        if self.rows + n > self.capacity:
+            self._grow(self.rows + n)
+        if n > self.capacity:
+            # Only the newest `capacity` rows survive anyway
+            self.rows += n - self.capacity
+            rows = rows[n - self.capacity:]
+            n = self.capacity
+        positions = (self.rows + np.arange(n)) % self.capacity
+        self.buffer[positions] = rows
+        self.buffer[positions + self.capacity] = rows
+        self.rows += n
+        if n:
+            self.previous_state = int(rows["state"][-1])
+
+    def close_rep(self, scores, end_frame=None):
+        """The rep in progress was scored on the frame just recorded; keep its record."""
+        if self.open_rep is None:
+            return None
+        first_row, start_frame = self.open_rep
+        if end_frame is None:
+            end_frame = int(self.buffer[(self.rows - 1) % self.capacity]["frame"])
+        self.open_rep = None
+        return self.add_rep(first_row, self.rows, start_frame, end_frame, scores)
+
+    def add_rep(self, first_row, end_row, start_frame, end_frame, scores):
+        self.reps_recorded += 1
+        record = RepRecord(self.reps_recorded, start_frame, end_frame, first_row, end_row, scores)
+        self.reps.append(record)
+        return record
+
+    @property
+    def oldest_row(self):
+        return max(0, self.rows - self.capacity)
+
+    def window(self, first_row, end_row):
+        """Rows [first_row, end_row) as a view, or None if some of them were already dropped."""
+        if first_row < self.oldest_row or end_row > self.rows or first_row > end_row:
+            return None
+        start = first_row % self.capacity
+        return self.buffer[start:start + (end_row - first_row)]
+
+    def frames(self):
+        """Every retained row, oldest first (a view)."""
+        return self.window(self.oldest_row, self.rows)
+
+    def rep_frames(self, rep):
+        """The rows of a RepRecord (or 1-based rep number) as a view, None if no longer retained."""
+        if not isinstance(rep, RepRecord):
+            rep = next((record for record in self.reps if record.rep == rep), None)
+            if rep is None:
+                return None
+        return self.window(rep.first_row, rep.end_row)
+
+    @staticmethod
+    def columns(rows):
+        """{field: 1-D view} for a slice of rows (no copies)."""
+        return {name: rows[name] for name in FRAME_DTYPE.names}
+
+    def _rows_for(self, rep):
+        rows = self.frames() if rep is None else self.rep_frames(rep)
+        if rows is None:
+            raise KeyError(f"rep {rep} is no longer retained")
+        return rows
+
+    def write_csv(self, path, rep=None):
+        rows = self._rows_for(rep)
+        fmt = ["%d", "%d"] + ["%.6g"] * (len(FRAME_DTYPE.names) - 2)
+        np.savetxt(path, rows, delimiter=",", fmt=fmt, header=",".join(FRAME_DTYPE.names), comments="")
+
+    def write_parquet(self, path, rep=None):
+        """
+        Needs pyarrow. The fields of the structured rows are strided, and Arrow
+        wants contiguous columns, so every column is copied once here.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        rows = self._rows_for(rep)
+        table = pa.table({name: np.ascontiguousarray(column) for name, column in self.columns(rows).items()})
+        pq.write_table(table, path)
+
+    def write(self, path, rep=None):
+        """Export by extension: .csv, .parquet or .npy (the raw structured rows)."""
+        path = str(path)
+        if path.endswith(".csv"):
+            self.write_csv(path, rep)
+        elif path.endswith(".parquet"):
+            self.write_parquet(path, rep)
+        else:
+            np.save(path, self._rows_for(rep))
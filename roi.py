@@ -0,0 +1,95 @@
+import cv2
+import numpy as np
+
+from pose_array import X, Y, Z
+
+
+class RoiPreprocessor:
+    """
+    Prepares frames for pose inference by cropping to the lifter and downscaling.
+
+    The crop is the previous frame's landmark bounding box padded by `padding`
+    (a fraction of the box size on every side). It is kept while the person stays
+    well inside it, so MediaPipe's own frame-to-frame tracking sees a stable
+    image, and only moved when the box drifts toward an edge or shrinks a lot.
+    Without a usable previous pose the whole frame is used.
+
+    The crop is a view of the BGR frame; it is resized straight to the inference
+    resolution (longer side = inference_size) and only the small result is
+    converted to RGB, into a reused buffer. A 1080p/4K frame is therefore read
+    once and never copied or colour-converted at full resolution.
+    """
+
+    def __init__(self, inference_size=256, padding=0.25, crop=True):
+        self.inference_size = inference_size
+        self.padding = padding
+        self.crop = crop
+        self.roi = None
+        self._resized = None
+        self._rgb = None
+
+    def reset(self):
+        """Fall back to the full frame on the next call (e.g. after tracking loss)."""
+        self.roi = None
+
+    def prepare(self, frame):
+        """Return (rgb_image, roi) where roi = (x0, y0, x1, y1) in frame pixels."""
+        h, w = frame.shape[:2]
+        x0, y0, x1, y1 = self.roi if self.roi is not None else (0, 0, w, h)
+        crop = frame[y0:y1, x0:x1]
+        crop_h, crop_w = crop.shape[:2]
+
+        scale = self.inference_size / max(crop_h, crop_w) if self.inference_size else 1.0
+        if scale < 1.0:
+            size = (max(1, round(crop_w * scale)), max(1, round(crop_h * scale)))
+            if self._resized is None or self._resized.shape[1::-1] != size:
+                self._resized = np.empty((size[1], size[0], 3), dtype=np.uint8)
+            # INTER_AREA is ~20x slower at these ratios and no better for the pose model
+            cv2.resize(crop, size, dst=self._resized, interpolation=cv2.INTER_LINEAR)
+            crop = self._resized
+
+        if self._rgb is None or self._rgb.shape != crop.shape:
+            self._rgb = np.empty(crop.shape, dtype=np.uint8)
+        cv2.cvtColor(crop, cv2.COLOR_BGR2RGB, dst=self._rgb)
+        return self._rgb, (x0, y0, x1, y1)
+
+    @staticmethod
+    def to_frame_coords(landmarks, roi, frame_shape):
+        """Map landmarks normalized to the crop back to full-frame normalized coordinates, in place."""
+        h, w = frame_shape[:2]
+        x0, y0, x1, y1 = roi
+        landmarks[:, X] = (x0 + landmarks[:, X] * (x1 - x0)) / w
+        landmarks[:, Y] = (y0 + landmarks[:, Y] * (y1 - y0)) / h
+        # MediaPipe scales z like x
+        landmarks[:, Z] *= (x1 - x0) / w
+        return landmarks
+
+    def update(self, landmarks, frame_shape):
+        """Choose the crop for the next frame from this frame's full-frame landmarks."""
+        if not self.crop or landmarks is None:
+            self.roi = None
+            return
+
+        h, w = frame_shape[:2]
+        min_x, max_x = landmarks[:, X].min() * w, landmarks[:, X].max() * w
+        min_y, max_y = landmarks[:, Y].min() * h, landmarks[:, Y].max() * h
+
+        if self.roi is not None:
+            x0, y0, x1, y1 = self.roi
+            margin_x = (x1 - x0) * self.padding / 3
+            margin_y = (y1 - y0) * self.padding / 3
+            # Edges that already sit on the frame border cannot move any further out
+            inside = ((x0 == 0 or min_x >= x0 + margin_x) and (x1 == w or max_x <= x1 - margin_x)
+                      and (y0 == 0 or min_y >= y0 + margin_y) and (y1 == h or max_y <= y1 - margin_y))
+            box_area = (max_x - min_x) * (max_y - min_y)
+            # Keep the current crop unless the person nears an edge or fills little of it
+            if inside and box_area >= 0.25 * (x1 - x0) * (y1 - y0):
+                return
+
+        pad_x = (max_x - min_x) * self.padding
+        pad_y = (max_y - min_y) * self.padding
+        x0 = int(max(0, min_x - pad_x))
+        y0 = int(max(0, min_y - pad_y))
+        x1 = int(min(w, np.ceil(max_x + pad_x)))
+        y1 = int(min(h, np.ceil(max_y + pad_y)))
+        self.roi = (x0, y0, x1, y1) if x1 - x0 > 1 and y1 - y0 > 1 else None
@@ -0,0 +1,224 @@
+"""
+Scoring rules from scoring_config.json, compiled into one evaluation kernel.
+
+The config holds every threshold and weight of the squat scoring: the tilt
+bands for shoulder and knee alignment, the depth angle range, the knee
+tracking depth factor and penalty rate, the overall-score weights and the
+feedback cut-offs. Landmarks and joint angles are named as in pose_array.py.
+To tune the scoring, edit the file (or pass another one) and no code needs
+to change.
+
+ScoringRules resolves the names to array indices once, when the config is
+loaded, and builds evaluate(). That function computes every per-frame metric
+in one pass. For a (33, 4) frame, all the coordinates it needs are fetched
+with a single gather and the metrics are plain float arithmetic. For a
+(T, 33, 4) clip, the same gather and arithmetic run on NumPy arrays. Both
+return the metrics in rep_recorder.METRIC_FIELDS order, and they produce the
+same floats, so the streaming and offline paths still agree exactly.
+"""
+import json
+import os
+
+import numpy as np
+
+import pose_array
+from pose_array import NUM_LANDMARKS, ANGLE_JOINTS, X, Y, joint_angles
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scoring_config.json")
+
+# Order of the weights in overall_score()
+REP_METRICS = ("shoulders", "depth", "knee_tracking", "knee_alignment")
+
+_loaded = {}
+
+
+def _constant(name):
+    value = getattr(pose_array, name, None)
+    return value if isinstance(value, int) else None
+
+
+def _landmark(name):
+    """A pose_array landmark index, by name."""
+    value = _constant(name)
+    # Angle and column constants are small ints too, and would silently read the wrong landmark
+    if value is None or name.endswith("_ANGLE") or name in ("X", "Y", "Z", "VISIBILITY") \
+            or not 0 <= value < NUM_LANDMARKS:
+        raise ValueError(f"{name!r} in the scoring config is not a landmark")
+    return value
+
+
+def _angle(name):
+    """A pose_array joint angle index (a column of joint_angles()), by name."""
+    value = _constant(name)
+    if value is None or not name.endswith("_ANGLE") or not 0 <= value < len(ANGLE_JOINTS):
+        raise ValueError(f"{name!r} in the scoring config is not a joint angle")
+    return value
+
+
+def load_rules(path=None):
+    """ScoringRules for a config file (default scoring_config.json), compiled once per file."""
+    path = os.path.abspath(path or DEFAULT_CONFIG)
+    if path not in _loaded:
+        with open(path, encoding="utf-8") as f:
+            _loaded[path] = ScoringRules(json.load(f))
+    return _loaded[path]
+
+
+class ScoringRules:
+    def __init__(self, config):
+        self.config = config
+        self.min_score = config["score_range"]["min"]
+        self.max_score = config["score_range"]["max"]
+
+        shoulders = config["shoulders"]
+        self.shoulder_landmarks = tuple(_landmark(name) for name in shoulders["landmarks"])
+        self.shoulder_threshold = shoulders["threshold"]
+        self.shoulder_max_tilt = shoulders["max_tilt"]
+
+        knees = config["knee_alignment"]
+        self.knee_landmarks = tuple(_landmark(name) for name in knees["landmarks"])
+        self.knee_threshold = knees["threshold"]
+        self.knee_max_tilt = knees["max_tilt"]
+
+        depth = config["depth"]
+        self.depth_angle = _angle(depth["angle"])
+        self.depth_min_angle = depth["min_angle"]
+        self.depth_max_angle = depth["max_angle"]
+
+        tracking = config["knee_tracking"]
+        # (knee-side landmark, toe-side landmark, joint angle): deviation > 0 means the knee is past the toe
+        self.tracking_sides = tuple((_landmark(side["deviation"][0]), _landmark(side["deviation"][1]),
+                                     _angle(side["angle"]))
+                                    for side in tracking["sides"])
+        self.tracking_start_angle = tracking["start_angle"]
+        self.tracking_depth_range = tracking["depth_range"]
+        self.tracking_max_deviation = tracking["max_deviation"]
+        self.tracking_penalty_rate = tracking["penalty_rate"]
+
+        missing = set(REP_METRICS) - set(config["weights"])
+        if missing:
+            raise ValueError(f"the scoring config has no weight for {', '.join(sorted(missing))}")
+        self.weights = tuple(config["weights"][metric] for metric in REP_METRICS)
+        self.feedback_below = dict(config["feedback_below"])
+
+        self._frame, self._batch = self._compile()
+
+    def with_score_range(self, min_score=None, max_score=None):
+        """The same rules on another score scale (self if nothing changes)."""
+        min_score = self.min_score if min_score is None else min_score
+        max_score = self.max_score if max_score is None else max_score
+        if (min_score, max_score) == (self.min_score, self.max_score):
+            return self
+        return ScoringRules({**self.config, "score_range": {"min": min_score, "max": max_score}})
+
+    def evaluate(self, landmarks, angles=None):
+        """
+        Every per-frame metric of one (33, 4) frame (floats) or a (T, 33, 4)
+        clip (arrays): shoulder tilt, knee tilt, knee deviation, and the
+        shoulder, knee alignment, depth and knee tracking scores. angles
+        defaults to joint_angles(landmarks). Pass another view's angles to
+        take depth from that view (multi-camera scoring).
+        """
+        if angles is None:
+            angles = joint_angles(landmarks)
+        if np.ndim(landmarks) == 2:
+            return self._frame(landmarks, angles)
+        return self._batch(landmarks, angles)
+
+    def overall_score(self, shoulders, depth, knee_tracking, knee_alignment):
+        w_shoulders, w_depth, w_knee_tracking, w_knee_alignment = self.weights
+        return (w_shoulders * shoulders + w_depth * depth + w_knee_tracking * knee_tracking
+                + w_knee_alignment * knee_alignment)
+
+    def _compile(self):
+        low, high = self.min_score, self.max_score
+        shoulder_threshold, shoulder_max_tilt = self.shoulder_threshold, self.shoulder_max_tilt
+        knee_threshold, knee_max_tilt = self.knee_threshold, self.knee_max_tilt
+        depth_angle, min_angle, max_angle = self.depth_angle, self.depth_min_angle, self.depth_max_angle
+        start_angle, depth_range = self.tracking_start_angle, self.tracking_depth_range
+        max_deviation, rate = self.tracking_max_deviation, self.tracking_penalty_rate
+        side_angles = [angle for _, _, angle in self.tracking_sides]
+
+        # One gather fetches every coordinate: shoulder y pair, knee y pair, then x of each side's pair
+        rows = list(self.shoulder_landmarks) + list(self.knee_landmarks)
+        columns = [Y] * 4
+        for first, second, _ in self.tracking_sides:
+            rows += [first, second]
+            columns += [X, X]
+        rows, columns = np.array(rows), np.array(columns)
+        sides = range(len(self.tracking_sides))
+
+        def tilt_score(tilt, threshold, max_tilt):
+            if tilt <= threshold:
+                return high
+            if tilt >= max_tilt:
+                return low
+            penalty_ratio = (tilt - threshold) / (max_tilt - threshold)
+            return high - penalty_ratio * (high - low)
+
+        def evaluate_frame(landmarks, angles):
+            # Python floats from here on: same IEEE results as NumPy scalars, but cheaper
+            values = landmarks[rows, columns].tolist()
+            angles = angles.tolist()
+            shoulder_tilt = abs(values[0] - values[1])
+            knee_tilt = abs(values[2] - values[3])
+
+            angle = angles[depth_angle]
+            if angle > max_angle:
+                depth_score = low
+            elif angle < min_angle:
+                depth_score = high
+            else:
+                depth_score = high * (1 - (angle - min_angle) / (max_angle - min_angle))
+
+            knee_deviation = None
+            knee_score = None
+            for side in sides:
+                deviation = values[4 + 2 * side] - values[5 + 2 * side]
+                penalty = 0.0
+                if deviation > 0:  # knee ahead of the toe
+                    depth_factor = max(0, min(1, (start_angle - angles[side_angles[side]]) / depth_range))
+                    normalized_deviation = min(max_deviation, abs(deviation))
+                    penalty = (1 - np.exp(-normalized_deviation * rate)) * depth_factor
+                score = high * (1 - penalty)
+                if knee_score is None or score < knee_score:
+                    knee_score = score
+                if knee_deviation is None or deviation > knee_deviation:
+                    knee_deviation = deviation
+
+            return (shoulder_tilt, knee_tilt, knee_deviation,
+                    tilt_score(shoulder_tilt, shoulder_threshold, shoulder_max_tilt),
+                    tilt_score(knee_tilt, knee_threshold, knee_max_tilt),
+                    depth_score, knee_score)
+
+        def tilt_scores(tilt, threshold, max_tilt):
+            penalty_ratio = (tilt - threshold) / (max_tilt - threshold)
+            score = np.where(tilt >= max_tilt, low, high - penalty_ratio * (high - low))
+            return np.where(tilt <= threshold, high, score)
+
+        def evaluate_batch(landmarks, angles):
+            # Scalar code reads landmarks as Python floats, so do the coordinate math in float64 too
+            values = np.asarray(landmarks)[:, rows, columns].astype(np.float64)
+            shoulder_tilt = np.abs(values[:, 0] - values[:, 1])
+            knee_tilt = np.abs(values[:, 2] - values[:, 3])
+
+            angle = angles[:, depth_angle]
+            depth_scores = high * (1 - (angle - min_angle) / (max_angle - min_angle))
+            depth_scores = np.where(angle > max_angle, low, np.where(angle < min_angle, high, depth_scores))
+
+            deviations = []
+            side_scores = []
+            for side in sides:
+                deviation = values[:, 4 + 2 * side] - values[:, 5 + 2 * side]
+                depth_factor = np.clip((start_angle - angles[:, side_angles[side]]) / depth_range, 0, 1)
+                normalized_deviation = np.minimum(max_deviation, np.abs(deviation))
+                penalty = (1 - np.exp(-normalized_deviation * rate)) * depth_factor
+                side_scores.append(high * (1 - np.where(deviation > 0, penalty, 0.0)))
+                deviations.append(deviation)
+
+            return (shoulder_tilt, knee_tilt, np.maximum.reduce(deviations),
+                    tilt_scores(shoulder_tilt, shoulder_threshold, shoulder_max_tilt),
+                    tilt_scores(knee_tilt, knee_threshold, knee_max_tilt),
+                    depth_scores, np.minimum.reduce(side_scores))
+
+        return evaluate_frame, evaluate_batch
@@ -0,0 +1,456 @@
+"""
+Local scoring service: an asyncio HTTP/WebSocket API in front of a pool of warm detectors.
+
+    POST   /jobs              upload a video (raw request body), returns {"job_id": ...} (202)
+    GET    /jobs/{id}         job status, and the result once it is done
+    DELETE /jobs/{id}         cancel a queued or running job
+    GET    /jobs/{id}/events  WebSocket: the job's events (state changes, per-rep scores, ...)
+                              as JSON messages, ending with a "job_finished" message
+    GET    /stream            WebSocket: send JPEG frames as binary messages and "end" as text;
+                              events come back on the same socket while the frames are scored
+    GET    /health            worker and queue status
+
+Each worker owns one DominantPersonDetector for the lifetime of the service and
+runs one job at a time on its own thread, so at most `workers` videos are scored
+concurrently. Up to max_queue more jobs wait in a FIFO queue; beyond that new
+jobs are rejected with 503 and a Retry-After header instead of piling up.
+
+Needs aiohttp (pip install aiohttp) for the HTTP layer; ScoringService itself
+only uses asyncio.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from events import CallbackSink, EventBus
+from video_processor import VideoProcessor
+
+# Marks the end of a client's frame stream
+_END = object()
+
+
+class ServiceBusy(Exception):
+    """The job queue is full; the client should retry later."""
+
+
+class FrameQueueSource:
+    """
+    cv2.VideoCapture-like reader over frames pushed by a client, so a streamed
+    session runs through the normal VideoProcessor loop. The queue is bounded:
+    when scoring falls behind, put() blocks and the client is slowed down.
+    """
+
+    def __init__(self, max_buffered=32):
+        self.queue = queue.Queue(maxsize=max_buffered)
+        self.ended = False
+        self.closed = False
+
+    def put(self, frame):
+        """Blocking; returns False if the job was cancelled in the meantime."""
+        while not self.closed:
+            try:
+                self.queue.put(frame, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def end(self):
+        return self.put(_END)
+
+    def isOpened(self):
+        return not self.ended and not self.closed
+
+    def read(self):
+        while not self.closed:
+            try:
+                item = self.queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _END:
+                self.ended = True
+                return False, None
+            return True, item
+        return False, None
+
+    def grab(self):
+        return self.read()[0]
+
+    def release(self):
+        self.closed = True
+
+
+class Job:
+    """One scoring request. Lives on the event loop; the worker thread only touches cancel_event."""
+
+    def __init__(self, source, upload_path=None):
+        self.job_id = uuid.uuid4().hex
+        self.source = source
+        # Temp file of an uploaded video, deleted when the job ends
+        self.upload_path = upload_path
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+        self.history = []
+        self.subscribers = set()
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed", "cancelled")
+
+    def publish(self, message):
+        self.history.append(message)
+        for subscriber in self.subscribers:
+            subscriber.put_nowait(message)
+
+    def subscribe(self):
+        """Queue with every message so far, followed by the live ones."""
+        subscriber = asyncio.Queue()
+        for message in self.history:
+            subscriber.put_nowait(message)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    def describe(self):
+        description = {
+            "job_id": self.job_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "events": len(self.history)
+        }
+        if self.finished:
+            description["result"] = self.result
+            description["error"] = self.error
+        return description
+
+
+class ScoringService:
+    """
+    Job queue plus worker pool. detector_factory builds one detector per worker
+    on its worker thread at start(); controller_options are passed on to every
+    MainController (e.g. landmark_filter, tracker_options).
+    """
+
+    def __init__(self, workers=2, max_queue=8, detector_factory=None, controller_options=None,
+                 keep_finished=1000):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.workers = workers
+        self.max_queue = max_queue
+        self.detector_factory = detector_factory or self._default_detector
+        self.controller_options = controller_options or {}
+        self.keep_finished = keep_finished
+        self.jobs = collections.OrderedDict()
+        self.queue = None
+        self.executor = None
+        self.detectors = []
+        self.tasks = []
+        self.running = 0
+        self.loop = None
+
+    @staticmethod
+    def _default_detector():
+        from dominant_person import DominantPersonDetector
+        return DominantPersonDetector()
+
+    def _build_detector(self):
+        detector = self.detector_factory()
+        # Run the graph once, so the first job's first frame is not slowed down by model loading
+        if hasattr(detector, "warm_up"):
+            detector.warm_up()
+        return detector
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="scoring-worker")
+        # Build the graphs up front so the first job does not pay for them
+        self.detectors = await asyncio.gather(*(self.loop.run_in_executor(self.executor, self._build_detector)
+                                                for _ in range(self.workers)))
+        self.tasks = [asyncio.create_task(self._worker(detector)) for detector in self.detectors]
+
+    async def stop(self):
+        for job in self.jobs.values():
+            if not job.finished:
+                self.cancel(job.job_id)
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.executor.shutdown(wait=True)
+        for detector in self.detectors:
+            detector.close()
+
+    def submit(self, source, upload_path=None):
+        """Queue a job for a video path or a FrameQueueSource. Raises ServiceBusy when the queue is full."""
+        job = Job(source, upload_path)
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise ServiceBusy(f"{self.max_queue} jobs already waiting") from None
+        self.jobs[job.job_id] = job
+        self._trim_finished()
+        return job
+
+    def cancel(self, job_id):
+        """Cancel a job. A queued job never starts; a running one stops after its current frame."""
+        job = self.jobs.get(job_id)
+        if job is None or job.finished:
+            return job
+        job.cancel_event.set()
+        if isinstance(job.source, FrameQueueSource):
+            job.source.release()
+        if job.status == "queued":
+            self._finish(job, "cancelled")
+        return job
+
+    def has_capacity(self):
+        return not self.queue.full()
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "queued": self.queue.qsize(),
+            "max_queue": self.max_queue,
+            "jobs": len(self.jobs)
+        }
+
+    def _trim_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self.jobs[job_id]
+
+    def _finish(self, job, status, result=None, error=None):
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        if job.upload_path is not None:
+            try:
+                os.unlink(job.upload_path)
+            except OSError:
+                pass
+        job.publish({"type": "job_finished", "job_id": job.job_id, "status": status,
+                     "result": result, "error": error})
+
+    async def _worker(self, detector):
+        while True:
+            job = await self.queue.get()
+            if job.finished:
+                # Cancelled while it was waiting
+                continue
+            job.status = "running"
+            job.started_at = time.time()
+            self.running += 1
+            try:
+                result = await self.loop.run_in_executor(self.executor, self._run_job, job, detector)
+            except asyncio.CancelledError:
+                # The worker task itself is being cancelled (stop()): stop the thread after its current
+                # frame and still tell the subscribers how the job ended
+                job.cancel_event.set()
+                self._finish(job, "cancelled")
+                raise
+            except Exception as exc:
+                self._finish(job, "failed", error=f"{type(exc).__name__}: {exc}")
+            else:
+                self._finish(job, "cancelled" if job.cancel_event.is_set() else "done", result=result)
+            finally:
+                self.running -= 1
+
+    def _run_job(self, job, detector):
+        """Runs on the worker's thread."""
+        from main_controller import MainController
+
+        detector.reset()
+
+        def publish(event):
+            self.loop.call_soon_threadsafe(job.publish, event.to_dict())
+
+        processor = VideoProcessor(job.source, headless=True)
+        processor.stop_event = job.cancel_event
+        controller = MainController(job.upload_path or "stream", headless=True, detector=detector,
+                                    events=EventBus([CallbackSink(publish)]), video_processor=processor,
+                                    **self.controller_options)
+        return controller.run()
+
+
+def _dumps(message):
+    # numpy scalars in the score dicts go out as plain numbers
+    return json.dumps(message, default=float)
+
+
+def build_app(service, max_upload_bytes=2 << 30, retry_after=5):
+    """The aiohttp application serving `service`."""
+    import cv2
+    import numpy as np
+    from aiohttp import WSMsgType, web
+
+    def busy(message):
+        return web.json_response({"error": message}, status=503, headers={"Retry-After": str(retry_after)})
+
+    def get_job(request):
+        job = service.jobs.get(request.match_info["job_id"])
+        if job is None:
+            raise web.HTTPNotFound(text=json.dumps({"error": "unknown job"}), content_type="application/json")
+        return job
+
+    async def create_job(request):
+        # Refuse before receiving a large upload that could not be queued anyway
+        if not service.has_capacity():
+            return busy("job queue is full")
+
+        fd, upload_path = tempfile.mkstemp(suffix=".upload")
+        received = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    chunk = await request.content.read(1 << 20)
+                    if not chunk:
+                        break
+                    received += len(chunk)
+                    if received > max_upload_bytes:
+                        raise web.HTTPRequestEntityTooLarge(max_size=max_upload_bytes, actual_size=received)
+                    await asyncio.to_thread(f.write, chunk)
+            if received == 0:
+                raise web.HTTPBadRequest(text="empty upload")
+            job = service.submit(upload_path, upload_path=upload_path)
+        except ServiceBusy as exc:
+            os.unlink(upload_path)
+            return busy(str(exc))
+        except BaseException:
+            os.unlink(upload_path)
+            raise
+        return web.json_response({"job_id": job.job_id, "status": job.status}, status=202)
+
+    async def job_status(request):
+        return web.json_response(get_job(request).describe(), dumps=_dumps)
+
+    async def cancel_job(request):
+        job = service.cancel(get_job(request).job_id)
+        return web.json_response(job.describe(), dumps=_dumps)
+
+    async def forward_events(job, ws):
+        """Send the job's messages to the socket until the job finishes."""
+        subscriber = job.subscribe()
+        try:
+            while True:
+                message = await subscriber.get()
+                if ws.closed:
+                    return
+                await ws.send_str(_dumps(message))
+                if message["type"] == "job_finished":
+                    return
+        finally:
+            job.unsubscribe(subscriber)
+
+    async def job_events(request):
+        job = get_job(request)
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        await forward_events(job, ws)
+        await ws.close()
+        return ws
+
+    async def stream(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        source = FrameQueueSource()
+        try:
+            job = service.submit(source)
+        except ServiceBusy as exc:
+            await ws.send_str(_dumps({"type": "error", "error": str(exc), "retry_after": retry_after}))
+            await ws.close(code=1013)  # Try again later
+            return ws
+
+        await ws.send_str(_dumps({"type": "job_created", "job_id": job.job_id}))
+        sender = asyncio.create_task(forward_events(job, ws))
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.BINARY:
+                    frame = await asyncio.to_thread(cv2.imdecode, np.frombuffer(msg.data, np.uint8),
+                                                    cv2.IMREAD_COLOR)
+                    # Blocks while the frame queue is full, which stops us reading from the client
+                    if frame is not None and not await asyncio.to_thread(source.put, frame):
+                        break
+                elif msg.type == WSMsgType.TEXT and msg.data == "end":
+                    await asyncio.to_thread(source.end)
+                    break
+                else:
+                    # Anything else (a stray text message, a socket error) ends the stream as well. The
+                    # worker would otherwise wait in FrameQueueSource.read() for a frame that never comes
+                    service.cancel(job.job_id)
+                    break
+            else:
+                # The client went away without "end"
+                service.cancel(job.job_id)
+            await sender
+        finally:
+            if not job.finished:
+                service.cancel(job.job_id)
+            sender.cancel()
+            await ws.close()
+        return ws
+
+    async def health(request):
+        return web.json_response(service.stats())
+
+    async def on_startup(app):
+        await service.start()
+
+    async def on_cleanup(app):
+        await service.stop()
+
+    app = web.Application()
+    app.add_routes([
+        web.post("/jobs", create_job),
+        web.get("/jobs/{job_id}", job_status),
+        web.delete("/jobs/{job_id}", cancel_job),
+        web.get("/jobs/{job_id}/events", job_events),
+        web.get("/stream", stream),
+        web.get("/health", health),
+    ])
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+if __name__ == "__main__":
+    from aiohttp import web
+
+    from pose_backends import parse_backend_spec
+
+    parser = argparse.ArgumentParser(description="Serve squat scoring over HTTP/WebSocket.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=2, help="warm detectors, i.e. concurrent jobs")
+    parser.add_argument("--max-queue", type=int, default=8, help="jobs allowed to wait for a worker")
+    parser.add_argument("--inference-size", type=int, default=None,
+                        help="crop to the lifter and downscale to this many pixels before pose inference")
+    parser.add_argument("--pose-backend", default="mediapipe",
+                        help="mediapipe[:model complexity 0-2] or landmarker:<PoseLandmarker .task file> "
+                             "(default: mediapipe, complexity 1)")
+    args = parser.parse_args()
+
+    def detector_factory():
+        from dominant_person import DominantPersonDetector
+        return DominantPersonDetector(inference_size=args.inference_size, **parse_backend_spec(args.pose_backend)[1])
+
+    service = ScoringService(workers=args.workers, max_queue=args.max_queue, detector_factory=detector_factory)
+    web.run_app(build_app(service), host=args.host, port=args.port)
@@ -1,7 +1,6 @@
-import cv2
-import mediapipe as mp
-import numpy as np
-from squat_assesor import SquatAssessor
+from events import EventBus, StateChanged, PostureWarning
+from pose_array import (X, Y, LEFT_SHOULDER, LEFT_ELBOW, LEFT_WRIST, LEFT_HIP,
+                        LEFT_KNEE_ANGLE, LEFT_ARM_ANGLE, joint_angles)
 
 class SquatTracker:
     NOTHING = 1
@@ -10,138 +9,139 @@ class SquatTracker:
     FINISHED = 0
     squat_started = False
 
-    def __init__(self, min_arm_angle=60, max_arm_angle=120, min_knee_angle=170):
+    SQUAT_START_THRESHOLD = 110  # Below this knee angle means squat started
+    SQUAT_END_THRESHOLD = 170    # Above this knee angle means squat ended
+    MAX_SHOULDER_HIP_OFFSET = 0.1  # Allowed horizontal shoulder/hip deviation when getting ready
 
-        self.squat_assesor = SquatAssessor()
+    def __init__(self, min_arm_angle=60, max_arm_angle=120, min_knee_angle=170, events=None,
+                 start_dwell=1, end_dwell=1, finish_dwell=1):
 
         self.min_arm_angle = min_arm_angle  # Minimum angle for arms holding the bar
         self.max_arm_angle = max_arm_angle  # Maximum angle for arms holding the bar
         self.min_knee_angle = min_knee_angle  # Minimum angle for knees to be considered extended
         self.NOTHING = 1
+        # Minimum dwell: a transition only fires once its condition has held for this many
+        # consecutive frames, so a single jittery frame cannot start/end a rep or finish the set.
+        # The start/end thresholds themselves already form a hysteresis band.
+        self.start_dwell = start_dwell
+        self.end_dwell = end_dwell
+        self.finish_dwell = finish_dwell
+        self.start_streak = 0
+        self.end_streak = 0
+        self.finish_streak = 0
         self.previous_knee_angle = None  # Track the previous knee angle for detecting movement
+        # State changes and posture warnings go out as events instead of prints
+        self.events = events if events is not None else EventBus()
+        self.active_warning = None
 
-    def calculate_angle(self, joint1, joint2, joint3):
-        """Calculate the angle between three joints."""
-        x1, y1 = joint1.x, joint1.y
-        x2, y2 = joint2.x, joint2.y
-        x3, y3 = joint3.x, joint3.y
+    def _warn(self, code, message):
+        # Only report a problem when it appears, not on every frame it persists
+        if self.active_warning != code:
+            self.active_warning = code
+            self.events.emit(PostureWarning(code, message))
 
-        vector1 = np.array([x1 - x2, y1 - y2])
-        vector2 = np.array([x3 - x2, y3 - y2])
+    def _clear_warning(self, code):
+        # The condition is gone, so the next time it appears is reported again
+        if self.active_warning == code:
+            self.active_warning = None
 
-        dot_product = np.dot(vector1, vector2)
-        magnitude1 = np.linalg.norm(vector1)
-        magnitude2 = np.linalg.norm(vector2)
-
-        angle = np.arccos(dot_product / (magnitude1 * magnitude2)) * (180.0 / np.pi)
-        return angle
-
-
-    def is_ready_to_squat(self, landmarks):
+    def _state_changed(self, previous):
+        self.events.emit(StateChanged(previous, self.get_current_state()))
 
+    def is_ready_to_squat(self, landmarks, angles=None):
+        """
+        Check if the person is ready to squat. landmarks is the frame's (33, 4)
+        landmark array and angles its joint_angles(); they are computed here when
+        the caller has not already done so.
+        """
         if self.IN_REP:
             return True
         if self.READY:
             return True
 
-        """Check if the person is ready to squat."""
-        shoulder = landmarks.landmark[11]  # Left shoulder
-        elbow = landmarks.landmark[13]    # Left elbow
-        wrist = landmarks.landmark[15]    # Left wrist
-        hip = landmarks.landmark[23]      # Left hip
-        knee = landmarks.landmark[25]     # Left knee
-        ankle = landmarks.landmark[27]    # Left ankle
+        if angles is None:
+            angles = joint_angles(landmarks)
 
         # Check arm angle
-        arm_angle = self.calculate_angle(shoulder, elbow, wrist)
+        arm_angle = angles[LEFT_ARM_ANGLE]
         if not (self.min_arm_angle <= arm_angle <= self.max_arm_angle):
+            self._clear_warning("arms_not_up")
             return False
 
-        if (wrist.y > elbow.y):  # Y-coordinates should decrease as we go up
-            print("Arms not facing upwards")
+        if landmarks[LEFT_WRIST, Y] > landmarks[LEFT_ELBOW, Y]:  # Y-coordinates should decrease as we go up
+            self._warn("arms_not_up", "Arms not facing upwards")
             return False
+        self._clear_warning("arms_not_up")
 
         # Check knee angle
-        knee_angle = self.calculate_angle(hip, knee, ankle)
+        knee_angle = angles[LEFT_KNEE_ANGLE]
         if knee_angle < self.min_knee_angle:
             return False
 
-
-
         # Ensure shoulders and hips are vertically aligned
-        if abs(shoulder.x - hip.x) > 0.1:  # Allow a small deviation
+        shoulder_hip_offset = abs(float(landmarks[LEFT_SHOULDER, X]) - float(landmarks[LEFT_HIP, X]))
+        if shoulder_hip_offset > self.MAX_SHOULDER_HIP_OFFSET:  # Allow a small deviation
             return False
 
         if self.NOTHING:
-            print("Ready to squat")
             self.READY = 1
             self.NOTHING = 0
+            self._state_changed("Not Ready")
 
 
         return True
 
-    def squat_rep_position(self, landmarks):
+    def squat_rep_position(self, landmarks, angles=None):
         """Check if the person is starting a squat by detecting knee bending."""
         if self.READY == 0 and self.IN_REP == 0:
-            print("Not ready yet")
+            # Callers only get here once is_ready_to_squat() has passed
             return
 
-        hip = landmarks.landmark[23]  # Left Hip
-        knee = landmarks.landmark[25]  # Left Knee
-        ankle = landmarks.landmark[27]  # Left Ankle
-        knee_angle = self.calculate_angle(hip, knee, ankle)
+        if angles is None:
+            angles = joint_angles(landmarks)
+        knee_angle = angles[LEFT_KNEE_ANGLE]
 
-        squat_start_threshold = 110  # Below this angle means squat started
-        squat_end_threshold = 170    # Above this angle means squat ended
+        squat_start_threshold = self.SQUAT_START_THRESHOLD
+        squat_end_threshold = self.SQUAT_END_THRESHOLD
 
-        # If squat is not started and knee angle is below start threshold, start squat
-        if not self.squat_started and knee_angle < squat_start_threshold:
-            self.squat_started = True
-            self.READY = 0
-            self.IN_REP = 1
-            print("Squat started")
+        # If squat is not started and knee angle stays below start threshold, start squat
+        if not self.squat_started:
+            self.start_streak = self.start_streak + 1 if knee_angle < squat_start_threshold else 0
+            if self.start_streak >= self.start_dwell:
+                self.start_streak = 0
+                self.squat_started = True
+                self.READY = 0
+                self.IN_REP = 1
+                self._state_changed("Ready")
 
-        # If squat is started and knee angle is above end threshold, end squat
-        elif self.squat_started and knee_angle > squat_end_threshold:
-            self.squat_started = False
-            self.READY = 1
-            self.IN_REP =    0
-            print("Squat ended")
+        # If squat is started and knee angle stays above end threshold, end squat
+        else:
+            self.end_streak = self.end_streak + 1 if knee_angle > squat_end_threshold else 0
+            if self.end_streak >= self.end_dwell:
+                self.end_streak = 0
+                self.squat_started = False
+                self.READY = 1
+                self.IN_REP = 0
+                self._state_changed("In Rep")
 
 
         return True  # Squat is in progress and posture is acceptable
 
-    def calculate_angle(self, joint1, joint2, joint3):
-        """Calculate the angle between three joints (hip, knee, and ankle)"""
-        x1, y1 = joint1.x, joint1.y
-        x2, y2 = joint2.x, joint2.y
-        x3, y3 = joint3.x, joint3.y
-
-        vector1 = np.array([x1 - x2, y1 - y2])
-        vector2 = np.array([x3 - x2, y3 - y2])
-
-        dot_product = np.dot(vector1, vector2)
-        magnitude1 = np.linalg.norm(vector1)
-        magnitude2 = np.linalg.norm(vector2)
-
-        angle = np.arccos(dot_product / (magnitude1 * magnitude2)) * (180.0 / np.pi)
-        return angle
-
     def check_finished_transition(self, landmarks):
         """
         Check if the person transitions from READY to FINISHED state by putting arms down.
         """
         if self.READY == 1:  # Only check this when in READY state
-            shoulder = landmarks.landmark[11]  # Left shoulder
-            elbow = landmarks.landmark[13]    # Left elbow
-            wrist = landmarks.landmark[15]    # Left wrist
-
             # Check if arms are now facing downward
-            if wrist.y > elbow.y:  # Y-coordinates increase downwards
-                self.READY = 0
-                self.FINISHED = 1
-                print("Transitioned to FINISHED state")
-                return True
+            if landmarks[LEFT_WRIST, Y] > landmarks[LEFT_ELBOW, Y]:  # Y-coordinates increase downwards
+                self.finish_streak += 1
+                if self.finish_streak >= self.finish_dwell:
+                    self.READY = 0
+                    self.FINISHED = 1
+                    self._state_changed("Ready")
+                    return True
+                return False
+        self.finish_streak = 0
         return False
 
 
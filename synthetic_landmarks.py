@@ -0,0 +1,118 @@
+"""
+Synthetic (T, 33, 4) landmark streams of a lifter doing squats, for benchmarks
+and for exercising the scoring code without video or MediaPipe.
+
+The lifter is seen from a three-quarter view, like the clips the scoring code
+was tuned on: the knee angle is measured in the image plane, the knees travel
+forward over the toes as the squat deepens and the right side is drawn a
+little to the right of the left side.
+"""
+import math
+
+import numpy as np
+
+from pose_array import (NUM_LANDMARKS, X, Y, VISIBILITY, LEFT_SHOULDER, RIGHT_SHOULDER, LEFT_ELBOW,
+                        LEFT_WRIST, LEFT_HIP, LEFT_KNEE, LEFT_ANKLE, LEFT_FOOT_INDEX)
+
+STANDING_KNEE_ANGLE = 178.0
+
+SHIN = 0.2
+THIGH = 0.2
+TORSO = 0.28
+UPPER_ARM = 0.1
+FOREARM = 0.1
+SIDE_OFFSET = 0.06
+
+
+def _rotate(vector, degrees):
+    radians = math.radians(degrees)
+    cos, sin = math.cos(radians), math.sin(radians)
+    return np.array([vector[0] * cos - vector[1] * sin, vector[0] * sin + vector[1] * cos])
+
+
+def synthetic_pose(knee_angle, arms_up=True, shoulder_tilt=0.0, knee_tilt=0.0, knee_valgus=0.0,
+                   center_x=0.45, visibility=0.95):
+    """One (33, 4) pose with the given left knee angle in degrees."""
+    pose = np.zeros((NUM_LANDMARKS, 4), dtype=np.float32)
+    pose[:, VISIBILITY] = visibility
+
+    bend = STANDING_KNEE_ANGLE - knee_angle
+    ankle = np.array([center_x, 0.92])
+    # The shin leans forward as the squat deepens, and the thigh closes the knee angle behind it
+    shin_lean = bend / 2
+    knee = ankle + SHIN * _rotate(np.array([0.0, -1.0]), shin_lean)
+    to_ankle = (ankle - knee) / SHIN
+    hip = knee + THIGH * _rotate(to_ankle, knee_angle)
+    if hip[X] > knee[X]:
+        hip = knee + THIGH * _rotate(to_ankle, -knee_angle)
+    # Lean the torso forward a little with depth to keep the bar over the feet
+    shoulder = hip + TORSO * _rotate(np.array([0.0, -1.0]), bend / 4)
+    elbow = shoulder + (-UPPER_ARM, 0.0)
+    wrist = elbow + (0.0, -FOREARM if arms_up else FOREARM)
+
+    depth = min(1.0, bend / 90)
+    for side, dx in ((0, 0.0), (1, SIDE_OFFSET)):
+        offset = np.array([dx, 0.0])
+        valgus = np.array([knee_valgus * depth * (1 if side == 0 else -1), knee_tilt if side else 0.0])
+        pose[LEFT_ANKLE + side, :2] = ankle + offset
+        pose[LEFT_FOOT_INDEX + side, :2] = ankle + offset + (0.05, 0.01)
+        pose[29 + side, :2] = ankle + offset + (-0.02, 0.01)  # heels
+        pose[LEFT_KNEE + side, :2] = knee + offset + valgus
+        pose[LEFT_HIP + side, :2] = hip + offset
+        tilt = np.array([0.0, shoulder_tilt if side else 0.0])
+        pose[LEFT_SHOULDER + side, :2] = shoulder + offset + tilt
+        pose[LEFT_ELBOW + side, :2] = elbow + offset + tilt
+        pose[LEFT_WRIST + side, :2] = wrist + offset + tilt
+        for hand in (17, 19, 21):  # pinky, index, thumb
+            pose[hand + side, :2] = pose[LEFT_WRIST + side, :2] + (0.0, -0.02 if arms_up else 0.02)
+
+    # Face: nose plus eyes/ears/mouth clustered above the shoulders
+    head = (pose[LEFT_SHOULDER, :2] + pose[RIGHT_SHOULDER, :2]) / 2 + (0.0, -0.08)
+    for i in range(11):
+        pose[i, X] = head[0] + 0.01 * ((i % 5) - 2)
+        pose[i, Y] = head[1] - 0.01 * (i % 3)
+    return pose
+
+
+def _per_rep(value, reps):
+    values = np.broadcast_to(np.asarray(value, dtype=np.float64), (reps,))
+    return [float(v) for v in values]
+
+
+def synthetic_session(reps=5, depth=80.0, knee_valgus=0.0, shoulder_tilt=0.0, knee_tilt=0.0,
+                      fps=30, rep_seconds=2.0, rest_seconds=0.5, idle_seconds=1.0,
+                      noise=0.0, missing_ratio=0.0, seed=0):
+    """
+    A whole set: the lifter stands ready for idle_seconds, does `reps` squats down
+    to a knee angle of `depth`, then lowers the arms to finish. depth, knee_valgus,
+    shoulder_tilt and knee_tilt can be scalars or one value per rep. noise adds
+    Gaussian jitter to x/y, and missing_ratio turns random frames into NaN rows
+    (frames where no pose was detected).
+    """
+    rng = np.random.default_rng(seed)
+    depths = _per_rep(depth, reps)
+    valgus = _per_rep(knee_valgus, reps)
+    shoulder_tilts = _per_rep(shoulder_tilt, reps)
+    knee_tilts = _per_rep(knee_tilt, reps)
+
+    idle = max(1, int(idle_seconds * fps))
+    rest = int(rest_seconds * fps)
+    rep_frames = max(2, int(rep_seconds * fps))
+
+    poses = [synthetic_pose(STANDING_KNEE_ANGLE) for _ in range(idle)]
+    for i in range(reps):
+        # Smooth descent and ascent: a cosine profile between standing and the rep depth
+        phase = np.linspace(0.0, 2 * np.pi, rep_frames)
+        angles = depths[i] + (STANDING_KNEE_ANGLE - depths[i]) * (1 + np.cos(phase)) / 2
+        for angle in angles:
+            poses.append(synthetic_pose(angle, shoulder_tilt=shoulder_tilts[i], knee_tilt=knee_tilts[i],
+                                        knee_valgus=valgus[i]))
+        poses.extend(synthetic_pose(STANDING_KNEE_ANGLE) for _ in range(rest))
+    poses.extend(synthetic_pose(STANDING_KNEE_ANGLE, arms_up=False) for _ in range(idle))
+
+    session = np.stack(poses)
+    if noise:
+        session[..., :2] += rng.normal(0.0, noise, session[..., :2].shape).astype(np.float32)
+    if missing_ratio:
+        session[rng.random(len(session)) < missing_ratio] = np.nan
+    return session
@@ -1,34 +1,101 @@
+import time
+
 import cv2
 
+from profiling import NULL_PROFILER
+from renderer import draw_state
+
 class VideoProcessor:
-    def __init__(self, video_path):
+    def __init__(self, video_path, headless=False):
         self.video_path = video_path
+        self.headless = headless
+        # Replaced with a StageProfiler to time decode/display
+        self.profiler = NULL_PROFILER
+        # Set this threading.Event to stop processing after the current frame (e.g. a cancelled job)
+        self.stop_event = None
 
-    def process_video(self, frame_callback, squat_readiness_checker=None):
+    def stop_requested(self):
+        return self.stop_event is not None and self.stop_event.is_set()
+
+    def open_capture(self):
+        # Anything that reads like cv2.VideoCapture (e.g. frames streamed by a client) is used as is
+        if hasattr(self.video_path, "read"):
+            return self.video_path
         cap = cv2.VideoCapture(self.video_path)
         if not cap.isOpened():
             raise FileNotFoundError(f"Unable to open video: {self.video_path}")
+        return cap
+
+    def process_video(self, frame_callback, squat_readiness_checker=None, sampler=None):
+        """
+        Run frame_callback on every decoded frame and return processing stats.
+        In headless mode no overlay is drawn and no window is opened. With a
+        sampler, frames it declines are skipped with grab() and never decoded.
+        """
+        cap = self.open_capture()
+        profiler = self.profiler
 
+        frames = 0
+        stopped_early = False
+        start = time.perf_counter()
         while cap.isOpened():
+            if self.stop_requested():
+                stopped_early = True
+                break
+            if sampler is not None and not sampler.should_infer():
+                started = profiler.start()
+                if not cap.grab():
+                    break
+                profiler.stop("grab", started)
+                frames += 1
+                continue
+
+            started = profiler.start()
             ret, frame = cap.read()
             if not ret:
                 break
+            profiler.stop("decode", started)
+            frames += 1
 
             # Callback to process the frame (e.g., for detecting landmarks)
             frame_callback(frame)
 
-            # If a readiness checker is passed, display the current state
-            if squat_readiness_checker:
-                state = squat_readiness_checker.get_current_state()
-                # Display the state on the frame
-                cv2.putText(frame, f"State: {state}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-
-            # Display the frame
-            cv2.imshow("Video Processor", frame)
-
-            # Press 'q' to quit
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+            if self.show_frame(frame, squat_readiness_checker):
+                stopped_early = True
                 break
 
+        elapsed = time.perf_counter() - start
         cap.release()
-        cv2.destroyAllWindows()
+        self.close_display()
+        return self.build_stats(frames, elapsed, stopped_early)
+
+    def show_frame(self, frame, squat_readiness_checker=None):
+        """Draw the state overlay and display the frame. Returns True if the user asked to quit."""
+        if self.headless:
+            return False
+
+        started = self.profiler.start()
+        # If a readiness checker is passed, display the current state
+        if squat_readiness_checker:
+            draw_state(frame, squat_readiness_checker.get_current_state())
+
+        # Display the frame
+        cv2.imshow("Video Processor", frame)
+
+        # Press 'q' to quit
+        quit_requested = cv2.waitKey(1) & 0xFF == ord('q')
+        self.profiler.stop("display", started)
+        return quit_requested
+
+    def close_display(self):
+        if not self.headless:
+            cv2.destroyAllWindows()
+
+    @staticmethod
+    def build_stats(frames, elapsed, stopped_early=False):
+        return {
+            "frames": frames,
+            "elapsed_sec": elapsed,
+            "fps": frames / elapsed if elapsed > 0 else 0.0,
+            "stopped_early": stopped_early
+        }
@@ -0,0 +1,170 @@
+"""
+Writes the annotated frames to a video file on a dedicated writer thread.
+
+Frames go through a fixed pool of preallocated buffers. The producer resizes
+or copies the frame into a free buffer, draws the overlays there and hands
+the buffer to the writer thread. The thread encodes it and returns the buffer
+to the pool. When every buffer is still waiting to be encoded, the frame is
+dropped and counted rather than blocking the frame loop, so a slow encoder
+never stalls inference. With drop_frames=False the frame loop waits for a
+buffer instead. This suits offline runs, where a complete file matters more
+than latency.
+
+The codec is picked from the file extension, falling back through a list of
+FourCCs until cv2.VideoWriter opens one. Nothing depends on a particular
+hardware encoder.
+"""
+import os
+import queue
+import threading
+
+import cv2
+import numpy as np
+
+from renderer import OverlayRenderer, draw_score_card
+
+# Tried in order until the local OpenCV build can open one
+CODECS = {
+    ".mp4": ("mp4v", "avc1", "MJPG"),
+    ".m4v": ("mp4v", "avc1"),
+    ".mov": ("mp4v", "avc1", "MJPG"),
+    ".avi": ("MJPG", "XVID", "mp4v"),
+    ".mkv": ("XVID", "MJPG", "mp4v"),
+}
+
+
+def open_video_writer(path, fps, size, fourccs=None):
+    """Open a cv2.VideoWriter with the first FourCC that works for this file type."""
+    if fourccs is None:
+        fourccs = CODECS.get(os.path.splitext(str(path))[1].lower(), ("mp4v", "MJPG"))
+    for fourcc in fourccs:
+        writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*fourcc), fps, size)
+        if writer.isOpened():
+            return writer, fourcc
+        writer.release()
+    raise IOError(f"Unable to open a video writer for {path} (tried {', '.join(fourccs)})")
+
+
+class AnnotatedVideoWriter:
+    """
+    fps is the source frame rate. every=N keeps every Nth frame (the output
+    plays at fps / N). size=(w, h) sets the output resolution, with the
+    source resolution as the default. highlights_only keeps only the IN_REP
+    frames and the frame each rep is scored on. A scored rep's score card stays
+    on screen for card_seconds.
+    """
+
+    def __init__(self, path, fps=30.0, size=None, every=1, highlights_only=False, fourcc=None,
+                 buffers=32, card_seconds=2.0, min_visibility=0.5, drop_frames=True):
+        self.path = path
+        self.every = max(1, every)
+        self.fps = fps / self.every
+        self.size = tuple(size) if size is not None else None
+        self.highlights_only = highlights_only
+        self.fourccs = (fourcc,) if fourcc else None
+        self.buffer_count = buffers
+        self.drop_frames = drop_frames
+        self.card_frames = int(round(card_seconds * fps))
+        self.renderer = OverlayRenderer(min_visibility=min_visibility)
+
+        self.writer = None
+        self.fourcc = None
+        self.free = queue.SimpleQueue()
+        self.pending = queue.Queue()
+        self.buffers_allocated = 0
+        self.thread = None
+        self.error = None
+
+        self.card = None  # (rep, scores)
+        self.card_frame = None
+        self.frames_offered = 0
+        self.frames_written = 0
+        self.frames_dropped = 0
+
+    def _open(self, frame):
+        h, w = frame.shape[:2]
+        if self.size is None:
+            self.size = (w, h)
+        self.writer, self.fourcc = open_video_writer(self.path, self.fps, self.size, self.fourccs)
+        self.thread = threading.Thread(target=self._write_loop, name="video-writer", daemon=True)
+        self.thread.start()
+
+    def _write_loop(self):
+        while True:
+            buffer = self.pending.get()
+            if buffer is None:
+                return
+            try:
+                if self.error is None:
+                    self.writer.write(buffer)
+                    self.frames_written += 1
+            except Exception as exc:
+                # Reported from close(); keep draining so the producer never blocks
+                self.error = exc
+            self.free.put(buffer)
+
+    def show_card(self, rep, scores, frame_index):
+        """Show the score card of a rep that was just scored, starting at frame_index."""
+        self.card = (rep, scores)
+        self.card_frame = frame_index
+
+    def wants(self, frame_index, state):
+        """Whether this frame goes into the output video at all (checked before any drawing)."""
+        if frame_index % self.every:
+            return False
+        if self.highlights_only:
+            return state == "In Rep" or frame_index == self.card_frame
+        return True
+
+    def _acquire(self):
+        try:
+            return self.free.get_nowait()
+        except queue.Empty:
+            if self.buffers_allocated == self.buffer_count:
+                return None if self.drop_frames else self.free.get()
+            self.buffers_allocated += 1
+            w, h = self.size
+            return np.empty((h, w, 3), dtype=np.uint8)
+
+    def write(self, frame, landmarks, frame_index, state=None):
+        """Annotate a copy of the frame and queue it. The frame itself is left untouched."""
+        if not self.wants(frame_index, state):
+            return False
+        if self.writer is None:
+            self._open(frame)
+        self.frames_offered += 1
+        buffer = self._acquire()
+        if buffer is None:
+            self.frames_dropped += 1
+            return False
+
+        if frame.shape[:2] == buffer.shape[:2]:
+            np.copyto(buffer, frame)
+        else:
+            cv2.resize(frame, self.size, dst=buffer, interpolation=cv2.INTER_AREA)
+        self.renderer.draw(buffer, landmarks, state)
+        if self.card is not None and 0 <= frame_index - self.card_frame < self.card_frames:
+            draw_score_card(buffer, *self.card)
+        self.pending.put(buffer)
+        return True
+
+    def close(self):
+        """Encode what is still queued and close the file."""
+        if self.thread is not None:
+            self.pending.put(None)
+            self.thread.join()
+            self.thread = None
+        if self.writer is not None:
+            self.writer.release()
+        if self.error is not None:
+            raise self.error
+
+    def stats(self):
+        return {
+            "path": str(self.path),
+            "fourcc": self.fourcc,
+            "size": list(self.size) if self.size else None,
+            "fps": self.fps,
+            "frames_written": self.frames_written,
+            "frames_dropped": self.frames_dropped
+        }